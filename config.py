@@ -9,6 +9,16 @@ MULTIMODAL_CONFIG = {
     "api_key": "",  # API密钥，需要用户自行填写
     "max_tokens": 1024,  # 最大生成token数
     "temperature": 0.7,  # 温度参数
+    "timeout": 120,  # 单次请求超时（秒）
+    "max_retries": 3,  # 遇到429、5xx或网络错误时的最大重试次数
+    "retry_backoff": 1.0,  # 重试的初始退避时间（秒），每次翻倍
+    "max_retry_wait": 60,  # 单次重试前的最长等待（秒），退避时间和429响应的Retry-After都不超过该值
+    "rpm": 0,  # 每分钟请求数上限，0表示不限制
+    "tpm": 0,  # 每分钟token数上限（按图片尺寸和max_tokens估算），0表示不限制
+    "initial_concurrency": 2,  # 图片分析的初始并发数
+    "min_concurrency": 1,  # 自适应并发的下限
+    "max_concurrency": 8,  # 自适应并发的上限
+    "latency_target": 30,  # 单次请求延迟超过该秒数时视为过载并减小并发，0表示只根据429调整
 }
 
 # 图片处理配置
@@ -16,6 +26,56 @@ IMAGE_CONFIG = {
     "max_size": 1024,  # 图片最大尺寸
     "output_dir": "images",  # 图片输出目录
     "supported_formats": ["png", "jpg", "jpeg", "gif", "bmp"],  # 支持的图片格式
+    "probe_workers": 8,  # 图片目录转换时并发解析文件头的线程数
+    "probe_batch_size": 1000,  # 图片目录转换时每批解析并写出的图片数
+}
+
+# PDF处理配置
+PDF_CONFIG = {
+    "scanned_page_coverage": 0.6,  # 无文本页面中图片覆盖率达到该比例时视为扫描页，整页渲染为一张图片
+    "scanned_page_dpi": 150,  # 扫描页整页渲染的分辨率
+    "worker_recycle_pages": 50,  # 内存受限模式下每个工作进程最多处理的页数
+    "worker_rss_budget_mb": 1024,  # 内存受限模式下工作进程的常驻内存预算（MB），超过后回收
+    "lattice_backend": "pymupdf",  # camelot lattice模式的页面渲染后端：pymupdf（进程内渲染）、pdfium、ghostscript或poppler
+    "lattice_dpi": 300,  # pymupdf渲染后端的分辨率
+    "layout_timeout": 0,  # 单页pdfminer版面分析的时间上限（秒），超时后改用PyMuPDF的文本块，0表示不限制（默认）
+    "table_timeout": 0,  # 单页表格提取的时间上限（秒），超时后该页只输出文本和图片，0表示不限制（默认）
+    "worker_page_grace": 60,  # 工作进程中单页超出版面分析和表格时限之和该秒数仍无结果时终止进程并跳过该页
+    "min_image_size": 8,  # 宽或高（像素）小于该值的图片（分隔线、间隔图等）不提取
+    "image_cache_mb": 64,  # 按xref缓存已提取图片的字节上限（MB），重复出现的图片只提取一次
+    "boilerplate_mode": "off",  # 各页重复的页眉页脚：drop（全部删除）、once（只保留第一次出现）或off（不处理，默认）
+    "boilerplate_min_ratio": 0.6,  # 在至少该比例的页面上重复出现时视为页眉页脚
+    "boilerplate_min_pages": 3,  # 视为页眉页脚的最少重复页数
+    "boilerplate_margin": 0.12,  # 页眉页脚区域占页面高度的比例，只检查页面顶部和底部该范围内的元素
+    "boilerplate_tolerance": 8,  # 同一位置允许的纵向偏差（pt）
+}
+
+# 近重复检测配置
+DEDUP_CONFIG = {
+    "threshold": 0.85,  # 估计的Jaccard相似度达到该值时视为近重复
+    "num_perm": 128,  # MinHash签名长度
+    "shingle_size": 5,  # 字符shingle长度
+    "min_chars": 50,  # 参与检测的最短文本块字符数
+    "max_candidates": 200,  # 每次查询最多取出并比较的候选条目数
+}
+
+# 预检估算配置，耗时为单位处理量的平均值，可用--plan-rates指定在自己语料上测得的数值
+PLAN_CONFIG = {
+    "table_min_rules": 6,  # 有文本且绘制的矩形和直线数达到该值的页面视为可能含表格
+    "text_page_seconds": 0.12,  # 文本页的转换耗时（秒/页，camelot lattice + pymupdf渲染，合成语料测得）
+    "table_page_seconds": 0.15,  # 含表格页面的转换耗时（秒/页）
+    "scanned_page_seconds": 0.035,  # 扫描页整页渲染的耗时（秒/页）
+    "docx_seconds": 1.0,  # 每个Word文档的pandoc转换耗时（秒/个）
+    "vision_call_seconds": 8.0,  # 单次多模态模型调用的平均延迟（秒）
+    "vision_concurrency": 4,  # 估算时假设的图片分析平均并发数
+}
+
+# 监视目录模式配置
+WATCH_CONFIG = {
+    "debounce_seconds": 2.0,  # 文件大小和修改时间保持不变超过该秒数后才开始转换，避免处理仍在写入的文件
+    "poll_interval": 2.0,  # 不支持inotify（如网络共享目录）时轮询扫描目录的间隔（秒）
+    "output_dir": ".converted",  # 默认输出目录（位于监视目录下，以"."开头的目录不会被监视）
+    "state_file": "watch_state.jsonl",  # 输出目录中记录已转换文件的状态文件，重启后据此跳过未变化的文件
 }
 
 # 提示词配置
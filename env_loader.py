@@ -34,4 +34,17 @@ def load_env():
     else:
         print("警告: 未找到环境变量OPENAI_API_KEY，请确保已在config.py中设置API密钥或在.env文件中设置OPENAI_API_KEY")
     
+    # 限流配置：RPM/TPM配额和自适应并发范围
+    for env_name, key, cast in (
+        ("RPM", "rpm", float),
+        ("TPM", "tpm", float),
+        ("INITIAL_CONCURRENCY", "initial_concurrency", int),
+        ("MIN_CONCURRENCY", "min_concurrency", int),
+        ("MAX_CONCURRENCY", "max_concurrency", int),
+        ("LATENCY_TARGET", "latency_target", float),
+    ):
+        value = os.getenv(env_name)
+        if value:
+            MULTIMODAL_CONFIG[key] = cast(value)
+    
     return MULTIMODAL_CONFIG 
\ No newline at end of file
@@ -4,11 +4,14 @@
 
 import os
 import argparse
-from utils.pdf2md import pdf_to_markdown
+from utils.pdf2md import pdf_to_markdown, get_page_count, TABLE_ENGINES
 from utils.docx2md import docx_to_markdown
 from utils.markdown_converter import MarkdownConverter
 from utils.image_processor import ImageProcessor
-from config import PATH_CONFIG
+from utils.image_store import ImageStore
+from utils.render_backend import LATTICE_BACKENDS
+from utils.shard import select_pages, merge_markdown
+from config import PATH_CONFIG, PDF_CONFIG, DEDUP_CONFIG, WATCH_CONFIG
 from env_loader import load_env
 
 def parse_args():
@@ -22,8 +25,43 @@ def parse_args():
     parser.add_argument('--emb', type=str, default=PATH_CONFIG["emb_md"], help='向量友好的Markdown文件路径')
     parser.add_argument('--max-heading', type=int, default=4, help='最大标题级别 (仅PDF)')
     parser.add_argument('--table-mode', type=str, default="lattice", choices=["lattice", "stream"], help='表格提取模式 (仅PDF)')
+    parser.add_argument('--table-engine', type=str, choices=TABLE_ENGINES, help='表格引擎，默认为camelot-<table-mode>；pymupdf不依赖Ghostscript和OpenCV (仅PDF)')
+    parser.add_argument('--lattice-backend', type=str, default=PDF_CONFIG["lattice_backend"], choices=LATTICE_BACKENDS, help='camelot lattice模式的页面渲染后端，pymupdf在进程内渲染，不启动Ghostscript (仅PDF)')
+    parser.add_argument('--lattice-dpi', type=int, default=PDF_CONFIG["lattice_dpi"], help='pymupdf渲染后端的分辨率 (仅PDF)')
+    parser.add_argument('--boilerplate', type=str, default=PDF_CONFIG["boilerplate_mode"], choices=["drop", "once", "off"], help='各页重复的页眉、页脚、页码等：drop全部删除，once只保留第一次出现，off不处理 (仅PDF)')
+    parser.add_argument('--boilerplate-ratio', type=float, default=PDF_CONFIG["boilerplate_min_ratio"], help='在至少该比例的页面上同一位置重复出现的文本视为页眉页脚 (仅PDF)')
+    parser.add_argument('--layout-timeout', type=float, default=PDF_CONFIG["layout_timeout"], help='单页版面分析的时间上限（秒），超时后改用PyMuPDF的文本块，0表示不限制 (仅PDF)')
+    parser.add_argument('--table-timeout', type=float, default=PDF_CONFIG["table_timeout"], help='单页表格提取的时间上限（秒），超时后该页只输出文本，0表示不限制 (仅PDF)')
+    parser.add_argument('--scan-dpi', type=int, default=PDF_CONFIG["scanned_page_dpi"], help='扫描页整页渲染的分辨率 (仅PDF)')
+    parser.add_argument('--scan-coverage', type=float, default=PDF_CONFIG["scanned_page_coverage"], help='无文本页面图片覆盖率达到该比例时按扫描页整页渲染，大于1时关闭 (仅PDF)')
     parser.add_argument('--skip-convert', action='store_true', help='跳过文档转换步骤，直接处理已有的raw.md文件')
     parser.add_argument('--skip-emb', action='store_true', help='跳过向量友好转换步骤，只生成raw.md文件')
+    parser.add_argument('--pages', type=str, help='只转换指定页码范围，页码从1开始，如"100-199"或"1-3,7" (仅PDF)')
+    parser.add_argument('--shard', type=str, help='只转换第i个分片的页面，格式为i/n，i从1开始 (仅PDF)')
+    parser.add_argument('--memory-bounded', action='store_true', help='在可回收的独立工作进程中逐页处理，限制内存增长 (仅PDF)')
+    parser.add_argument('--recycle-pages', type=int, default=PDF_CONFIG["worker_recycle_pages"], help='内存受限模式下每个工作进程最多处理的页数 (仅PDF)')
+    parser.add_argument('--rss-budget', type=int, default=PDF_CONFIG["worker_rss_budget_mb"], help='内存受限模式下工作进程的常驻内存预算，单位MB (仅PDF)')
+    parser.add_argument('--merge', type=str, nargs='+', help='按页码顺序合并多个分片的raw.md，输出到--raw指定的文件')
+    parser.add_argument('--merge-emb', type=str, nargs='+', help='按页码顺序合并多个分片的emb.md，输出到--emb指定的文件')
+    parser.add_argument('--serve', action='store_true', help='以本地HTTP服务模式运行，在常驻工作线程中排队转换文档')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='服务监听地址 (仅服务模式)')
+    parser.add_argument('--port', type=int, default=8765, help='服务监听端口 (仅服务模式)')
+    parser.add_argument('--workers', type=int, default=2, help='工作线程数 (服务模式和监视目录模式)')
+    parser.add_argument('--work-dir', type=str, default='service_jobs', help='任务工作目录 (仅服务模式)')
+    parser.add_argument('--watch', type=str, help='监视目录模式：持续转换该目录（含子目录）中新增或修改的PDF、Word文档和图片')
+    parser.add_argument('--watch-output', type=str, help='监视目录模式的输出目录，默认为监视目录下的.converted')
+    parser.add_argument('--watch-debounce', type=float, default=WATCH_CONFIG["debounce_seconds"], help='文件大小和修改时间保持不变多少秒后开始转换 (仅监视目录模式)')
+    parser.add_argument('--watch-poll', type=float, help='不使用inotify，按该间隔（秒）轮询扫描目录，用于网络共享目录 (仅监视目录模式)')
+    parser.add_argument('--columnar', type=str, help='同时把emb.md按元素追加到该目录下的Parquet列式数据集（需要pyarrow）')
+    parser.add_argument('--doc-id', type=str, help='列式数据中的文档ID，默认为输入文件名')
+    parser.add_argument('--dedup-index', type=str, help='近重复检测索引（SQLite）路径，跨多次运行累积')
+    parser.add_argument('--dedup-mode', type=str, default='flag', choices=['flag', 'drop'], help='近重复内容的处理方式：flag添加标记，drop删除')
+    parser.add_argument('--dedup-threshold', type=float, default=DEDUP_CONFIG["threshold"], help='视为近重复的相似度阈值')
+    parser.add_argument('--plan', type=str, nargs='+', help='预检模式：快速扫描这些文件或目录，估算页数、图片数、多模态模型调用次数和耗时，不进行转换')
+    parser.add_argument('--plan-workers', type=int, default=1, help='预检扫描进程数 (仅预检模式)')
+    parser.add_argument('--plan-rates', type=str, help='JSON格式的各阶段单位耗时，覆盖PLAN_CONFIG中的默认值 (仅预检模式)')
+    parser.add_argument('--plan-output', type=str, help='把预检结果（含每个文件）保存为JSON (仅预检模式)')
+    parser.add_argument('--no-image-files', action='store_true', help='PDF提取的图片只保存在内存中直接用于分析，不写入磁盘')
     return parser.parse_args()
 
 def main():
@@ -33,18 +71,70 @@ def main():
     
     args = parse_args()
     
+    # 服务模式和监视目录模式中每个PDF使用的参数
+    pdf_options = {"max_heading_level": args.max_heading, "table_mode": args.table_mode,
+                   "scan_dpi": args.scan_dpi, "scan_coverage": args.scan_coverage,
+                   "memory_bounded": args.memory_bounded, "recycle_pages": args.recycle_pages,
+                   "rss_budget_mb": args.rss_budget, "table_engine": args.table_engine,
+                   "lattice_backend": args.lattice_backend, "lattice_dpi": args.lattice_dpi,
+                   "boilerplate": args.boilerplate, "boilerplate_ratio": args.boilerplate_ratio,
+                   "layout_timeout": args.layout_timeout, "table_timeout": args.table_timeout}
+    
+    # 服务模式：常驻进程，复用已加载的转换器和多模态API客户端
+    if args.serve:
+        from utils.service import serve
+        serve(host=args.host, port=args.port, work_dir=args.work_dir, workers=args.workers,
+              skip_emb=args.skip_emb, pdf_options=pdf_options)
+        return
+    
+    # 监视目录模式：常驻进程，持续转换新增或修改的文件
+    if args.watch:
+        from utils.watcher import watch
+        watch(args.watch, output_dir=args.watch_output, workers=args.workers, debounce=args.watch_debounce,
+              poll_interval=args.watch_poll, skip_emb=args.skip_emb, pdf_options=pdf_options)
+        return
+    
+    # 预检模式：只扫描输入，不转换，不调用API
+    if args.plan:
+        from utils.planner import run_plan
+        run_plan(args.plan, workers=args.plan_workers, rates_path=args.plan_rates, output_path=args.plan_output)
+        return
+    
     # 确保输出目录存在
     os.makedirs(os.path.dirname(args.raw) or '.', exist_ok=True)
     os.makedirs(os.path.dirname(args.emb) or '.', exist_ok=True)
     
+    # 合并模式：把多台机器上的分片输出按页码顺序拼接
+    if args.merge or args.merge_emb:
+        if args.merge:
+            merge_markdown(args.merge, args.raw)
+        if args.merge_emb:
+            merge_markdown(args.merge_emb, args.emb)
+        print("处理完成!")
+        return
+    
     # 标记是否已执行转换
     conversion_done = False
+    # PDF提取的图片保存在内存中直接交给图片分析；跳过向量友好转换时图片必须落盘
+    image_store = None
     
     # 步骤1: 文档转Markdown (如果未跳过)
     if not args.skip_convert:
         if args.pdf:
             print(f"正在将PDF转换为Markdown: {args.pdf} -> {args.raw}")
-            pdf_to_markdown(args.pdf, args.raw, max_heading_level=args.max_heading, table_mode=args.table_mode)
+            pages = None
+            if args.pages or args.shard:
+                pages = select_pages(get_page_count(args.pdf), pages_spec=args.pages, shard_spec=args.shard)
+                print(f"只转换 {len(pages)} 页: {pages[0] + 1}-{pages[-1] + 1}" if pages else "所选范围内没有页面")
+            image_store = ImageStore(write_to_disk=args.skip_emb or not args.no_image_files)
+            pdf_to_markdown(args.pdf, args.raw, max_heading_level=args.max_heading, table_mode=args.table_mode,
+                            image_store=image_store, scan_dpi=args.scan_dpi, scan_coverage=args.scan_coverage,
+                            pages=pages, memory_bounded=args.memory_bounded,
+                            recycle_pages=args.recycle_pages, rss_budget_mb=args.rss_budget,
+                            table_engine=args.table_engine, lattice_backend=args.lattice_backend,
+                            lattice_dpi=args.lattice_dpi, boilerplate=args.boilerplate,
+                            boilerplate_ratio=args.boilerplate_ratio, layout_timeout=args.layout_timeout,
+                            table_timeout=args.table_timeout)
             conversion_done = True
         elif args.docx:
             print(f"正在将Word文档转换为Markdown: {args.docx} -> {args.raw}")
@@ -76,11 +166,31 @@ def main():
     # 步骤2: 处理Markdown，转换为向量友好的格式 (如果未跳过)
     if not args.skip_emb:
         print(f"正在处理Markdown，转换为向量友好的格式: {args.raw} -> {args.emb}")
-        converter = MarkdownConverter(raw_md_path=args.raw, emb_md_path=args.emb)
+        columnar_writer = None
+        if args.columnar:
+            from utils.columnar import ColumnarWriter
+            columnar_writer = ColumnarWriter(args.columnar)
+        source = args.pdf or args.docx or args.image or args.image_dir
+        doc_id = args.doc_id or (os.path.basename(os.path.normpath(source)) if source else None)
+        dedup_index = None
+        if args.dedup_index:
+            from utils.dedup import DedupIndex
+            dedup_index = DedupIndex(args.dedup_index, threshold=args.dedup_threshold)
+        converter = MarkdownConverter(raw_md_path=args.raw, emb_md_path=args.emb, image_store=image_store,
+                                      columnar_writer=columnar_writer, doc_id=doc_id,
+                                      dedup_index=dedup_index, dedup_mode=args.dedup_mode)
         converter.convert()
+        if columnar_writer is not None:
+            columnar_writer.close()
+        if dedup_index is not None:
+            dedup_index.close()
     else:
         print(f"跳过向量友好转换步骤，只生成raw.md文件: {args.raw}")
     
+    # 等待后台图片写盘完成
+    if image_store is not None:
+        image_store.close()
+    
     print("处理完成!")
 
 # 使用示例:
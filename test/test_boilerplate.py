@@ -0,0 +1,92 @@
+import fitz
+import pytest
+
+from utils.boilerplate import normalize_text, remove_boilerplate
+from utils.pdf2md import pdf_to_markdown
+from utils.shard import merge_markdown, select_pages
+
+
+def make_pages(count):
+    pages = {}
+    for page_num in range(count):
+        pages[page_num] = ([
+            ("text", "ACME Corp - Confidential", None, None, 72, 800 + (page_num % 2)),
+            ("heading", f"## Section {page_num}", None, None, 72, 700),
+            ("text", f"Body text {page_num}", None, None, 72, 600),
+            ("text", f"Page {page_num + 1} of {count}", None, None, 280, 40),
+        ], 842)
+    return pages
+
+
+def test_normalize_text():
+    assert normalize_text("## Page 3 of  10") == normalize_text("Page 4 of 10") == "page # of #"
+
+
+def test_drop_and_once():
+    """页眉和页码在所有页面重复出现，正文标题虽然归一化后相同但不在页边区域"""
+    pages, stats = remove_boilerplate(make_pages(5), mode="drop", min_ratio=0.6, min_pages=3,
+                                      margin=0.12, tolerance=8)
+    assert [len(elements) for elements, _ in pages.values()] == [2] * 5
+    assert stats["elements_removed"] == 10
+    assert stats["chars_removed"] == 5 * len("ACME Corp - Confidential") + 5 * len("Page 1 of 5")
+    assert {p["zone"] for p in stats["patterns"]} == {"header", "footer"}
+
+    pages, stats = remove_boilerplate(make_pages(5), mode="once", min_ratio=0.6, min_pages=3,
+                                      margin=0.12, tolerance=8)
+    assert len(pages[0][0]) == 4 and len(pages[1][0]) == 2
+    assert stats["elements_removed"] == 8
+
+
+def test_short_documents_untouched():
+    pages, stats = remove_boilerplate(make_pages(2), mode="drop", min_ratio=0.6, min_pages=3,
+                                      margin=0.12, tolerance=8)
+    assert pages == make_pages(2) and stats["elements_removed"] == 0
+
+
+def make_pdf(path, pages=4):
+    doc = fitz.open()
+    for page_num in range(pages):
+        page = doc.new_page()
+        page.insert_text((72, 40), "Internal use only", fontsize=9)
+        page.insert_text((72, 300), f"Paragraph number {page_num + 1} with unique body", fontsize=11)
+        page.insert_text((280, 820), f"- {page_num + 1} -", fontsize=9)
+    doc.save(path)
+    doc.close()
+
+
+def test_pdf_to_markdown_removes_running_header(tmp_path):
+    pdf_path = str(tmp_path / "doc.pdf")
+    make_pdf(pdf_path)
+
+    output = tmp_path / "raw.md"
+    report = pdf_to_markdown(pdf_path, str(output), table_engine="pymupdf", image_dir=str(tmp_path),
+                             boilerplate="drop")
+    content = output.read_text(encoding="utf-8")
+    assert "Internal use only" not in content and "- 2 -" not in content
+    assert content.count("unique body") == 4
+    assert report["boilerplate"]["elements_removed"] == 8
+
+    # 默认不处理，保持原有输出
+    report = pdf_to_markdown(pdf_path, str(output), table_engine="pymupdf", image_dir=str(tmp_path))
+    assert output.read_text(encoding="utf-8").count("Internal use only") == 4
+    assert report["boilerplate"]["elements_removed"] == 0
+
+
+@pytest.mark.parametrize("mode", ["drop", "once"])
+def test_shards_match_full_document(tmp_path, mode):
+    """每个分片只有2页，仍在整个文档上识别页眉页脚，合并结果与整篇转换一致"""
+    pdf_path = str(tmp_path / "doc.pdf")
+    make_pdf(pdf_path, pages=6)
+    options = {"table_engine": "pymupdf", "image_dir": str(tmp_path), "boilerplate": mode}
+    full = tmp_path / "full.md"
+    pdf_to_markdown(pdf_path, str(full), **options)
+    shard_paths = []
+    for index in (3, 1, 2):
+        path = str(tmp_path / f"shard{index}.md")
+        pdf_to_markdown(pdf_path, path, pages=select_pages(6, shard_spec=f"{index}/3"), **options)
+        shard_paths.append(path)
+    merged = tmp_path / "merged.md"
+    merge_markdown(shard_paths, str(merged))
+    content = merged.read_text(encoding="utf-8")
+    assert content == full.read_text(encoding="utf-8")
+    assert content.count("Internal use only") == (1 if mode == "once" else 0)
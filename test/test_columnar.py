@@ -0,0 +1,69 @@
+import pytest
+
+from utils.columnar import markdown_to_elements
+
+EMB = """# Page 1
+
+## 第一章
+
+第一段正文
+第二行
+
+![Image 0](images/image_0_0.png)
+> IMAGE_BEGIN
+> Path: images/image_0_0.png
+> OCR: 示例文字
+> DESC: 一张图表
+> CONTEXT: 销售数据
+> IMAGE_END
+
+
+#### Table
+
+| 产品 | 销量 |
+| --- | --- |
+| A | 100 |
+
+> TABLE_BEGIN
+> Rows: 1
+> TABLE_END
+
+# Page 2
+
+### 1.1 概述
+
+结尾
+"""
+
+
+def test_markdown_to_elements():
+    """按元素拆分，记录页码、标题路径及图片分析结果"""
+    rows = list(markdown_to_elements(EMB))
+    assert [(r["page"], r["element_type"], r["heading_path"]) for r in rows] == [
+        (1, "heading", "第一章"),
+        (1, "text", "第一章"),
+        (1, "image", "第一章"),
+        (1, "table", "第一章"),
+        (2, "heading", "1.1 概述"),
+        (2, "text", "1.1 概述"),
+    ]
+    assert rows[1]["text"] == "第一段正文\n第二行"
+    image = rows[2]
+    assert (image["image_path"], image["image_ocr"], image["image_desc"], image["image_context"]) == \
+        ("images/image_0_0.png", "示例文字", "一张图表", "销售数据")
+    assert rows[3]["text"].startswith("| 产品 | 销量 |") and rows[3]["text"].endswith("> TABLE_END")
+    assert [r["element_index"] for r in rows] == list(range(6))
+
+
+def test_writer_appends_across_runs(tmp_path):
+    """多次运行写入同一目录，作为一个数据集读取"""
+    pytest.importorskip("pyarrow")
+    import pyarrow.dataset as ds
+    from utils.columnar import ColumnarWriter
+
+    for doc_id in ("a.pdf", "b.pdf"):
+        with ColumnarWriter(str(tmp_path), row_group_rows=4) as writer:
+            assert writer.write_markdown(doc_id, EMB) == 6
+    table = ds.dataset(str(tmp_path), format="parquet").to_table()
+    assert table.num_rows == 12
+    assert sorted(set(table.column("doc_id").to_pylist())) == ["a.pdf", "b.pdf"]
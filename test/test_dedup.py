@@ -0,0 +1,90 @@
+import random
+
+import pytest
+
+from utils.dedup import DedupIndex, dedup_markdown
+
+WORDS = ["contract", "party", "payment", "term", "notice", "clause", "agreement", "liability",
+         "delivery", "invoice", "warranty", "period", "renewal", "termination", "schedule"]
+
+
+def paragraph(seed):
+    rng = random.Random(seed)
+    return " ".join(rng.choice(WORDS) for _ in range(60))
+
+
+def document(*seeds):
+    return "# Page 1\n\n" + "\n\n".join(paragraph(s) for s in seeds) + "\n\n"
+
+
+def test_index_persists_and_finds_near_duplicates(tmp_path):
+    path = str(tmp_path / "dedup.sqlite")
+    text = paragraph(1)
+    with DedupIndex(path, threshold=0.8) as index:
+        index.add(index.signature(text), "chunk", "a.pdf", "block-1")
+        index.add(index.signature(paragraph(2)), "chunk", "a.pdf", "block-2")
+        index.commit()
+    with DedupIndex(path, threshold=0.8) as index:
+        near = text[:-12] + " amendment"
+        matches = index.query(index.signature(near))
+        assert [(doc, ref) for _, _, doc, ref in matches] == [("a.pdf", "block-1")]
+        assert index.query(index.signature(paragraph(3))) == []
+        assert index.stats()["chunks"] == 2
+    with pytest.raises(ValueError):
+        DedupIndex(path, num_perm=64)
+
+
+def test_dedup_markdown_flag_and_drop(tmp_path):
+    index = DedupIndex(str(tmp_path / "dedup.sqlite"))
+    content, report = dedup_markdown(document(1, 2), "v1.pdf", index, mode="flag")
+    assert report["duplicate_of"] is None and report["duplicate_chunks"] == 0
+    # 重新处理同一文档不会与自己的旧条目匹配
+    _, report = dedup_markdown(document(1, 2), "v1.pdf", index, mode="flag")
+    assert report["duplicate_of"] is None and report["duplicate_chunks"] == 0
+
+    content, report = dedup_markdown(document(1, 3), "v2.pdf", index, mode="drop")
+    assert report["duplicate_chunks"] == 1 and report["chunks"] == 2
+    assert paragraph(1) not in content and paragraph(3) in content
+
+    content, report = dedup_markdown(document(1, 2), "copy.docx", index, mode="flag")
+    assert report["duplicate_of"] == "v1.pdf"
+    assert content.startswith("> DUPLICATE_DOCUMENT_OF: v1.pdf")
+    assert "> DUPLICATE_OF: v1.pdf#block-1" in content
+
+    content, report = dedup_markdown(document(1, 2), "copy2.docx", index, mode="drop")
+    assert content == "" and report["chars_removed"] == len(document(1, 2))
+    index.close()
+
+
+def test_repeated_chunks_indexed_once(tmp_path):
+    """重复出现的文本块和文档只保留第一次出现的条目，候选数受限"""
+    index = DedupIndex(str(tmp_path / "dedup.sqlite"))
+    for i in range(30):
+        _, report = dedup_markdown(document(1, 100 + i), f"doc{i}.pdf", index, mode="flag")
+        assert report["duplicate_chunks"] == (1 if i else 0)
+    assert index.stats()["chunks"] == 31 and index.stats()["documents"] == 30
+    for i in range(5):
+        _, report = dedup_markdown(document(1, 100), f"copy{i}.pdf", index, mode="flag")
+        assert report["duplicate_of"] == "doc0.pdf"
+    assert index.stats()["documents"] == 30 and index.stats()["chunks"] == 31
+    signature = index.signature(paragraph(1))
+    assert len(index.query(signature, kind="chunk", limit=1)) == 1
+    index.close()
+
+
+def test_dropped_duplicate_removes_stale_emb(tmp_path):
+    from utils.image_processor import ImageProcessor
+    from utils.markdown_converter import MarkdownConverter
+    config = {"base_url": "http://127.0.0.1:9", "model": "stub", "api_key": "test", "max_tokens": 16,
+              "temperature": 0}
+    index = DedupIndex(str(tmp_path / "dedup.sqlite"))
+    raw = tmp_path / "raw.md"
+    raw.write_text(document(1, 2), encoding="utf-8")
+    for doc_id in ("a.pdf", "b.pdf"):
+        emb = tmp_path / f"{doc_id}.emb.md"
+        emb.write_text("stale output from an earlier run", encoding="utf-8")
+        MarkdownConverter(str(raw), str(emb), image_processor=ImageProcessor(config=config), doc_id=doc_id,
+                          dedup_index=index, dedup_mode="drop").convert()
+    assert (tmp_path / "a.pdf.emb.md").read_text(encoding="utf-8") == document(1, 2)
+    assert not (tmp_path / "b.pdf.emb.md").exists()
+    index.close()
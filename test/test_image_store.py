@@ -0,0 +1,126 @@
+import io
+import os
+
+import pytest
+from PIL import Image
+
+from config import IMAGE_CONFIG
+from utils.image_processor import ImageProcessor, iter_image_files, probe_image_header
+from utils.image_store import ImageStore
+
+CONFIG = {"base_url": "http://127.0.0.1:9", "model": "stub", "api_key": "test", "max_tokens": 16, "temperature": 0}
+
+
+def encode(fmt, size=(37, 21), **kwargs):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, "red").save(buffer, format=fmt, **kwargs)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("fmt, expected, kwargs", [
+    ("PNG", "png", {}),
+    ("GIF", "gif", {}),
+    ("WEBP", "webp", {"lossless": True}),
+    ("WEBP", "webp", {"quality": 80}),
+])
+def test_probe_header(fmt, expected, kwargs):
+    assert probe_image_header(encode(fmt, **kwargs)) == (expected, 37, 21)
+
+
+def test_probe_jpeg_after_exif():
+    """JPEG的SOF段位于EXIF等APP段之后"""
+    exif = Image.Exif()
+    exif[0x010E] = "x" * 2000
+    data = encode("JPEG", exif=exif.tobytes())
+    assert probe_image_header(data) == ("jpeg", 37, 21)
+    assert probe_image_header(b"not an image at all") is None
+
+
+def test_read_image_and_info_from_bytes(tmp_path):
+    processor = ImageProcessor(config=CONFIG)
+    data = encode("PNG")
+    assert processor.read_image(data) is data
+    path = tmp_path / "a.png"
+    path.write_bytes(data)
+    assert processor.read_image(str(path)) == data
+    info = processor.get_image_info(memoryview(data), "png")
+    assert (info["width"], info["height"], info["format"], info["size"]) == (37, 21, "png", "37x21")
+    # 文件头无法识别时交给PIL，格式以PIL的识别结果为准
+    info = processor.get_image_info(encode("TIFF"), "tif")
+    assert (info["width"], info["format"]) == (37, "tiff")
+
+
+@pytest.mark.parametrize("write_to_disk", [True, False])
+def test_image_store(tmp_path, write_to_disk):
+    store = ImageStore(write_to_disk=write_to_disk)
+    paths = [str(tmp_path / "img" / f"image_{i}.png") for i in range(20)]
+    for i, path in enumerate(paths):
+        store.put(path, bytes([i]) * 10, "png")
+    store.flush()
+    assert len(store) == 20 and paths[3] in store
+    assert store.get(paths[3]) == (bytes([3]) * 10, "png")
+    assert store.get(str(tmp_path / "missing.png")) is None
+    for i, path in enumerate(paths):
+        assert (tmp_path / "img" / f"image_{i}.png").exists() == write_to_disk
+    store.close()
+    if write_to_disk:
+        assert (tmp_path / "img" / "image_5.png").read_bytes() == bytes([5]) * 10
+
+
+def make_image_dir(root):
+    (root / "sub" / "deep").mkdir(parents=True)
+    (root / "a_sub").mkdir()
+    (root / "b.png").write_bytes(encode("PNG"))
+    (root / "A.JPG").write_bytes(encode("JPEG", size=(8, 6)))
+    (root / "broken.gif").write_bytes(b"GIF89a")
+    (root / "notes.txt").write_text("not an image")
+    (root / "photo.webp").write_bytes(encode("WEBP"))
+    (root / "sub" / "z.bmp").write_bytes(encode("BMP", size=(5, 4)))
+    (root / "sub" / "deep" / "y.png").write_bytes(encode("PNG", size=(3, 2)))
+    (root / "a_sub" / "x.jpeg").write_bytes(encode("JPEG", size=(9, 7)))
+
+
+def test_iter_image_files_order(tmp_path):
+    """先产出当前目录的文件，再按名称进入子目录，不支持的格式被跳过"""
+    make_image_dir(tmp_path)
+    files = iter_image_files(str(tmp_path), IMAGE_CONFIG["supported_formats"])
+    paths = [os.path.relpath(path, tmp_path) for path in files]
+    assert paths == ["A.JPG", "b.png", "broken.gif", os.path.join("a_sub", "x.jpeg"),
+                     os.path.join("sub", "z.bmp"), os.path.join("sub", "deep", "y.png")]
+
+
+def test_image_dir_to_markdown(tmp_path, monkeypatch):
+    """分批写出的结果按遍历顺序编号，无法解析的图片尺寸记为未知"""
+    monkeypatch.setitem(IMAGE_CONFIG, "probe_batch_size", 4)
+    image_dir = tmp_path / "images"
+    image_dir.mkdir()
+    make_image_dir(image_dir)
+    output = tmp_path / "images.md"
+    assert ImageProcessor(config=CONFIG).image_dir_to_markdown(str(image_dir), str(output))
+    content = output.read_text(encoding="utf-8")
+    assert content.startswith("### 图片集合分析\n\n共 6 张图片\n\n")
+    headings = [line for line in content.splitlines() if line.startswith("#### ")]
+    assert headings == ["#### 图片 1: A.JPG", "#### 图片 2: b.png", "#### 图片 3: broken.gif",
+                        "#### 图片 4: x.jpeg", "#### 图片 5: z.bmp", "#### 图片 6: y.png"]
+    assert f"![A.JPG]({image_dir / 'A.JPG'})\n\n尺寸: 8x6 | 格式: jpeg\n" in content
+    assert "尺寸: 未知 | 格式: 未知" in content and "尺寸: 5x4 | 格式: bmp" in content
+    assert "notes.txt" not in content and "photo.webp" not in content
+    empty = tmp_path / "empty"
+    empty.mkdir()
+    assert not ImageProcessor(config=CONFIG).image_dir_to_markdown(str(empty), str(output))
+
+
+@pytest.mark.parametrize("use_store", [True, False])
+def test_image_markdown_from_bytes(tmp_path, use_store):
+    """内存中的图片放入ImageStore，没有ImageStore时写入引用的路径"""
+    data = encode("PNG")
+    path = str(tmp_path / "upload.png")
+    store = ImageStore(write_to_disk=False) if use_store else None
+    content = ImageProcessor(config=CONFIG).image_markdown(path, source=io.BytesIO(data), image_store=store)
+    assert f"![upload.png]({path})" in content
+    if use_store:
+        assert store.get(path) == (data, "png") and not os.path.exists(path)
+        store.close()
+    else:
+        with open(path, "rb") as f:
+            assert f.read() == data
@@ -0,0 +1,44 @@
+import re
+import pytest
+
+pytest.importorskip("requests")
+pytest.importorskip("PIL")
+pytest.importorskip("dotenv")
+
+from utils.markdown_converter import MarkdownConverter
+
+# 原先process_tables使用的正则，用于校验线性扫描器的输出与之一致
+LEGACY_TABLE_PATTERN = r'(\|[^\n]+\|\n\|[-:\|\s]+\|\n)(\|[^\n]+\|\n)+'
+
+SAMPLES = [
+    "| 产品 | 销量 |\n| --- | --- |\n| A | 100 |\n| B | 200 |\n",
+    "前言\n\n| a | b |\n|:-:|---|\n| 1 | 2 |\n正文",
+    "说明 | a | b |\n|---|---|\n| 1 | 2 |\n",
+    "| a |\n|---|\n\n|-|\n| 1 |\n||\n| 2 |\n",
+    "| a | b |\n|---|---|\n| 1 | 2 |",
+    "| a | b |\n| x | y |\n| 1 | 2 |\n",
+    "|" + " -|" * 2000 + "x\n",
+    "| 名称 | 数量 |\n|\u3000---\u3000|\xa0---\xa0|\n| 甲 | 1 |\n",
+]
+
+
+def legacy_process_tables(converter, content):
+    """使用原正则实现的表格处理，作为对照"""
+    return re.sub(LEGACY_TABLE_PATTERN, lambda m: converter.describe_table(m.group(0)), content)
+
+
+@pytest.mark.parametrize("content", SAMPLES)
+def test_process_tables_matches_legacy_regex(content):
+    """线性扫描器的输出应与原正则实现完全一致"""
+    converter = MarkdownConverter.__new__(MarkdownConverter)
+    assert converter.process_tables(content) == legacy_process_tables(converter, content)
+
+
+def test_process_tables_describes_rows():
+    """表格描述包含行数、列数及每个单元格"""
+    converter = MarkdownConverter.__new__(MarkdownConverter)
+    result = converter.process_tables(SAMPLES[0])
+    assert "> Rows: 2  " in result
+    assert "> Columns: 2  " in result
+    assert '>   列"销量"的内容是"200"  ' in result
+    assert result.endswith("> TABLE_END")
@@ -0,0 +1,76 @@
+import io
+import multiprocessing
+import os
+import time
+
+import fitz
+import pytest
+from PIL import Image
+
+import utils.pdf2md as pdf2md
+
+
+def make_pdf(path):
+    doc = fitz.open()
+    for page_num in range(3):
+        page = doc.new_page()
+        page.insert_text((72, 100), f"Bounded paragraph {page_num + 1}", fontsize=11)
+        buffer = io.BytesIO()
+        Image.new("RGB", (60 + page_num, 40), "red").save(buffer, format="PNG")
+        page.insert_image(fitz.Rect(72, 200, 192, 280), stream=buffer.getvalue())
+    doc.save(path)
+    doc.close()
+
+
+def test_recycled_workers_match_in_process(tmp_path):
+    """每页一个工作进程时输出与进程内转换一致，图片由工作进程直接写入磁盘"""
+    pdf_path = str(tmp_path / "doc.pdf")
+    make_pdf(pdf_path)
+    options = {"table_engine": "pymupdf", "boilerplate": "off"}
+    expected = pdf2md.pdf_to_markdown_string(pdf_path, image_dir=str(tmp_path / "a"), **options)
+    report = {}
+    content = pdf2md.pdf_to_markdown_string(pdf_path, report, image_dir=str(tmp_path / "b"),
+                                            memory_bounded=True, recycle_pages=1, **options)
+    assert content == expected.replace(str(tmp_path / "a"), str(tmp_path / "b"))
+    assert report["workers_started"] == 3 and report["failed_pages"] == []
+    assert sorted(os.listdir(tmp_path / "b")) == sorted(os.listdir(tmp_path / "a"))
+    assert report["peak_rss_mb"] > 0
+
+
+def test_killed_worker_skips_one_page(tmp_path, monkeypatch):
+    """工作进程在第2页被杀死时只跳过这一页，之前发出的结果不丢失"""
+    pdf_path = str(tmp_path / "doc.pdf")
+    make_pdf(pdf_path)
+    extract = pdf2md.extract_page_elements
+
+    def crashing(pdf_path, doc, page_num, *args, **kwargs):
+        if page_num == 1:
+            # 等待上一页的结果由队列的后台线程发出后再退出
+            time.sleep(0.5)
+            os._exit(1)
+        return extract(pdf_path, doc, page_num, *args, **kwargs)
+
+    # fork的工作进程继承替换后的函数
+    monkeypatch.setattr(pdf2md, "extract_page_elements", crashing)
+    fork = multiprocessing.get_context("fork")
+    monkeypatch.setattr(pdf2md.multiprocessing, "get_context", lambda method=None: fork)
+    report = {}
+    content = pdf2md.pdf_to_markdown_string(pdf_path, report, image_dir=str(tmp_path), memory_bounded=True,
+                                            table_engine="pymupdf", boilerplate="off")
+    assert report["failed_pages"] == [2]
+    assert report["workers_started"] == 2 and report["pages"] == 2
+    assert "Bounded paragraph 1" in content and "Bounded paragraph 3" in content
+
+
+def test_all_workers_dying_raises(tmp_path, monkeypatch):
+    """所有页面都失败时抛出异常，而不是写出空的raw.md"""
+    pdf_path = str(tmp_path / "doc.pdf")
+    make_pdf(pdf_path)
+    monkeypatch.setattr(pdf2md, "extract_page_elements", lambda *args, **kwargs: os._exit(1))
+    fork = multiprocessing.get_context("fork")
+    monkeypatch.setattr(pdf2md.multiprocessing, "get_context", lambda method=None: fork)
+    output = tmp_path / "raw.md"
+    with pytest.raises(RuntimeError):
+        pdf2md.pdf_to_markdown(pdf_path, str(output), image_dir=str(tmp_path), memory_bounded=True,
+                               table_engine="pymupdf")
+    assert not output.exists()
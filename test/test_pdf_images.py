@@ -0,0 +1,62 @@
+import io
+
+import fitz
+from PIL import Image
+
+from utils.pdf2md import ImageExtractCache, page_image_placements, pdf_to_markdown
+
+
+def png(size, color, mode="RGB"):
+    buffer = io.BytesIO()
+    Image.new(mode, size, color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def make_pdf(path):
+    logo, photo, spacer = png((60, 40), "red"), png((80, 60), (0, 0, 255, 128), "RGBA"), png((2, 2), "black")
+    doc = fitz.open()
+    for page_num in range(3):
+        page = doc.new_page()
+        page.insert_text((72, 400), f"Body {page_num}", fontsize=11)
+        page.insert_image(fitz.Rect(400, 500, 460, 540), stream=logo)
+        page.insert_image(fitz.Rect(72, 100, 152, 160), stream=photo)
+        page.insert_image(fitz.Rect(72, 300, 74, 302), stream=spacer)
+        page.insert_image(fitz.Rect(300, 100, 360, 140), stream=logo)
+    doc.save(path)
+    doc.close()
+
+
+def test_placements_match_get_image_bbox(tmp_path):
+    pdf_path = str(tmp_path / "images.pdf")
+    make_pdf(pdf_path)
+    with fitz.open(pdf_path) as doc:
+        page = doc[0]
+        images = page.get_images(full=True)
+        placements = page_image_placements(page, images)
+        for img in images:
+            expected = page.get_image_bbox(img)
+            assert all(abs(a - b) < 1e-3 for a, b in zip(placements[img[7]], expected))
+
+        cache = ImageExtractCache(doc)
+        for page in doc:
+            for img in page.get_images(full=True):
+                cache.get(img[0])
+        assert cache.stats["extracted"] == 3
+
+
+def test_pdf_images_skip_small_and_keep_names(tmp_path):
+    pdf_path = str(tmp_path / "images.pdf")
+    make_pdf(pdf_path)
+    with fitz.open(pdf_path) as doc:
+        images = doc[0].get_images(full=True)
+    spacer_index = next(i for i, img in enumerate(images) if img[2] == 2)
+
+    output = tmp_path / "raw.md"
+    pdf_to_markdown(pdf_path, str(output), table_engine="pymupdf", image_dir=str(tmp_path / "img"),
+                    boilerplate="off")
+    content = output.read_text(encoding="utf-8")
+    for page_num in range(3):
+        for img_index in range(len(images)):
+            name = f"image_{page_num}_{img_index}.png"
+            assert (name in content) == (img_index != spacer_index)
+    assert content.count("![Image") == 9
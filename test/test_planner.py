@@ -0,0 +1,72 @@
+import io
+import json
+import zipfile
+
+import fitz
+from PIL import Image
+
+from utils.planner import estimate_cost, plan_corpus, plan_docx, plan_pdf
+
+
+def png(size, color):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def make_pdf(path):
+    """文本页、带边框表格页、扫描页、空白页各一页"""
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_text((72, 100), "Plain body text", fontsize=11)
+    page.insert_image(fitz.Rect(72, 200, 172, 300), stream=png((50, 50), "red"))
+    page.insert_image(fitz.Rect(72, 400, 74, 402), stream=png((2, 2), "black"))
+    page = doc.new_page()
+    page.insert_text((72, 60), "Quarterly figures", fontsize=11)
+    for row in range(4):
+        for col in range(3):
+            page.draw_rect(fitz.Rect(72 + col * 80, 100 + row * 20, 152 + col * 80, 120 + row * 20))
+    page = doc.new_page()
+    page.insert_image(page.rect, stream=png((600, 800), "white"))
+    doc.new_page()
+    doc.save(path)
+    doc.close()
+
+
+def make_docx(path):
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("word/document.xml", "<w:document/>")
+        archive.writestr("word/media/image1.png", png((40, 40), "blue"))
+        archive.writestr("word/media/image2.png", png((40, 40), "green"))
+        archive.writestr("docProps/app.xml", "<Properties><Pages>7</Pages></Properties>")
+
+
+def test_plan_pdf_classifies_pages(tmp_path):
+    pdf_path = str(tmp_path / "a.pdf")
+    make_pdf(pdf_path)
+    plan = plan_pdf(pdf_path)
+    assert (plan["pages"], plan["text_pages"], plan["table_pages"], plan["scanned_pages"], plan["empty_pages"]) == \
+        (4, 2, 1, 1, 1)
+    # 小于min_image_size的间隔图不计入
+    assert plan["images"] == 1 and plan["image_bytes"] > 0
+    assert plan["vision_calls"] == 2
+
+
+def test_plan_corpus_totals_and_estimate(tmp_path):
+    make_pdf(str(tmp_path / "a.pdf"))
+    make_docx(str(tmp_path / "b.docx"))
+    (tmp_path / "broken.pdf").write_bytes(b"not a pdf")
+    (tmp_path / "notes.txt").write_text("ignored")
+    assert plan_docx(str(tmp_path / "b.docx"))["pages"] == 7
+
+    plan = plan_corpus([str(tmp_path)])
+    totals = plan["totals"]
+    assert (totals["pdf_files"], totals["docx_files"], totals["image_files"], totals["errors"]) == (1, 1, 0, 1)
+    assert totals["pages"] == 11 and totals["vision_calls"] == 4
+    json.dumps(plan)
+
+    rates = {"text_page_seconds": 1, "table_page_seconds": 2, "scanned_page_seconds": 3, "docx_seconds": 4,
+             "vision_call_seconds": 10, "vision_concurrency": 2}
+    estimate = estimate_cost(totals, rates)
+    assert estimate["convert_seconds"] == 1 + 2 + 3 + 4
+    assert estimate["vision_seconds"] == 20 and estimate["wall_seconds"] == 30
@@ -0,0 +1,98 @@
+import threading
+import time
+
+from utils.rate_limiter import AdaptiveConcurrency, RateGovernor, TokenBucket, estimate_request_tokens
+
+
+def test_estimate_request_tokens():
+    """512x512以内的图片只有一个瓦片，大图先缩放再按瓦片计数"""
+    assert estimate_request_tokens(400, 300, 100) == 85 + 170 + 100
+    assert estimate_request_tokens(4096, 2048, 0) == 85 + 170 * 6
+    assert estimate_request_tokens(0, 0, 0, prompt_chars=10) == 85 + 170 * 4 + 10
+
+
+def test_token_bucket_limits_rate():
+    """桶容量用完后按配额速率补充"""
+    bucket = TokenBucket(per_minute=600)  # 每秒10个，容量100
+    start = time.monotonic()
+    for _ in range(105):
+        bucket.acquire(1)
+    assert 0.3 <= time.monotonic() - start < 2.0
+    assert TokenBucket(0).acquire(10**9) == 0.0
+
+
+def test_aimd_increases_when_healthy_and_halves_on_overload():
+    """健康时加性增，过载时乘性减，且一个冷却期内只减一次"""
+    control = AdaptiveConcurrency(initial=4, minimum=1, maximum=8, cooldown=60)
+    for _ in range(8):
+        control.acquire()
+        control.release()
+    assert 5 <= control.limit <= 6
+    limit = control.limit
+    for _ in range(3):
+        control.acquire()
+        control.release(overloaded=True)
+    assert control.limit == limit / 2
+
+
+def test_governor_caps_in_flight_requests():
+    """并发请求数不超过并发上限，429计入统计"""
+    governor = RateGovernor(initial_concurrency=2, max_concurrency=2)
+    peak = []
+    lock = threading.Lock()
+
+    def request(status):
+        with governor.slot(100) as slot:
+            with lock:
+                peak.append(governor.concurrency.in_flight)
+            time.sleep(0.02)
+            slot.status = status
+
+    threads = [threading.Thread(target=request, args=(429 if i == 0 else 200,)) for i in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = governor.snapshot()
+    assert max(peak) <= 2
+    assert stats["throttled"] == 1
+    assert stats["achieved_rpm"] > 0
+
+
+class ThrottledResponse:
+    status_code = 429
+    ok = False
+
+    def __init__(self, retry_after):
+        self.headers = {"Retry-After": retry_after}
+
+
+class ThrottledSession:
+    """前几次请求返回429，之后返回200"""
+
+    def __init__(self, retry_after, failures):
+        self.retry_after = retry_after
+        self.failures = failures
+
+    def post(self, *args, **kwargs):
+        if self.failures:
+            self.failures -= 1
+            return ThrottledResponse(self.retry_after)
+        response = ThrottledResponse(None)
+        response.status_code, response.ok = 200, True
+        response.raise_for_status = lambda: None
+        return response
+
+
+def test_retry_after_is_clamped(monkeypatch):
+    """过大的Retry-After不超过max_retry_wait，无法解析的值退回指数退避"""
+    import utils.image_processor as image_processor
+    sleeps = []
+    monkeypatch.setattr(image_processor.time, "sleep", sleeps.append)
+    config = {"base_url": "http://127.0.0.1:9", "model": "stub", "api_key": "test", "max_retries": 3,
+              "retry_backoff": 0.5, "max_retry_wait": 5}
+    for retry_after, expected in (("3600", 5), ("-10", 0), ("nan", 0.5), ("2", 2)):
+        sleeps.clear()
+        processor = image_processor.ImageProcessor(config=config, session=ThrottledSession(retry_after, 1))
+        assert processor.post_chat_completion({}, {}).status_code == 200
+        assert sleeps == [expected]
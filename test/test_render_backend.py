@@ -0,0 +1,40 @@
+import fitz
+
+from utils.pdf2md import extract_tables
+from utils.render_backend import PyMuPDFBackend, make_lattice_backend
+from utils.table_benchmark import make_table_corpus
+
+
+def test_pymupdf_backend_matches_pdfium(tmp_path):
+    """进程内渲染检测到的表格与camelot默认后端的位置和单元格一致"""
+    pdf_path = str(tmp_path / "tables.pdf")
+    make_table_corpus(pdf_path, 2, seed=1)
+    with fitz.open(pdf_path) as doc:
+        backend = make_lattice_backend(doc, "pymupdf", 300)
+        for page_num in range(2):
+            ours = extract_tables(pdf_path, doc, page_num, "camelot-lattice", backend)
+            reference = extract_tables(pdf_path, doc, page_num, "camelot-lattice", "pdfium")
+            assert len(ours) == len(reference) == 1
+            assert all(abs(a - b) < 1.0 for a, b in zip(ours[0][0], reference[0][0]))
+            assert ours[0][1].equals(reference[0][1])
+        assert backend.stats["renders"] == 2
+
+
+def test_render_cache_per_page_and_dpi(tmp_path):
+    """同一页同一分辨率只渲染一次，返回的数组是副本"""
+    pdf_path = str(tmp_path / "tables.pdf")
+    make_table_corpus(pdf_path, 3)
+    with fitz.open(pdf_path) as doc:
+        backend = PyMuPDFBackend(doc, resolution=72, cache_size=2)
+        first = backend.to_array(pdf_path, page=1)
+        assert first.shape == (842, 595, 3)
+        first[:] = 0
+        assert backend.to_array(pdf_path, page=1).max() == 255
+        assert backend.stats == {"renders": 1, "cache_hits": 1}
+        backend.to_array(pdf_path, page=2)
+        backend.to_array(pdf_path, page=3)
+        backend.to_array(pdf_path, page=1)
+        assert backend.stats["renders"] == 4
+        backend.convert(pdf_path, str(tmp_path / "page.png"), page=3)
+        assert backend.stats["cache_hits"] == 2
+        assert fitz.Pixmap(str(tmp_path / "page.png")).width == 595
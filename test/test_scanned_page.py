@@ -0,0 +1,71 @@
+import io
+
+import fitz
+from PIL import Image
+from pdfminer.high_level import extract_pages
+
+from utils.pdf2md import image_coverage, is_scanned_page, union_area
+
+
+def png(size):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, "white").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def make_pdf(path):
+    """第1页为切成四条的扫描页，第2页为正文加一张大图"""
+    doc = fitz.open()
+    page = doc.new_page()
+    strip = png((600, 200))
+    height = page.rect.height / 4
+    for i in range(4):
+        page.insert_image(fitz.Rect(0, i * height, page.rect.width, (i + 1) * height), stream=strip)
+    page = doc.new_page()
+    page.insert_text((72, 72), "Caption above the figure", fontsize=11)
+    page.insert_image(fitz.Rect(0, 100, page.rect.width, page.rect.height), stream=png((600, 800)))
+    doc.save(path)
+    doc.close()
+
+
+def test_is_scanned_page(tmp_path):
+    pdf_path = str(tmp_path / "scan.pdf")
+    make_pdf(pdf_path)
+    layouts = list(extract_pages(pdf_path))
+    with fitz.open(pdf_path) as doc:
+        scanned, text_page = doc[0], doc[1]
+        assert image_coverage(scanned) > 0.9
+        assert is_scanned_page(layouts[0], scanned, 0.6)
+        assert not is_scanned_page(layouts[0], scanned, 1.01)
+        # 有文本层的页面即使图片覆盖率很高也不是扫描页
+        assert image_coverage(text_page) > 0.8
+        assert not is_scanned_page(layouts[1], text_page, 0.6)
+        # 版面分析超时时用PyMuPDF检查文本层
+        assert is_scanned_page(None, scanned, 0.6)
+        assert not is_scanned_page(None, text_page, 0.6)
+
+
+def test_overlapping_images_counted_once(tmp_path):
+    """同一区域叠放多张图片时覆盖率按并集计算，不会被误判为扫描页"""
+    pdf_path = str(tmp_path / "stacked.pdf")
+    doc = fitz.open()
+    page = doc.new_page()
+    quarter = fitz.Rect(0, 0, page.rect.width / 2, page.rect.height / 2)
+    for i in range(6):
+        page.insert_image(quarter, stream=png((300, 420 + i)), keep_proportion=False)
+    # 部分超出页面的图片只计算页面内的部分
+    page.insert_image(fitz.Rect(page.rect.width / 2, -200, page.rect.width + 200, 10), stream=png((300, 100)),
+                      keep_proportion=False)
+    doc.save(pdf_path)
+    doc.close()
+    layouts = list(extract_pages(pdf_path))
+    with fitz.open(pdf_path) as doc:
+        assert 0.25 <= image_coverage(doc[0]) < 0.3
+        assert not is_scanned_page(layouts[0], doc[0], 0.6)
+
+
+def test_union_area():
+    assert union_area([]) == 0
+    assert union_area([(0, 0, 10, 10), (0, 0, 10, 10)]) == 100
+    assert union_area([(0, 0, 10, 10), (5, 5, 15, 15)]) == 175
+    assert union_area([(0, 0, 10, 10), (20, 0, 30, 10), (0, 20, 10, 30)]) == 300
@@ -0,0 +1,140 @@
+import io
+import os
+import threading
+import pytest
+
+requests = pytest.importorskip("requests")
+Image = pytest.importorskip("PIL.Image")
+pytest.importorskip("fitz")
+pytest.importorskip("camelot")
+pytest.importorskip("pypandoc")
+
+from utils.image_processor import ImageProcessor
+from utils.metrics import percentile
+import utils.service as service_module
+from utils.service import MAX_WAIT_SECONDS, ConversionService, create_server, parse_wait
+from utils.vision_stub import VisionStubServer
+
+
+@pytest.fixture
+def running_service(tmp_path):
+    vision = VisionStubServer().start()
+    config = {
+        "base_url": vision.base_url,
+        "model": "stub",
+        "api_key": "test",
+        "max_tokens": 16,
+        "temperature": 0,
+    }
+    service = ConversionService(str(tmp_path / "jobs"), workers=2, image_processor=ImageProcessor(config=config))
+    service.start()
+    server = create_server(service, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield service, f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    service.stop()
+    vision.stop()
+
+
+def make_png():
+    buffer = io.BytesIO()
+    Image.new("RGB", (32, 24), "white").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_upload_image_and_stream_emb(running_service):
+    """上传图片后，emb.md中应包含桩服务返回的分析结果"""
+    service, base_url = running_service
+    response = requests.post(f"{base_url}/jobs?filename=photo.png", data=make_png())
+    assert response.status_code == 202
+    job_id = response.json()["id"]
+
+    status = requests.get(f"{base_url}/jobs/{job_id}?wait=30").json()
+    assert status["status"] == "done", status
+
+    emb = requests.get(f"{base_url}/jobs/{job_id}/emb").text
+    assert "> OCR: 示例文字 sample text" in emb
+    assert "> Size: 32x24" in emb
+
+    metrics = requests.get(f"{base_url}/metrics").json()
+    assert metrics["completed"] == 1
+    assert metrics["queue_depth"] == 0
+    assert metrics["in_flight"] == 0
+
+
+def test_submit_missing_path_is_rejected(running_service):
+    """提交不存在的本地文件返回400"""
+    _, base_url = running_service
+    response = requests.post(f"{base_url}/jobs", json={"path": "/nonexistent/file.pdf"})
+    assert response.status_code == 400
+
+
+def test_percentile():
+    """最近秩法分位数"""
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 95) == 95
+    assert percentile([], 50) is None
+
+
+def test_wait_parameter_is_validated(running_service):
+    """wait参数不是数字时返回400，负数按0处理"""
+    service, base_url = running_service
+    job_id = requests.post(f"{base_url}/jobs?filename=photo.png", data=make_png()).json()["id"]
+    assert requests.get(f"{base_url}/jobs/{job_id}?wait=abc").status_code == 400
+    assert requests.get(f"{base_url}/jobs/{job_id}?wait=nan").status_code == 400
+    assert requests.get(f"{base_url}/jobs/{job_id}?wait=-5").status_code == 200
+    assert requests.get(f"{base_url}/jobs/{job_id}?wait=30").json()["status"] == "done"
+
+
+def test_finished_jobs_are_evicted(running_service):
+    """超出保留数量或保留时间的已结束任务连同任务目录一起删除"""
+    service, base_url = running_service
+    service.max_finished_jobs = 2
+    jobs = [service.submit_upload(io.BytesIO(make_png()), len(make_png()), f"p{i}.png") for i in range(3)]
+    for job in jobs:
+        assert job.done.wait(30)
+    service._evict_finished()
+    assert [job.id in service.jobs for job in jobs].count(True) == 2
+    evicted = [job for job in jobs if job.id not in service.jobs]
+    assert not any(os.path.exists(job.job_dir) for job in evicted)
+    assert requests.get(f"{base_url}/jobs/{evicted[0].id}").status_code == 404
+    assert service._evict_finished(now=max(job.finished_at for job in jobs) + service.job_ttl + 1) == 2
+    assert service.jobs == {}
+    assert service.metrics()["submitted"] == 3
+
+
+def test_parse_wait():
+    assert parse_wait("2.5") == 2.5
+    assert parse_wait("-1") == 0
+    assert parse_wait("inf") == MAX_WAIT_SECONDS
+
+
+def idle_service(tmp_path):
+    """不启动工作线程的服务，提交的任务一直排队"""
+    config = {"base_url": "http://127.0.0.1:9", "model": "stub", "api_key": "test", "max_tokens": 16,
+              "temperature": 0}
+    return ConversionService(str(tmp_path / "jobs"), image_processor=ImageProcessor(config=config))
+
+
+def test_upload_memory_is_capped(tmp_path, monkeypatch):
+    """内存中的上传内容合计超过上限后，新的上传写入任务目录"""
+    monkeypatch.setattr(service_module, "UPLOAD_MEMORY_TOTAL", 150)
+    service = idle_service(tmp_path)
+    first = service.submit_upload(io.BytesIO(b"a" * 100), 100, "a.png")
+    second = service.submit_upload(io.BytesIO(b"b" * 100), 100, "b.png")
+    assert first.data == b"a" * 100 and not os.path.exists(first.input_path)
+    assert second.data is None
+    with open(second.input_path, "rb") as f:
+        assert f.read() == b"b" * 100
+    assert service.metrics()["upload_memory_bytes"] == 100
+
+
+@pytest.mark.parametrize("length", [10, service_module.UPLOAD_MEMORY_LIMIT + 1])
+def test_short_upload_is_rejected(tmp_path, length):
+    """读到的内容短于Content-Length时拒绝任务并删除任务目录"""
+    service = idle_service(tmp_path)
+    with pytest.raises(ValueError):
+        service.submit_upload(io.BytesIO(b"short"), length, "c.png")
+    assert service.jobs == {} and os.listdir(tmp_path / "jobs") == []
+    assert service.metrics()["upload_memory_bytes"] == 0
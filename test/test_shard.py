@@ -0,0 +1,34 @@
+import pytest
+
+from utils.shard import parse_page_range, select_pages, shard_pages, merge_markdown
+
+
+def test_parse_page_range():
+    """页码从1开始且包含两端，超出总页数的部分被截断"""
+    assert parse_page_range("100-102", 500) == [99, 100, 101]
+    assert parse_page_range("1-3,7", 10) == [0, 1, 2, 6]
+    assert parse_page_range("8-", 10) == [7, 8, 9]
+    assert parse_page_range("9-20", 10) == [8, 9]
+    with pytest.raises(ValueError):
+        parse_page_range("5-3", 10)
+
+
+def test_shards_cover_all_pages_in_order():
+    """各分片是连续的页面段，拼起来正好覆盖全部页面"""
+    pages = list(range(10))
+    shards = [shard_pages(pages, f"{i}/3") for i in range(1, 4)]
+    assert shards == [[0, 1, 2, 3], [4, 5, 6], [7, 8, 9]]
+    assert select_pages(10, pages_spec="3-8", shard_spec="2/2") == [5, 6, 7]
+    with pytest.raises(ValueError):
+        shard_pages(pages, "0/3")
+
+
+def test_merge_orders_shards_by_page(tmp_path):
+    """合并时按第一个页标题排序，而不是按传入顺序"""
+    second = tmp_path / "b.md"
+    second.write_text("# Page 11\n\nB\n\n", encoding="utf-8")
+    first = tmp_path / "a.md"
+    first.write_text("# Page 2\n\nA\n\n", encoding="utf-8")
+    output = tmp_path / "merged.md"
+    merge_markdown([str(second), str(first)], str(output))
+    assert output.read_text(encoding="utf-8") == "# Page 2\n\nA\n\n# Page 11\n\nB\n\n"
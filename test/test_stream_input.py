@@ -0,0 +1,69 @@
+import io
+
+import fitz
+
+import utils.docx2md as docx2md
+import utils.pdf2md as pdf2md
+from utils.pipeline import convert_document
+
+
+def make_pdf():
+    doc = fitz.open()
+    for page_num in range(2):
+        page = doc.new_page()
+        page.insert_text((72, 100), f"Streamed paragraph {page_num + 1}", fontsize=11)
+        for row in range(3):
+            for col in range(2):
+                page.draw_rect(fitz.Rect(72 + col * 100, 200 + row * 20, 172 + col * 100, 220 + row * 20))
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def test_pdf_bytes_match_path(tmp_path, monkeypatch):
+    """内存中的PDF与文件路径输出一致，pymupdf引擎不写临时文件"""
+    data = make_pdf()
+    pdf_path = tmp_path / "doc.pdf"
+    pdf_path.write_bytes(data)
+    options = {"table_engine": "pymupdf", "image_dir": str(tmp_path), "boilerplate": "off"}
+    expected = pdf2md.pdf_to_markdown_string(str(pdf_path), **options)
+
+    def no_spill(*args):
+        raise AssertionError("unexpected temp file")
+
+    monkeypatch.setattr(pdf2md, "spill_to_tempfile", no_spill)
+    report = {}
+    assert pdf2md.pdf_to_markdown_string(data, report, **options) == expected
+    assert pdf2md.pdf_to_markdown_string(io.BytesIO(data), **options) == expected
+    assert "Streamed paragraph 2" in expected and report["pages"] == 2
+
+
+def test_pdf_stream_with_camelot(tmp_path):
+    """camelot需要文件路径，整个文档共用一个临时文件"""
+    data = make_pdf()
+    pdf_path = tmp_path / "doc.pdf"
+    pdf_path.write_bytes(data)
+    options = {"table_engine": "camelot-lattice", "image_dir": str(tmp_path), "boilerplate": "off"}
+    assert pdf2md.pdf_to_markdown_string(io.BytesIO(data), **options) == \
+        pdf2md.pdf_to_markdown_string(str(pdf_path), **options)
+
+
+def test_docx_bytes_piped_to_pandoc(tmp_path, monkeypatch):
+    calls = []
+
+    def convert_text(source, to, format, extra_args=()):
+        calls.append((source, to, format))
+        return "![logo](media/image1.png){width=\"2in\"}\n\n| a | b |\n| 1 | 2 |\n"
+
+    monkeypatch.setattr(docx2md.pypandoc, "convert_text", convert_text)
+    content = docx2md.docx_to_markdown_string(io.BytesIO(b"PK docx"), img_dir=str(tmp_path / "img"))
+    assert calls == [(b"PK docx", "markdown", "docx")]
+    assert "{width" not in content and "| ---- | ---- |" in content
+
+
+def test_convert_document_from_memory(tmp_path):
+    raw_path = tmp_path / "raw.md"
+    report = convert_document("upload.pdf", str(raw_path), data=make_pdf(), image_dir=str(tmp_path),
+                              pdf_options={"table_engine": "pymupdf"})
+    assert report["pdf"]["pages"] == 2
+    assert "Streamed paragraph 1" in raw_path.read_text(encoding="utf-8")
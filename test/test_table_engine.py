@@ -0,0 +1,31 @@
+import fitz
+
+from utils.pdf2md import extract_tables
+
+
+def make_pdf(path):
+    """在非默认尺寸的页面上绘制3行2列的表格，左上角坐标为(72, 200)，右下角为(272, 260)"""
+    doc = fitz.open()
+    page = doc.new_page(width=400, height=500)
+    page.insert_text((72, 150), "Text above the table", fontsize=11)
+    for row in range(3):
+        for col in range(2):
+            rect = fitz.Rect(72 + col * 100, 200 + row * 20, 172 + col * 100, 220 + row * 20)
+            page.draw_rect(rect)
+            page.insert_text((rect.x0 + 4, rect.y1 - 6), f"r{row}c{col}", fontsize=9)
+    doc.save(path)
+    doc.close()
+
+
+def test_pymupdf_bbox_uses_bottom_left_origin(tmp_path):
+    pdf_path = str(tmp_path / "table.pdf")
+    make_pdf(pdf_path)
+    with fitz.open(pdf_path) as doc:
+        tables = extract_tables(None, doc, 0, engine="pymupdf")
+        assert len(tables) == 1
+        bbox, df = tables[0]
+        assert all(abs(a - b) < 1 for a, b in zip(bbox, (72, 240, 272, 300)))
+        assert df.values.tolist() == [["r0c0", "r0c1"], ["r1c0", "r1c1"], ["r2c0", "r2c1"]]
+        # 与camelot的坐标系一致
+        (camelot_bbox, _), = extract_tables(pdf_path, doc, 0, engine="camelot-lattice")
+        assert all(abs(a - b) < 3 for a, b in zip(bbox, camelot_bbox))
@@ -0,0 +1,59 @@
+import pytest
+
+pytest.importorskip("requests")
+pytest.importorskip("PIL")
+
+from utils.loadtest import run_loadtest
+from utils.vision_stub import VisionStubServer, parse_latency
+
+
+def test_parse_latency():
+    """延迟分布字符串解析为采样函数"""
+    assert parse_latency("fixed:0.25")() == 0.25
+    assert 0.1 <= parse_latency("uniform:0.1,0.2")() <= 0.2
+    with pytest.raises(ValueError):
+        parse_latency("gamma:1")
+
+
+def test_loadtest_reports_throughput_and_retries():
+    """所有图片都应被分析，500错误会被重试并计入统计"""
+    with VisionStubServer(latency="fixed:0", error_rate=0.3, seed=7) as stub:
+        report = run_loadtest(stub.base_url, 20, {"retry_backoff": 0, "max_retries": 10})
+    assert report["analyzed"] == 20
+    assert report["failures"] == 0
+    assert report["retries"] == stub.stats["errors"] > 0
+    assert report["latency_seconds"]["p50"] is not None
+
+
+def test_burst_returns_429_with_retry_after():
+    """突发期内返回带Retry-After头的429"""
+    import requests
+    with VisionStubServer(burst_every=10, burst_length=10, retry_after=2) as stub:
+        response = requests.post(f"{stub.base_url}/chat/completions", json={})
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "2"
+
+
+@pytest.mark.parametrize("body", [b"not json", b"[1, 2]", b'"text"', b'{"max_tokens": "many"}'])
+def test_malformed_body_is_answered(body):
+    """请求体不是JSON对象时仍返回200"""
+    import requests
+    with VisionStubServer() as stub:
+        response = requests.post(f"{stub.base_url}/chat/completions", data=body)
+    assert response.status_code == 200
+    assert response.json()["model"] == "stub"
+
+
+def test_seed_is_per_instance():
+    """相同种子的实例产生相同的延迟序列，且不影响全局random状态"""
+    import random
+    random.seed(1)
+    expected = random.random()
+    random.seed(1)
+    samples = [VisionStubServer(latency="exp:0.5", seed=3) for _ in range(2)]
+    try:
+        assert [samples[0].sample_latency() for _ in range(5)] == [samples[1].sample_latency() for _ in range(5)]
+    finally:
+        for stub in samples:
+            stub.server.server_close()
+    assert random.random() == expected
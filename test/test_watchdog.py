@@ -0,0 +1,167 @@
+import multiprocessing
+import signal
+import threading
+import time
+
+import fitz
+import pytest
+
+import utils.pdf2md as pdf2md
+from utils.watchdog import StageTimeout, stage_timeout
+
+
+def make_pdf(path, pages=3):
+    doc = fitz.open()
+    for page_num in range(pages):
+        page = doc.new_page()
+        page.insert_text((72, 300), f"Paragraph {page_num + 1} survives the timeout", fontsize=11)
+    doc.save(path)
+    doc.close()
+
+
+def test_stage_timeout_interrupts_busy_loop():
+    start = time.monotonic()
+    with pytest.raises(StageTimeout) as info:
+        with stage_timeout("table", 0.2):
+            while True:
+                pass
+    assert info.value.stage == "table"
+    assert time.monotonic() - start < 2
+    # 时限为0时不设置定时器
+    with stage_timeout("table", 0):
+        time.sleep(0.01)
+
+
+def test_table_timeout_emits_text_only(tmp_path, monkeypatch):
+    """表格阶段超时的页面仍然输出正文，超时记录在报告中"""
+    pdf_path = str(tmp_path / "doc.pdf")
+    make_pdf(pdf_path)
+
+    def slow_tables(pdf_path, doc, page_num, *args):
+        if page_num == 1:
+            while True:
+                pass
+        return []
+
+    monkeypatch.setattr(pdf2md, "extract_tables", slow_tables)
+    output = tmp_path / "raw.md"
+    report = pdf2md.pdf_to_markdown(pdf_path, str(output), image_dir=str(tmp_path), boilerplate="off",
+                                    table_timeout=0.2)
+    content = output.read_text(encoding="utf-8")
+    assert content.count("survives the timeout") == 3
+    assert report["timeouts"] == [{"page": 2, "stage": "table"}]
+
+
+def test_layout_timeout_falls_back_to_fitz_text(tmp_path, monkeypatch):
+    """版面分析超时的页面改用PyMuPDF的文本块，后续页面重新进行版面分析"""
+    pdf_path = str(tmp_path / "doc.pdf")
+    make_pdf(pdf_path)
+    real_extract_pages = pdf2md.extract_pages
+
+    def slow_extract_pages(pdf_path, page_numbers=None):
+        for page_num, layout in zip(sorted(page_numbers), real_extract_pages(pdf_path, page_numbers=page_numbers)):
+            if page_num == 0:
+                while True:
+                    pass
+            yield layout
+
+    monkeypatch.setattr(pdf2md, "extract_pages", slow_extract_pages)
+    output = tmp_path / "raw.md"
+    report = pdf2md.pdf_to_markdown(pdf_path, str(output), table_engine="pymupdf", image_dir=str(tmp_path),
+                                    boilerplate="off", layout_timeout=0.2)
+    content = output.read_text(encoding="utf-8")
+    for page_num in range(3):
+        assert f"Paragraph {page_num + 1} survives" in content
+    assert report["timeouts"] == [{"page": 1, "stage": "layout"}]
+
+
+def use_fork(monkeypatch):
+    """fork的工作进程继承测试中替换的函数"""
+    fork = multiprocessing.get_context("fork")
+    monkeypatch.setattr(pdf2md.multiprocessing, "get_context", lambda method=None: fork)
+
+
+def slow_tables_on_page(slow_page, block_alarm=False):
+    def slow_tables(pdf_path, doc, page_num, *args):
+        if page_num == slow_page:
+            if block_alarm:
+                # 模拟停留在C扩展中、不响应SIGALRM的阶段
+                signal.signal(signal.SIGALRM, signal.SIG_IGN)
+            while True:
+                pass
+        return []
+    return slow_tables
+
+
+def run_in_thread(target):
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(target()))
+    thread.start()
+    thread.join(30)
+    return result
+
+
+def test_timeouts_off_main_thread_are_reported(tmp_path):
+    """在工作线程中转换时不会自动启动工作进程，时限无法生效记录在报告中"""
+    pdf_path = str(tmp_path / "doc.pdf")
+    make_pdf(pdf_path)
+
+    def convert():
+        report = {}
+        content = pdf2md.pdf_to_markdown_string(pdf_path, report, image_dir=str(tmp_path), boilerplate="off",
+                                                table_engine="pymupdf", table_timeout=5)
+        return {"content": content, "report": report}
+
+    result = run_in_thread(convert)
+    assert result["content"].count("survives the timeout") == 3
+    assert result["report"]["workers_started"] == 0 and result["report"]["timeouts_unsupported"]
+
+
+def test_memory_bounded_timeouts_off_main_thread(tmp_path, monkeypatch):
+    """内存受限模式下在工作线程中转换，表格时限在工作进程中生效"""
+    pdf_path = str(tmp_path / "doc.pdf")
+    make_pdf(pdf_path)
+    use_fork(monkeypatch)
+    monkeypatch.setattr(pdf2md, "extract_tables", slow_tables_on_page(1))
+
+    def convert():
+        report = {}
+        content = pdf2md.pdf_to_markdown_string(pdf_path, report, image_dir=str(tmp_path), boilerplate="off",
+                                                memory_bounded=True, table_timeout=0.2)
+        return {"content": content, "report": report}
+
+    result = run_in_thread(convert)
+    assert result["content"].count("survives the timeout") == 3
+    assert result["report"]["timeouts"] == [{"page": 2, "stage": "table"}]
+    assert result["report"]["workers_started"] == 1
+    assert not result["report"]["timeouts_unsupported"]
+
+
+def test_stuck_worker_is_terminated(tmp_path, monkeypatch):
+    """不响应SIGALRM的页面超过单页期限后终止工作进程并跳过该页"""
+    pdf_path = str(tmp_path / "doc.pdf")
+    make_pdf(pdf_path)
+    use_fork(monkeypatch)
+    monkeypatch.setattr(pdf2md, "extract_tables", slow_tables_on_page(1, block_alarm=True))
+    monkeypatch.setitem(pdf2md.PDF_CONFIG, "worker_page_grace", 0)
+    report = {}
+    content = pdf2md.pdf_to_markdown_string(pdf_path, report, image_dir=str(tmp_path), boilerplate="off",
+                                            memory_bounded=True, layout_timeout=0.2, table_timeout=0.2)
+    assert report["failed_pages"] == [2]
+    assert report["timeouts"] == [{"page": 2, "stage": "page"}]
+    assert "Paragraph 1" in content and "Paragraph 3" in content
+
+
+def test_unsupported_platform_is_reported(tmp_path, monkeypatch):
+    pdf_path = str(tmp_path / "doc.pdf")
+    make_pdf(pdf_path, pages=1)
+    monkeypatch.setattr(pdf2md, "timeouts_available", lambda: False)
+    monkeypatch.setattr(pdf2md, "timeouts_supported", lambda: False)
+    report = {}
+    pdf2md.pdf_to_markdown_string(pdf_path, report, image_dir=str(tmp_path), boilerplate="off",
+                                  table_engine="pymupdf", memory_bounded=True, table_timeout=1)
+    assert report["timeouts_unsupported"]
+    # 默认不设置时限
+    report = {}
+    pdf2md.pdf_to_markdown_string(pdf_path, report, image_dir=str(tmp_path), table_engine="pymupdf")
+    assert not report["timeouts_unsupported"]
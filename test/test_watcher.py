@@ -0,0 +1,127 @@
+import os
+import threading
+import time
+
+import pytest
+
+import utils.watcher as watcher
+from utils.watcher import FolderWatcher, InotifyWatcher
+
+
+@pytest.fixture
+def conversions(monkeypatch):
+    """用写出输入内容的桩函数代替实际转换，记录每次转换的文件"""
+    calls = []
+
+    def fake_convert(input_path, raw_path, emb_path=None, **kwargs):
+        with open(input_path, "rb") as f:
+            data = f.read()
+        calls.append((os.path.basename(input_path), data))
+        with open(raw_path, "wb") as f:
+            f.write(data)
+
+    monkeypatch.setattr(watcher, "convert_document", fake_convert)
+    return calls
+
+
+def make_watcher(watch_dir, **kwargs):
+    return FolderWatcher(str(watch_dir), workers=2, image_processor=object(), skip_emb=True, **kwargs)
+
+
+def wait_until(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_debounce_waits_for_writes_to_settle(tmp_path, conversions):
+    """仍在写入的文件不会被转换，静止后只转换一次最终内容"""
+    folder = make_watcher(tmp_path, debounce=0.3)
+    path = tmp_path / "a.pdf"
+    path.write_bytes(b"part")
+    folder.notify([str(path)], now=0)
+    assert folder.dispatch_ready(now=0.1) == 0
+    with open(path, "ab") as f:
+        f.write(b" more")
+    assert folder.dispatch_ready(now=0.35) == 0
+    assert folder.dispatch_ready(now=0.7) == 1
+    assert wait_until(folder.idle)
+    folder._executor.shutdown(wait=True)
+    assert conversions == [("a.pdf", b"part more")]
+    assert (tmp_path / ".converted" / "a.pdf.raw.md").read_bytes() == b"part more"
+
+
+def test_ignored_files(tmp_path):
+    folder = make_watcher(tmp_path)
+    assert folder.is_watched(str(tmp_path / "sub" / "b.docx"))
+    for name in ("notes.txt", "~$draft.docx", ".hidden/a.pdf", ".converted/x.png"):
+        assert not folder.is_watched(str(tmp_path / name))
+
+
+@pytest.mark.parametrize("poll_interval", [None, 0.1])
+def test_watch_and_resume(tmp_path, conversions, poll_interval):
+    """新文件被自动转换；重启后只转换离线期间新增或修改的文件"""
+    if poll_interval is None:
+        try:
+            InotifyWatcher(str(tmp_path)).close()
+        except OSError:
+            pytest.skip("inotify不可用")
+    inbox = tmp_path / "inbox"
+    (inbox / "sub").mkdir(parents=True)
+    (inbox / "old.png").write_bytes(b"old")
+
+    def run_once(action, expected):
+        folder = make_watcher(inbox, debounce=0.1, poll_interval=poll_interval)
+        stop = threading.Event()
+        thread = threading.Thread(target=folder.run, args=(stop,))
+        thread.start()
+        time.sleep(0.2)
+        action()
+        assert wait_until(lambda: len(conversions) >= expected and folder.idle())
+        time.sleep(0.3)
+        stop.set()
+        thread.join()
+
+    run_once(lambda: (inbox / "sub" / "new.pdf").write_bytes(b"new"), 2)
+    assert sorted(conversions) == [("new.pdf", b"new"), ("old.png", b"old")]
+
+    conversions.clear()
+    (inbox / "old.png").write_bytes(b"old v2")
+    run_once(lambda: (inbox / "late.docx").write_bytes(b"late"), 2)
+    assert sorted(conversions) == [("late.docx", b"late"), ("old.png", b"old v2")]
+
+
+def test_failed_conversion_retried_after_restart(tmp_path, monkeypatch):
+    """转换失败的文件在本次运行中不反复重试，重启后重新转换"""
+    calls = []
+
+    def flaky_convert(input_path, raw_path, emb_path=None, **kwargs):
+        calls.append(os.path.basename(input_path))
+        if len(calls) == 1:
+            raise RuntimeError("vision API unavailable")
+        with open(raw_path, "w") as f:
+            f.write("ok")
+
+    monkeypatch.setattr(watcher, "convert_document", flaky_convert)
+    path = tmp_path / "a.pdf"
+    path.write_bytes(b"doc")
+
+    def run_once():
+        folder = make_watcher(tmp_path, debounce=0)
+        folder.notify([str(path)], now=0)
+        folder.dispatch_ready(now=1)
+        assert wait_until(folder.idle)
+        # 同一版本的重复事件不会再次触发转换
+        folder.notify([str(path)], now=2)
+        assert folder.dispatch_ready(now=3) == 0
+        folder._executor.shutdown(wait=True)
+        return folder
+
+    assert run_once().stats["failed"] == 1 and calls == ["a.pdf"]
+    assert run_once().stats["converted"] == 1 and calls == ["a.pdf", "a.pdf"]
+    folder = make_watcher(tmp_path, debounce=0)
+    folder.notify([str(path)], now=0)
+    assert folder.stats["skipped"] == 1 and folder.idle()
@@ -0,0 +1,118 @@
+"""
+页眉页脚去除模块，在文档级别找出在大多数页面的同一位置重复出现的文本（页眉、页脚、页码、保密声明等），
+在渲染Markdown之前删除，或只保留第一次出现
+"""
+
+import re
+from collections import defaultdict
+from config import PDF_CONFIG
+
+BOILERPLATE_MODES = ("drop", "once", "off")
+
+def normalize_text(text):
+    """
+    归一化元素文本用于比较：去掉标题标记，数字统一替换为#，合并空白并转为小写，
+    使"第 3 页 / 共 10 页"与"第 4 页 / 共 10 页"被视为同一文本
+    """
+    text = re.sub(r'^#+\s*', '', text.strip())
+    text = re.sub(r'\d+', '#', text)
+    return ' '.join(text.split()).lower()
+
+def _zone(y1, page_height, margin):
+    """
+    判断元素所在的页边区域
+
+    Returns:
+        ("header", 距页面顶部的距离)、("footer", 距页面底部的距离)，不在页边区域时返回None
+    """
+    limit = margin * page_height
+    if page_height - y1 <= limit:
+        return "header", page_height - y1
+    if y1 <= limit:
+        return "footer", y1
+    return None
+
+def _margin_elements(elements, page_height, margin):
+    """产出页边区域内的文本和标题元素：(index, 区域, 归一化文本, 到页边的距离)"""
+    for index, (elem_type, content, _, _, x0, y1) in enumerate(elements):
+        if elem_type not in ("text", "heading"):
+            continue
+        zone = _zone(y1, page_height, margin)
+        key = normalize_text(content)
+        if zone and key:
+            yield index, zone[0], key, zone[1]
+
+def remove_boilerplate(pages, mode=None, min_ratio=None, min_pages=None, margin=None, tolerance=None,
+                       reference=None):
+    """
+    去除各页重复出现的页眉页脚
+
+    只考虑页面顶部和底部margin比例范围内的文本和标题元素。归一化文本相同、所在区域相同，
+    且到页边的距离与中位数相差不超过tolerance的元素，出现在至少min_ratio比例（且不少于min_pages）
+    的页面上时视为重复内容
+
+    Args:
+        pages: {page_num: (elements, page_height)}，elements为(type, content, font_size, is_bold, x0, y1)列表
+        mode: "drop"删除所有重复元素，"once"只保留第一次出现，"off"不处理；默认使用PDF_CONFIG["boilerplate_mode"]
+        min_ratio: 重复页面占全部页面的最小比例，默认使用PDF_CONFIG["boilerplate_min_ratio"]
+        min_pages: 重复页面的最少页数，默认使用PDF_CONFIG["boilerplate_min_pages"]
+        margin: 页眉页脚区域占页面高度的比例，默认使用PDF_CONFIG["boilerplate_margin"]
+        tolerance: 同一位置允许的偏差（pt），默认使用PDF_CONFIG["boilerplate_tolerance"]
+        reference: 可选的{page_num: (elements, page_height)}，在其中识别重复内容，再从pages中删除；
+                   只转换部分页面（分片）时传入整个文档的页面，使各分片的识别结果和"once"保留的位置一致
+
+    Returns:
+        (pages, stats)，pages为去除重复元素后的新字典；stats包含删除的元素数、字符数以及识别出的重复文本
+    """
+    mode = mode or PDF_CONFIG["boilerplate_mode"]
+    min_ratio = min_ratio if min_ratio is not None else PDF_CONFIG["boilerplate_min_ratio"]
+    min_pages = min_pages if min_pages is not None else PDF_CONFIG["boilerplate_min_pages"]
+    margin = margin if margin is not None else PDF_CONFIG["boilerplate_margin"]
+    tolerance = tolerance if tolerance is not None else PDF_CONFIG["boilerplate_tolerance"]
+    reference = pages if reference is None else reference
+    stats = {"elements_removed": 0, "chars_removed": 0, "patterns": []}
+    if mode not in BOILERPLATE_MODES:
+        raise ValueError(f"Unknown boilerplate mode: {mode}")
+    threshold = max(min_pages, min_ratio * len(reference))
+    if mode == "off" or len(reference) < threshold:
+        return pages, stats
+
+    # 按(区域, 归一化文本)收集候选元素的位置
+    candidates = defaultdict(list)
+    for page_num, (elements, page_height) in reference.items():
+        for _, zone, key, offset in _margin_elements(elements, page_height, margin):
+            candidates[(zone, key)].append((page_num, offset))
+
+    # 重复内容的位置中位数，以及第一次出现的页面（"once"模式保留该页上的第一个）
+    patterns = {}
+    for (zone, key), hits in candidates.items():
+        offsets = sorted(offset for _, offset in hits)
+        median = offsets[len(offsets) // 2]
+        matched = sorted({page_num for page_num, offset in hits if abs(offset - median) <= tolerance})
+        if len(matched) < threshold:
+            continue
+        stats["patterns"].append({"zone": zone, "text": key, "pages": len(matched)})
+        patterns[(zone, key)] = (median, matched[0])
+
+    result = {}
+    kept_first = set()
+    for page_num in sorted(pages):
+        elements, page_height = pages[page_num]
+        remove = set()
+        for index, zone, key, offset in _margin_elements(elements, page_height, margin):
+            pattern = patterns.get((zone, key))
+            if pattern is None or abs(offset - pattern[0]) > tolerance:
+                continue
+            if mode == "once" and page_num == pattern[1] and (zone, key) not in kept_first:
+                kept_first.add((zone, key))
+                continue
+            remove.add(index)
+        kept = []
+        for index, element in enumerate(elements):
+            if index in remove:
+                stats["elements_removed"] += 1
+                stats["chars_removed"] += len(element[1])
+            else:
+                kept.append(element)
+        result[page_num] = (kept, page_height)
+    return result, stats
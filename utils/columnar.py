@@ -0,0 +1,244 @@
+"""
+列式输出模块，把向量友好的Markdown按元素拆分为行，写入Parquet数据集，供下游向量化任务批量读取
+
+每个元素一行，列为文档ID、页码、元素序号、元素类型、标题路径、文本以及图片的路径/OCR/DESC/CONTEXT。
+数据集是一个目录，每个ColumnarWriter写入其中一个part文件，批量运行时多次写入的结果可以直接用
+pyarrow.dataset.dataset(目录)或pandas.read_parquet(目录)作为一张表读取
+"""
+
+import os
+import re
+import uuid
+import threading
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow是可选依赖，只有列式输出需要
+    pa = pq = None
+
+PAGE_PATTERN = re.compile(r'^# Page (\d+)$')
+HEADING_PATTERN = re.compile(r'^(#{1,6})\s+(.*?)\s*$')
+IMAGE_PATTERN = re.compile(r'^!\[(.*?)\]\((.*?)\)$')
+# pdf2md在每个表格前添加的标记标题，不属于文档的标题层级
+TABLE_MARKER = "#### Table"
+# 标题路径中各级标题的分隔符
+HEADING_SEPARATOR = " > "
+
+COLUMNS = ("doc_id", "page", "element_index", "element_type", "heading_path", "text",
+           "image_path", "image_ocr", "image_desc", "image_context")
+
+def _quote_value(line, key):
+    """从"> Key: value  "形式的引用行中取出value，不匹配时返回None"""
+    prefix = f"> {key}:"
+    if not line.startswith(prefix):
+        return None
+    return line[len(prefix):].strip()
+
+def markdown_to_elements(content):
+    """
+    把向量友好的Markdown拆分为元素
+
+    识别pdf2md生成的"# Page N"页标题、各级标题、表格（连同其TABLE_BEGIN/TABLE_END描述）、
+    图片（连同其IMAGE_BEGIN/IMAGE_END分析结果）以及以空行分隔的正文段落
+
+    Args:
+        content: Markdown内容
+
+    Yields:
+        元素字典，键为COLUMNS中除doc_id外的各列
+    """
+    lines = content.split('\n')
+    page = None
+    headings = []
+    paragraph = []
+    index = 0
+
+    def element(element_type, text, **image):
+        nonlocal index
+        row = {
+            "page": page,
+            "element_index": index,
+            "element_type": element_type,
+            "heading_path": HEADING_SEPARATOR.join(title for _, title in headings),
+            "text": text,
+            "image_path": image.get("path"),
+            "image_ocr": image.get("ocr"),
+            "image_desc": image.get("desc"),
+            "image_context": image.get("context"),
+        }
+        index += 1
+        return row
+
+    def flush():
+        text = "\n".join(paragraph).strip()
+        paragraph.clear()
+        return element("text", text) if text else None
+
+    i = 0
+    while i < len(lines):
+        line = lines[i].rstrip()
+        stripped = line.strip()
+        if not stripped or PAGE_PATTERN.match(stripped) or HEADING_PATTERN.match(stripped) \
+                or IMAGE_PATTERN.match(stripped) or stripped.startswith('|'):
+            row = flush()
+            if row:
+                yield row
+
+        if not stripped:
+            i += 1
+            continue
+
+        match = PAGE_PATTERN.match(stripped)
+        if match:
+            page = int(match.group(1))
+            headings = []
+            i += 1
+            continue
+
+        match = HEADING_PATTERN.match(stripped)
+        if match:
+            i += 1
+            if stripped == TABLE_MARKER:
+                continue
+            level, title = len(match.group(1)), match.group(2)
+            while headings and headings[-1][0] >= level:
+                headings.pop()
+            headings.append((level, title))
+            yield element("heading", title)
+            continue
+
+        match = IMAGE_PATTERN.match(stripped)
+        if match:
+            alt, path = match.groups()
+            image = {"path": path}
+            i += 1
+            # 紧跟的IMAGE_BEGIN/IMAGE_END块为图片分析结果
+            if i < len(lines) and lines[i].startswith("> IMAGE_BEGIN"):
+                while i < len(lines) and lines[i].startswith(">"):
+                    quote = lines[i].rstrip()
+                    i += 1
+                    for key in ("OCR", "DESC", "CONTEXT"):
+                        value = _quote_value(quote, key)
+                        if value is not None:
+                            image[key.lower()] = value
+                    if quote.startswith("> IMAGE_END"):
+                        break
+            yield element("image", alt, **image)
+            continue
+
+        if stripped.startswith('|'):
+            block = []
+            while i < len(lines) and lines[i].strip().startswith('|'):
+                block.append(lines[i].strip())
+                i += 1
+            # 紧跟的TABLE_BEGIN/TABLE_END块为表格的行描述，与表格之间可能隔着空行
+            j = i
+            while j < len(lines) and not lines[j].strip():
+                j += 1
+            if j < len(lines) and lines[j].startswith("> TABLE_BEGIN"):
+                i = j
+                while i < len(lines) and lines[i].startswith(">"):
+                    block.append(lines[i].rstrip())
+                    i += 1
+                    if block[-1].startswith("> TABLE_END"):
+                        break
+            yield element("table", "\n".join(block))
+            continue
+
+        paragraph.append(line)
+        i += 1
+
+    row = flush()
+    if row:
+        yield row
+
+class ColumnarWriter:
+    """Parquet数据集写入类，缓冲元素行，攒满一个行组后写入本进程的part文件"""
+
+    def __init__(self, dataset_dir, row_group_rows=10000):
+        """
+        初始化写入器
+
+        Args:
+            dataset_dir: 数据集目录，不存在时自动创建；已有的part文件保持不变，新数据写入新的part文件
+            row_group_rows: 每个行组的行数
+        """
+        if pa is None:
+            raise ImportError("列式输出需要安装pyarrow: pip install pyarrow")
+        self.dataset_dir = dataset_dir
+        self.row_group_rows = row_group_rows
+        self.path = os.path.join(dataset_dir, f"part-{uuid.uuid4().hex}.parquet")
+        self.schema = pa.schema([
+            ("doc_id", pa.string()),
+            ("page", pa.int32()),
+            ("element_index", pa.int32()),
+            ("element_type", pa.string()),
+            ("heading_path", pa.string()),
+            ("text", pa.string()),
+            ("image_path", pa.string()),
+            ("image_ocr", pa.string()),
+            ("image_desc", pa.string()),
+            ("image_context", pa.string()),
+        ])
+        self.rows_written = 0
+        self.documents_written = 0
+        self._buffer = {column: [] for column in COLUMNS}
+        self._buffered = 0
+        self._writer = None
+        self._lock = threading.Lock()
+
+    def write_markdown(self, doc_id, content):
+        """
+        拆分一个文档的向量友好Markdown并加入缓冲
+
+        Args:
+            doc_id: 文档ID
+            content: 向量友好的Markdown内容
+
+        Returns:
+            该文档的元素行数
+        """
+        rows = list(markdown_to_elements(content))
+        with self._lock:
+            for row in rows:
+                self._buffer["doc_id"].append(doc_id)
+                for column in COLUMNS[1:]:
+                    self._buffer[column].append(row[column])
+            self._buffered += len(rows)
+            self.documents_written += 1
+            if self._buffered >= self.row_group_rows:
+                self._flush_locked()
+        return len(rows)
+
+    def _flush_locked(self):
+        if not self._buffered:
+            return
+        if self._writer is None:
+            os.makedirs(self.dataset_dir, exist_ok=True)
+            self._writer = pq.ParquetWriter(self.path, self.schema)
+        self._writer.write_table(pa.Table.from_pydict(self._buffer, schema=self.schema),
+                                 row_group_size=self.row_group_rows)
+        self.rows_written += self._buffered
+        self._buffer = {column: [] for column in COLUMNS}
+        self._buffered = 0
+
+    def flush(self):
+        """把缓冲中的行写为一个行组"""
+        with self._lock:
+            self._flush_locked()
+
+    def close(self):
+        """写入剩余的行并关闭part文件，关闭后文件才可被读取"""
+        with self._lock:
+            self._flush_locked()
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+                print(f"成功写入列式数据: {self.path} ({self.rows_written}行, {self.documents_written}个文档)")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
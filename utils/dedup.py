@@ -0,0 +1,315 @@
+"""
+近重复检测模块，用MinHash签名和LSH分桶在向量化之前找出与已处理内容近似重复的文档和文本块
+
+签名索引保存在SQLite数据库中，跨多次运行持续累积。每个签名按LSH分成若干段，
+每段的哈希作为一个桶键，查询时用一次带索引的IN查询取出候选，再用签名估计Jaccard相似度
+
+用法：
+    python -m utils.dedup --index dedup.sqlite --stats
+"""
+
+import re
+import json
+import zlib
+import sqlite3
+import hashlib
+import argparse
+import threading
+import numpy as np
+from config import DEDUP_CONFIG
+
+# MinHash置换使用最大的32位素数作模数，保证a*x+b在uint64内不溢出
+HASH_PRIME = np.uint64(4294967291)
+MAX_HASH = np.uint64(4294967295)
+# 一次计算的shingle数，限制大文档的临时内存
+SHINGLE_BATCH = 8192
+# 文本块之间的分隔：一个或多个空行
+BLOCK_SEPARATOR = re.compile(r'(\n[ \t]*\n+)')
+# numpy 2.0起trapz更名为trapezoid
+_trapezoid = getattr(np, "trapezoid", None) or np.trapz
+
+def optimal_bands(threshold, num_perm):
+    """
+    选择LSH的段数和每段行数，使阈值两侧的误报和漏报面积之和最小
+
+    Args:
+        threshold: 相似度阈值
+        num_perm: 签名长度
+
+    Returns:
+        (bands, rows)
+    """
+    steps = np.linspace(0.0, 1.0, 201)
+    best, best_error = None, None
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        probability = 1 - (1 - steps ** rows) ** bands
+        below, above = steps <= threshold, steps >= threshold
+        false_positive = _trapezoid(probability[below], steps[below])
+        false_negative = _trapezoid(1 - probability[above], steps[above])
+        error = false_positive + false_negative
+        if best_error is None or error < best_error:
+            best, best_error = (bands, rows), error
+    return best
+
+def normalize_text(text):
+    """归一化文本：合并空白并转为小写"""
+    return ' '.join(text.split()).lower()
+
+def shingles(text, size):
+    """把文本切分为字符shingle集合，文本短于size时整体作为一个shingle"""
+    text = normalize_text(text)
+    if len(text) <= size:
+        return {text} if text else set()
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+class DedupIndex:
+    """持久化的MinHash LSH索引"""
+
+    def __init__(self, path, threshold=None, num_perm=None, shingle_size=None, seed=1):
+        """
+        打开或创建索引
+
+        Args:
+            path: SQLite数据库路径，":memory:"表示只在内存中
+            threshold: 相似度阈值，默认使用DEDUP_CONFIG["threshold"]
+            num_perm: MinHash签名长度，默认使用DEDUP_CONFIG["num_perm"]
+            shingle_size: 字符shingle长度，默认使用DEDUP_CONFIG["shingle_size"]
+            seed: 生成哈希置换的随机数种子
+
+        Raises:
+            ValueError: 已有索引的签名参数与指定的不一致
+        """
+        self.path = path
+        self.threshold = threshold if threshold is not None else DEDUP_CONFIG["threshold"]
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS items (
+                id INTEGER PRIMARY KEY, kind TEXT, doc_id TEXT, ref TEXT, signature BLOB);
+            CREATE INDEX IF NOT EXISTS items_doc ON items (doc_id);
+            CREATE TABLE IF NOT EXISTS buckets (
+                key INTEGER, item_id INTEGER, PRIMARY KEY (key, item_id)) WITHOUT ROWID;
+        """)
+        params = {
+            "num_perm": num_perm or DEDUP_CONFIG["num_perm"],
+            "shingle_size": shingle_size or DEDUP_CONFIG["shingle_size"],
+            "seed": seed,
+        }
+        row = self.conn.execute("SELECT value FROM meta WHERE key='params'").fetchone()
+        if row is None:
+            self.conn.execute("INSERT INTO meta VALUES ('params', ?)", (json.dumps(params),))
+            self.conn.commit()
+        else:
+            stored = json.loads(row[0])
+            # 只有未显式指定的参数可以沿用已有索引的设置
+            for key in ("num_perm", "shingle_size"):
+                explicit = {"num_perm": num_perm, "shingle_size": shingle_size}[key]
+                if explicit is not None and explicit != stored[key]:
+                    raise ValueError(f"索引的{key}为{stored[key]}，与指定的{explicit}不一致: {path}")
+            params = stored
+        self.num_perm = params["num_perm"]
+        self.shingle_size = params["shingle_size"]
+        self.bands, self.rows = optimal_bands(self.threshold, self.num_perm)
+        rng = np.random.RandomState(params["seed"])
+        self._a = rng.randint(1, int(HASH_PRIME), size=self.num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, int(HASH_PRIME), size=self.num_perm, dtype=np.uint64)
+
+    def signature(self, text):
+        """
+        计算文本的MinHash签名
+
+        Returns:
+            长度为num_perm的uint32数组
+        """
+        hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles(text, self.shingle_size)),
+                             dtype=np.uint64)
+        result = np.full(self.num_perm, MAX_HASH, dtype=np.uint64)
+        for start in range(0, len(hashes), SHINGLE_BATCH):
+            batch = hashes[start:start + SHINGLE_BATCH]
+            values = (np.outer(self._a, batch) + self._b[:, None]) % HASH_PRIME
+            np.minimum(result, values.min(axis=1), out=result)
+        return result.astype(np.uint32)
+
+    def _bucket_keys(self, signature):
+        """每段签名的哈希（含段号）作为一个桶键"""
+        keys = []
+        for band in range(self.bands):
+            chunk = signature[band * self.rows:(band + 1) * self.rows].tobytes()
+            digest = hashlib.blake2b(chunk, digest_size=8, person=band.to_bytes(4, "little")).digest()
+            keys.append(int.from_bytes(digest, "little", signed=True))
+        return keys
+
+    def query(self, signature, kind=None, exclude_doc=None, limit=None):
+        """
+        查询与签名近似重复的已有条目
+
+        Args:
+            signature: MinHash签名
+            kind: 只返回该类型（"document"或"chunk"）的条目，None表示不限
+            exclude_doc: 排除该文档ID的条目
+            limit: 最多取出并比较的候选条目数，默认使用DEDUP_CONFIG["max_candidates"]
+
+        Returns:
+            [(相似度, 条目ID, 文档ID, 块引用)]，按相似度从高到低排列，只包含达到阈值的条目
+        """
+        keys = self._bucket_keys(signature)
+        sql = ("SELECT DISTINCT i.id, i.doc_id, i.ref, i.signature FROM buckets b "
+               "JOIN items i ON i.id = b.item_id WHERE b.key IN (%s)" % ",".join("?" * len(keys)))
+        args = list(keys)
+        if kind:
+            sql += " AND i.kind = ?"
+            args.append(kind)
+        if exclude_doc is not None:
+            sql += " AND i.doc_id != ?"
+            args.append(exclude_doc)
+        sql += " LIMIT ?"
+        args.append(limit or DEDUP_CONFIG["max_candidates"])
+        with self._lock:
+            candidates = self.conn.execute(sql, args).fetchall()
+        matches = []
+        for item_id, doc_id, ref, blob in candidates:
+            similarity = float(np.mean(np.frombuffer(blob, dtype=np.uint32) == signature))
+            if similarity >= self.threshold:
+                matches.append((similarity, item_id, doc_id, ref))
+        matches.sort(key=lambda m: (-m[0], m[1]))
+        return matches
+
+    def add(self, signature, kind, doc_id, ref=None):
+        """
+        把签名加入索引
+
+        Returns:
+            新条目的ID
+        """
+        with self._lock:
+            cursor = self.conn.execute("INSERT INTO items (kind, doc_id, ref, signature) VALUES (?, ?, ?, ?)",
+                                       (kind, doc_id, ref, signature.tobytes()))
+            item_id = cursor.lastrowid
+            self.conn.executemany("INSERT OR IGNORE INTO buckets VALUES (?, ?)",
+                                  [(key, item_id) for key in self._bucket_keys(signature)])
+        return item_id
+
+    def remove_document(self, doc_id):
+        """删除某个文档的所有条目，重新处理同一文档时不会与旧结果互相匹配"""
+        with self._lock:
+            rows = self.conn.execute("SELECT id, signature FROM items WHERE doc_id = ?", (doc_id,)).fetchall()
+            # 由签名重新算出桶键，按主键删除，不需要在item_id上另建索引
+            self.conn.executemany("DELETE FROM buckets WHERE key = ? AND item_id = ?",
+                                  [(key, item_id) for item_id, blob in rows
+                                   for key in self._bucket_keys(np.frombuffer(blob, dtype=np.uint32))])
+            self.conn.executemany("DELETE FROM items WHERE id = ?", [(item_id,) for item_id, _ in rows])
+
+    def commit(self):
+        with self._lock:
+            self.conn.commit()
+
+    def stats(self):
+        """索引中的文档和文本块数量"""
+        with self._lock:
+            counts = dict(self.conn.execute("SELECT kind, COUNT(*) FROM items GROUP BY kind").fetchall())
+        return {"documents": counts.get("document", 0), "chunks": counts.get("chunk", 0),
+                "threshold": self.threshold, "num_perm": self.num_perm, "bands": self.bands, "rows": self.rows}
+
+    def close(self):
+        with self._lock:
+            self.conn.commit()
+            self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def dedup_markdown(content, doc_id, index, mode="flag", min_chars=None):
+    """
+    对一个文档的向量友好Markdown做近重复检测，并把文档及其文本块加入索引
+
+    文本块为以空行分隔的段落、表格或图片描述块，短于min_chars的块（如页标题）不参与检测。
+    只有没有匹配的文档和文本块加入索引，每组近重复内容只保留第一次出现的条目作为代表，
+    常见的免责声明等重复多少次都不会使索引和查询变慢。同一文档ID重新处理时先删除其旧条目
+
+    Args:
+        content: 向量友好的Markdown内容
+        doc_id: 文档ID
+        index: DedupIndex
+        mode: "flag"在重复内容后添加DUPLICATE_OF标记，"drop"删除重复的文本块；
+              整个文档重复时，flag模式在开头添加DUPLICATE_DOCUMENT_OF标记，drop模式返回空内容
+        min_chars: 参与检测的最短文本块字符数，默认使用DEDUP_CONFIG["min_chars"]
+
+    Returns:
+        (处理后的内容, 报告字典)
+    """
+    if mode not in ("flag", "drop"):
+        raise ValueError(f"Unknown dedup mode: {mode}")
+    min_chars = min_chars if min_chars is not None else DEDUP_CONFIG["min_chars"]
+    report = {"doc_id": doc_id, "duplicate_of": None, "similarity": None,
+              "chunks": 0, "duplicate_chunks": 0, "chars_removed": 0}
+    index.remove_document(doc_id)
+
+    signature = index.signature(content)
+    matches = index.query(signature, kind="document")
+    document_duplicate = bool(matches)
+    if document_duplicate:
+        report["similarity"], _, report["duplicate_of"], _ = matches[0]
+    else:
+        index.add(signature, "document", doc_id)
+
+    parts = BLOCK_SEPARATOR.split(content)
+    output = []
+    # parts中偶数位置为文本块，奇数位置为分隔的空行
+    for position, part in enumerate(parts):
+        if position % 2 or len(part.strip()) < min_chars:
+            output.append(part)
+            continue
+        report["chunks"] += 1
+        ref = f"block-{position // 2}"
+        chunk_signature = index.signature(part)
+        chunk_matches = index.query(chunk_signature, kind="chunk")
+        if not chunk_matches:
+            index.add(chunk_signature, "chunk", doc_id, ref)
+            output.append(part)
+            continue
+        report["duplicate_chunks"] += 1
+        similarity, _, other_doc, other_ref = chunk_matches[0]
+        if mode == "drop":
+            report["chars_removed"] += len(part)
+            output.append("")
+        else:
+            output.append(f"{part}\n> DUPLICATE_OF: {other_doc}#{other_ref} ({similarity:.2f})")
+    index.commit()
+
+    if document_duplicate:
+        if mode == "drop":
+            report["chars_removed"] = len(content)
+            return "", report
+        marker = f"> DUPLICATE_DOCUMENT_OF: {report['duplicate_of']} ({report['similarity']:.2f})\n\n"
+        return marker + "".join(output), report
+    # 删除文本块后合并多余的空行
+    result = "".join(output)
+    if mode == "drop" and report["duplicate_chunks"]:
+        result = re.sub(r'\n{3,}', '\n\n', result)
+    return result, report
+
+def main():
+    parser = argparse.ArgumentParser(description='近重复检测索引工具')
+    parser.add_argument('--index', type=str, required=True, help='索引数据库路径')
+    parser.add_argument('--stats', action='store_true', help='输出索引统计')
+    parser.add_argument('--query', type=str, help='查询与该文本文件近似重复的文档')
+    args = parser.parse_args()
+
+    with DedupIndex(args.index) as index:
+        if args.stats:
+            print(json.dumps(index.stats(), ensure_ascii=False, indent=2))
+        if args.query:
+            with open(args.query, encoding="utf-8") as f:
+                signature = index.signature(f.read())
+            for similarity, _, doc_id, ref in index.query(signature):
+                print(f"{similarity:.3f}\t{doc_id}\t{ref or ''}")
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,7 @@ import os
 import pypandoc
 import re
 import uuid
+from utils.source_io import read_source, is_path
 
 def clean_text(text):
     """清理文本内容，确保可以正确显示在Markdown中"""
@@ -28,6 +29,10 @@ def clean_text(text):
         print(f"警告: 文本清理失败: {e}")
         return ""
 
+def strip_image_attributes(content):
+    """移除Markdown中图片的宽高属性"""
+    return re.sub(r'(!\[.*?\]\(.*?\))(\{.*?\})', r'\1', content)
+
 def post_process_markdown(file_path):
     """对转换后的Markdown文件进行后处理，移除图片宽高属性"""
     try:
@@ -36,7 +41,7 @@ def post_process_markdown(file_path):
             content = f.read()
         
         # 使用正则表达式移除图片宽高属性
-        cleaned_content = re.sub(r'(!\[.*?\]\(.*?\))(\{.*?\})', r'\1', content)
+        cleaned_content = strip_image_attributes(content)
         
         # 写回文件
         with open(file_path, 'w', encoding='utf-8') as f:
@@ -46,6 +51,23 @@ def post_process_markdown(file_path):
     except Exception as e:
         print(f"后处理过程中出错: {e}")
 
+def fix_tables_content(content):
+    """修复Markdown内容中所有表格的格式"""
+    # 将内容分成段落，以便单独处理每个表格
+    paragraphs = re.split(r'\n\n+', content)
+    fixed_paragraphs = []
+    
+    for paragraph in paragraphs:
+        # 检查段落是否包含表格（以 | 开头的行）
+        if re.search(r'^\|', paragraph, re.MULTILINE):
+            fixed_paragraph = fix_table_paragraph(paragraph)
+            fixed_paragraphs.append(fixed_paragraph)
+        else:
+            fixed_paragraphs.append(paragraph)
+    
+    # 重新组合文档
+    return '\n\n'.join(fixed_paragraphs)
+
 def fix_tables(file_path):
     """专门处理表格格式问题"""
     try:
@@ -53,20 +75,7 @@ def fix_tables(file_path):
         with open(file_path, 'r', encoding='utf-8') as f:
             content = f.read()
         
-        # 将内容分成段落，以便单独处理每个表格
-        paragraphs = re.split(r'\n\n+', content)
-        fixed_paragraphs = []
-        
-        for paragraph in paragraphs:
-            # 检查段落是否包含表格（以 | 开头的行）
-            if re.search(r'^\|', paragraph, re.MULTILINE):
-                fixed_paragraph = fix_table_paragraph(paragraph)
-                fixed_paragraphs.append(fixed_paragraph)
-            else:
-                fixed_paragraphs.append(paragraph)
-        
-        # 重新组合文档
-        fixed_content = '\n\n'.join(fixed_paragraphs)
+        fixed_content = fix_tables_content(content)
         
         # 写回文件
         with open(file_path, 'w', encoding='utf-8') as f:
@@ -145,51 +154,65 @@ def fix_table_paragraph(paragraph):
     
     return '\n'.join(table_lines)
 
-def docx_to_markdown(docx_path, output_md_path):
+def docx_to_markdown_string(source, img_dir=None):
     """
-    将Word文档转换为Markdown格式
+    将Word文档转换为Markdown字符串
     
     Args:
-        docx_path: Word文档路径
-        output_md_path: 输出的Markdown文件路径
+        source: Word文档路径，或文档内容（bytes或二进制文件对象），内存中的文档通过标准输入传给pandoc，不写临时文件
+        img_dir: 图片保存目录，默认在当前目录下生成唯一的images_xxxxxxxx目录
+        
+    Returns:
+        移除图片宽高属性并修复表格格式后的Markdown字符串
+        
+    Raises:
+        RuntimeError: pandoc转换失败
+        OSError: 未安装pandoc
     """
     # 创建图片保存目录
+    img_dir = img_dir or f'images_{uuid.uuid4().hex[:8]}'  # 使用uuid生成唯一标识符
+    os.makedirs(img_dir, exist_ok=True)
+    
+    # 设置转换参数
+    extra_args = [
+        f'--extract-media={img_dir}',  # 提取媒体文件到images目录
+        '--wrap=none',                 # 保留原文换行符
+        '--standalone'                 # 生成完整的文档
+    ]
+    
+    data = read_source(source)
+    if data is None:
+        content = pypandoc.convert_file(source, 'markdown', extra_args=extra_args)
+    else:
+        content = pypandoc.convert_text(data, 'markdown', format='docx', extra_args=extra_args)
+    
+    # 后处理：移除图片宽高属性，并专门处理表格格式
+    return fix_tables_content(strip_image_attributes(content))
 
-    img_dir = f'images_{uuid.uuid4().hex[:8]}'  # 使用uuid生成唯一标识符
-    if not os.path.exists(img_dir):
-        os.makedirs(img_dir)
+def docx_to_markdown(docx_path, output_md_path, img_dir=None):
+    """
+    将Word文档转换为Markdown格式
     
+    Args:
+        docx_path: Word文档路径，也可以是内存中的文档内容，见docx_to_markdown_string
+        output_md_path: 输出的Markdown文件路径
+        img_dir: 图片保存目录，默认在当前目录下生成唯一的images_xxxxxxxx目录
+    """
     try:
         # 检查文件是否存在
-        if not os.path.exists(docx_path):
+        if is_path(docx_path) and not os.path.exists(docx_path):
             print(f"错误：文件 '{docx_path}' 不存在！")
             return False
         
-        # 设置转换参数
-        extra_args = [
-            f'--extract-media={img_dir}',  # 提取媒体文件到images目录
-            '--wrap=none',                 # 保留原文换行符
-            '--standalone'                 # 生成完整的文档
-        ]
-        
-        # 执行转换
-        print(f"正在将Word文档转换为Markdown: {docx_path} -> {output_md_path}")
-        output = pypandoc.convert_file(
-            docx_path,
-            'markdown',
-            outputfile=output_md_path,
-            extra_args=extra_args
-        )
-        
-        # 后处理：移除图片宽高属性
-        post_process_markdown(output_md_path)
-        
-        # 专门处理表格格式
-        fix_tables(output_md_path)
+        # 执行转换，后处理在内存中完成，只写一次文件
+        print(f"正在将Word文档转换为Markdown: {docx_path if is_path(docx_path) else '<stream>'} -> {output_md_path}")
+        content = docx_to_markdown_string(docx_path, img_dir)
+        with open(output_md_path, 'w', encoding='utf-8') as f:
+            f.write(content)
         
         print(f"文档转换完成！已保存为 {output_md_path}")
         return True
         
     except Exception as e:
         print(f"转换失败：{e}")
-        return False 
\ No newline at end of file
+        return False
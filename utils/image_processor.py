@@ -9,17 +9,134 @@ import json
 from PIL import Image
 import io
 import re
+import math
+import time
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from config import MULTIMODAL_CONFIG, IMAGE_CONFIG, PROMPT_CONFIG
+from utils.rate_limiter import RateGovernor, estimate_request_tokens
+from utils.source_io import read_source
+
+# 需要重试的HTTP状态码：限流和服务端临时错误
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# 探测图片尺寸时读取的文件头长度，JPEG的SOF段可能位于EXIF之后，因此留足余量
+IMAGE_HEADER_BYTES = 64 * 1024
+
+def probe_image_header(data):
+    """
+    只解析图片文件头获取格式和尺寸，不解码像素数据
+    
+    Args:
+        data: 图片的前若干字节（bytes、bytearray或memoryview）
+        
+    Returns:
+        (format, width, height)，无法识别时返回None
+    """
+    head = bytes(data[:32])
+    try:
+        if head.startswith(b'\x89PNG\r\n\x1a\n') and head[12:16] == b'IHDR':
+            width, height = struct.unpack('>II', head[16:24])
+            return "png", width, height
+        if head[:6] in (b'GIF87a', b'GIF89a'):
+            width, height = struct.unpack('<HH', head[6:10])
+            return "gif", width, height
+        if head.startswith(b'BM') and len(head) >= 26:
+            width, height = struct.unpack('<ii', head[18:26])
+            return "bmp", width, abs(height)
+        if head.startswith(b'RIFF') and head[8:12] == b'WEBP':
+            chunk = head[12:16]
+            if chunk == b'VP8X':
+                width = int.from_bytes(head[24:27], 'little') + 1
+                height = int.from_bytes(head[27:30], 'little') + 1
+                return "webp", width, height
+            if chunk == b'VP8L':
+                bits = int.from_bytes(head[21:25], 'little')
+                return "webp", (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+            if chunk == b'VP8 ':
+                width, height = struct.unpack('<HH', head[26:30])
+                return "webp", width & 0x3FFF, height & 0x3FFF
+        if head.startswith(b'\xff\xd8'):
+            # 逐段跳过JPEG标记，直到遇到SOF段
+            pos = 2
+            size = len(data)
+            while pos + 9 <= size:
+                if data[pos] != 0xFF:
+                    return None
+                marker = data[pos + 1]
+                if marker == 0xFF:
+                    pos += 1
+                    continue
+                if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+                    pos += 2
+                    continue
+                length = struct.unpack('>H', bytes(data[pos + 2:pos + 4]))[0]
+                if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+                    height, width = struct.unpack('>HH', bytes(data[pos + 5:pos + 9]))
+                    return "jpeg", width, height
+                pos += 2 + length
+    except struct.error:
+        return None
+    return None
+
+def probe_image_file(image_path):
+    """
+    只读取文件头获取图片格式和尺寸，文件头无法识别时交给PIL（同样只解析文件头）
+
+    Args:
+        image_path: 图片路径
+
+    Returns:
+        (format, width, height)，无法识别时返回None
+    """
+    try:
+        with open(image_path, "rb") as image_file:
+            probed = probe_image_header(image_file.read(IMAGE_HEADER_BYTES))
+        if probed:
+            return probed
+        with Image.open(image_path) as img:
+            width, height = img.size
+            return (img.format or "unknown").lower(), width, height
+    except Exception:
+        return None
+
+def iter_image_files(image_dir, supported_formats):
+    """
+    使用os.scandir递归遍历目录，按名称排序依次产出支持格式的图片路径
+
+    每个目录先产出其中的文件，再依次进入子目录，与os.walk的顺序一致，但结果是确定的
+
+    Args:
+        image_dir: 图片目录路径
+        supported_formats: 支持的扩展名列表（小写，不含点）
+
+    Yields:
+        图片文件路径
+    """
+    supported = set(supported_formats)
+    with os.scandir(image_dir) as it:
+        entries = sorted(it, key=lambda entry: entry.name)
+    subdirs = []
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            subdirs.append(entry.path)
+        elif entry.is_file() and entry.name.lower().split('.')[-1] in supported:
+            yield entry.path
+    for subdir in subdirs:
+        yield from iter_image_files(subdir, supported)
 
 class ImageProcessor:
     """图片处理类，负责图片分析和多模态模型调用"""
     
-    def __init__(self, config=None):
+    def __init__(self, config=None, session=None, governor=None):
         """
         初始化图片处理器
         
         Args:
             config: 配置字典，如果为None则使用默认配置
+            session: 共享的requests.Session，复用连接池；为None时新建
+            governor: 共享的RateGovernor，为None时根据配置新建
         """
         from env_loader import load_env
         load_env()
@@ -29,86 +146,175 @@ class ImageProcessor:
         self.model = self.config.get("model")
         self.temperature = self.config.get("temperature")
         self.max_tokens = self.config.get("max_tokens")
+        self.session = session or requests.Session()
+        self.max_retries = int(self.config.get("max_retries", 3))
+        self.retry_backoff = float(self.config.get("retry_backoff", 1.0))
+        self.max_retry_wait = float(self.config.get("max_retry_wait", 60))
+        self.timeout = float(self.config.get("timeout", 120))
+        # RPM/TPM限流和自适应并发
+        self.governor = governor or RateGovernor.from_config(self.config)
+        # 请求统计，供压测和服务指标使用
+        self.stats = {"requests": 0, "retries": 0, "failures": 0}
+        self._stats_lock = threading.Lock()
         if not self.api_key:
             raise ValueError("API密钥未设置，请在config.py中设置MULTIMODAL_CONFIG['api_key']")
     
-    def encode_image(self, image_path):
+    def _count(self, key, amount=1):
+        with self._stats_lock:
+            self.stats[key] += amount
+    
+    def post_chat_completion(self, headers, payload, tokens=0):
+        """
+        调用/chat/completions接口，遇到429、5xx或网络错误时按指数退避重试
+        
+        每次尝试都经过限流器：等待并发名额和RPM/TPM令牌，429和延迟突增会让并发上限减半。
+        429响应带有Retry-After头时按其指定的秒数等待，每次等待都不超过max_retry_wait秒
+        
+        Args:
+            headers: 请求头
+            payload: 请求体
+            tokens: 本次请求估算的token数，用于TPM限流
+            
+        Returns:
+            成功的requests.Response
+        """
+        url = f"{self.config['base_url']}/chat/completions"
+        for attempt in range(self.max_retries + 1):
+            self._count("requests")
+            try:
+                with self.governor.slot(tokens) as slot:
+                    response = self.session.post(url, headers=headers, json=payload, timeout=self.timeout)
+                    slot.status = response.status_code
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.max_retries:
+                    self._count("failures")
+                    raise
+                wait = self.retry_backoff * 2 ** attempt
+            else:
+                if response.status_code not in RETRY_STATUS_CODES or attempt == self.max_retries:
+                    if not response.ok:
+                        self._count("failures")
+                    response.raise_for_status()
+                    return response
+                try:
+                    wait = float(response.headers.get("Retry-After"))
+                    if math.isnan(wait):
+                        raise ValueError("Retry-After is NaN")
+                except (TypeError, ValueError):
+                    wait = self.retry_backoff * 2 ** attempt
+            self._count("retries")
+            # 服务端给出的Retry-After可能很大，限制单次等待以免长时间占住工作线程
+            time.sleep(min(max(wait, 0.0), self.max_retry_wait))
+    
+    def read_image(self, image):
+        """
+        读取图片的完整字节
+        
+        Args:
+            image: 图片路径，或已在内存中的图片数据（bytes、bytearray或memoryview）
+            
+        Returns:
+            图片字节（内存数据原样返回，不复制）
+        """
+        if isinstance(image, (bytes, bytearray, memoryview)):
+            return image
+        with open(image, "rb") as image_file:
+            return image_file.read()
+    
+    def encode_image(self, image):
         """
         将图片编码为base64字符串
         
         Args:
-            image_path: 图片路径
+            image: 图片路径，或已在内存中的图片数据
             
         Returns:
             base64编码的图片字符串
         """
-        with open(image_path, "rb") as image_file:
-            return base64.b64encode(image_file.read()).decode('utf-8')
+        return base64.b64encode(self.read_image(image)).decode('utf-8')
     
-    def get_image_info(self, image_path):
+    def get_image_info(self, image, image_format=None):
         """
         获取图片的基本信息
         
+        优先只解析文件头获取尺寸和格式，无法识别时再交给PIL处理
+        
         Args:
-            image_path: 图片路径
+            image: 图片路径，或已在内存中的图片数据（bytes、bytearray或memoryview）
+            image_format: 已知的图片格式（如PDF中提取的扩展名），文件头无法识别时使用
             
         Returns:
             包含图片信息的字典
         """
         try:
-            with Image.open(image_path) as img:
-                width, height = img.size
-                format = img.format.lower()
+            if isinstance(image, (bytes, bytearray, memoryview)):
+                header = image
+            else:
+                with open(image, "rb") as image_file:
+                    header = image_file.read(IMAGE_HEADER_BYTES)
+            probed = probe_image_header(header)
+            if probed:
+                format, width, height = probed
+            else:
+                source = image if isinstance(image, str) else io.BytesIO(image)
+                with Image.open(source) as img:
+                    width, height = img.size
+                    format = (img.format or image_format or "unknown").lower()
 
-                # 检查图片尺寸，如果宽或高超过1024，进行等比例缩放
-                # max_dimension = max(width, height)
-                # if max_dimension > 512:
-                #     # 计算缩放比例
-                #     scale_ratio = 512 / max_dimension
-                #     # 按比例计算新的宽高
-                #     new_width = int(width * scale_ratio)
-                #     new_height = int(height * scale_ratio)
-                #     # 缩放图片
-                #     img = img.resize((new_width, new_height), Image.LANCZOS)
-                #     # 更新宽高信息
-                #     width, height = img.size
-                #     print(f"图片已缩放: 从 {max_dimension} 缩放到 512，新尺寸为 {width}x{height}")
+            # 检查图片尺寸，如果宽或高超过1024，进行等比例缩放
+            # max_dimension = max(width, height)
+            # if max_dimension > 512:
+            #     # 计算缩放比例
+            #     scale_ratio = 512 / max_dimension
+            #     # 按比例计算新的宽高
+            #     new_width = int(width * scale_ratio)
+            #     new_height = int(height * scale_ratio)
+            #     # 缩放图片
+            #     img = img.resize((new_width, new_height), Image.LANCZOS)
+            #     # 更新宽高信息
+            #     width, height = img.size
+            #     print(f"图片已缩放: 从 {max_dimension} 缩放到 512，新尺寸为 {width}x{height}")
 
-                return {
-                    "width": width,
-                    "height": height,
-                    "format": format,
-                    "size": f"{width}x{height}"
-                }
+            return {
+                "width": width,
+                "height": height,
+                "format": format,
+                "size": f"{width}x{height}"
+            }
         except Exception as e:
             print(f"获取图片信息失败: {e}")
             return {
                 "width": 0,
                 "height": 0,
-                "format": "unknown",
+                "format": image_format or "unknown",
                 "size": "0x0"
             }
     
-    def analyze_image(self, image_path, context=None):
+    def analyze_image(self, image_path, context=None, image_data=None, image_format=None):
         """
         使用多模态模型分析图片
         
         Args:
-            image_path: 图片路径
+            image_path: 图片路径（提供image_data时仅用于输出描述，不读取磁盘）
             context: 图片的上下文信息
+            image_data: 已在内存中的图片数据（bytes或memoryview），为None时从image_path读取
+            image_format: 已知的图片格式，文件头无法识别时使用
             
         Returns:
             图片分析结果
         """
-        # 检查图片是否存在
-        if not os.path.exists(image_path):
-            return f"图片不存在: {image_path}"
+        if image_data is None:
+            # 检查图片是否存在
+            if not os.path.exists(image_path):
+                return f"图片不存在: {image_path}"
+            # 只读取一次磁盘，后续的文件头解析和base64编码都基于内存数据
+            image_data = self.read_image(image_path)
         
         # 获取图片信息
-        image_info = self.get_image_info(image_path)
+        image_info = self.get_image_info(image_data, image_format)
         
         # 编码图片
-        base64_image = self.encode_image(image_path)
+        base64_image = self.encode_image(image_data)
         
         # 准备API请求
         headers = {
@@ -147,12 +353,9 @@ class ImageProcessor:
         
         # 发送请求
         try:
-            response = requests.post(
-                f"{self.config['base_url']}/chat/completions",
-                headers=headers,
-                json=payload
-            )
-            response.raise_for_status()
+            tokens = estimate_request_tokens(image_info["width"], image_info["height"],
+                                             self.config["max_tokens"], len(prompt))
+            response = self.post_chat_completion(headers, payload, tokens)
             result = response.json()
             
             # 提取分析结果
@@ -226,6 +429,35 @@ class ImageProcessor:
             print(f"图片分析失败: {e}")
             return f"图片分析失败: {e}"
     
+    def image_markdown(self, image_path, source=None, image_store=None):
+        """
+        生成单个图片的Markdown内容
+        
+        Args:
+            image_path: 图片在Markdown中引用的路径
+            source: 可选的图片内容（bytes、memoryview或二进制文件对象，如上传的请求体）。
+                    提供image_store时以image_path为键放入其中，图片分析直接使用内存数据；否则写入image_path
+            image_store: 存放source的ImageStore
+            
+        Returns:
+            Markdown字符串
+        """
+        data = read_source(source) if source is not None else None
+        if data is not None:
+            if image_store is not None:
+                image_store.put(image_path, data, os.path.splitext(image_path)[1].lower().lstrip('.'))
+            else:
+                with open(image_path, 'wb') as f:
+                    f.write(data)
+        
+        img_name = os.path.basename(image_path)
+        
+        # 生成标准的Markdown图片标记
+        img_markdown = f"![{img_name}]({image_path})\n"
+        
+        # 组合成完整的Markdown内容
+        return f"### 图片内容分析\n\n{img_markdown}\n"
+    
     def image_to_markdown(self, image_path, output_md_path):
         """
         将单个图片转换为Markdown格式
@@ -243,15 +475,7 @@ class ImageProcessor:
                 print(f"错误：图片 '{image_path}' 不存在！")
                 return False
                 
-            # 获取图片文件名和信息
-            img_name = os.path.basename(image_path)
-            img_info = self.get_image_info(image_path)
-            
-            # 生成标准的Markdown图片标记
-            img_markdown = f"![{img_name}]({image_path})\n"
-            
-            # 组合成完整的Markdown内容
-            md_content = f"### 图片内容分析\n\n{img_markdown}\n"
+            md_content = self.image_markdown(image_path)
             
             # 写入Markdown文件
             with open(output_md_path, 'w', encoding='utf-8') as f:
@@ -268,6 +492,9 @@ class ImageProcessor:
         """
         将目录中的多个图片转换为单个Markdown文件
         
+        文件按路径排序，重复运行输出一致；图片尺寸只解析文件头并在线程池中并发完成，
+        Markdown分批增量写入磁盘，处理十万级图片目录时内存占用保持平稳
+        
         Args:
             image_dir: 图片目录路径
             output_md_path: 输出的Markdown文件路径
@@ -281,43 +508,40 @@ class ImageProcessor:
                 print(f"错误：目录 '{image_dir}' 不存在或不是目录！")
                 return False
                 
-            # 支持的图片格式
-            supported_formats = IMAGE_CONFIG["supported_formats"]
-            
             # 获取目录中的所有图片文件
-            image_files = []
-            for root, dirs, files in os.walk(image_dir):
-                for file in files:
-                    # 检查文件扩展名
-                    ext = file.lower().split('.')[-1]
-                    if ext in supported_formats:
-                        image_files.append(os.path.join(root, file))
+            image_files = list(iter_image_files(image_dir, IMAGE_CONFIG["supported_formats"]))
             
             if not image_files:
                 print(f"目录 '{image_dir}' 中没有找到支持的图片文件！")
                 return False
-                
-            # 初始化Markdown内容
-            md_content = f"### 图片集合分析\n\n共 {len(image_files)} 张图片\n\n"
             
-            # 处理每个图片
-            for idx, img_path in enumerate(image_files, 1):
-                print(f"处理第 {idx}/{len(image_files)} 张图片: {img_path}")
+            total = len(image_files)
+            batch_size = IMAGE_CONFIG["probe_batch_size"]
+            with open(output_md_path, 'w', encoding='utf-8') as f, \
+                    ThreadPoolExecutor(max_workers=IMAGE_CONFIG["probe_workers"]) as executor:
+                f.write(f"### 图片集合分析\n\n共 {total} 张图片\n\n")
                 
-                # 获取图片文件名
-                img_name = os.path.basename(img_path)
-                
-                # 生成标准的Markdown图片标记
-                img_markdown = f"![{img_name}]({img_path})\n"
-                
-                # 添加到Markdown内容
-                md_content += f"#### 图片 {idx}: {img_name}\n\n{img_markdown}\n\n"
-                
-                md_content += "---\n\n"
-            
-            # 写入Markdown文件
-            with open(output_md_path, 'w', encoding='utf-8') as f:
-                f.write(md_content)
+                # 分批并发解析文件头，按原顺序写出
+                for batch_start in range(0, total, batch_size):
+                    batch = image_files[batch_start:batch_start + batch_size]
+                    parts = []
+                    for idx, (img_path, img_info) in enumerate(
+                            zip(batch, executor.map(probe_image_file, batch)), batch_start + 1):
+                        # 获取图片文件名
+                        img_name = os.path.basename(img_path)
+                        
+                        # 生成标准的Markdown图片标记
+                        img_markdown = f"![{img_name}]({img_path})\n"
+                        
+                        if img_info:
+                            format, width, height = img_info
+                            size_line = f"尺寸: {width}x{height} | 格式: {format}\n\n"
+                        else:
+                            size_line = "尺寸: 未知 | 格式: 未知\n\n"
+                        
+                        parts.append(f"#### 图片 {idx}: {img_name}\n\n{img_markdown}\n{size_line}---\n\n")
+                    f.write("".join(parts))
+                    print(f"已处理 {min(batch_start + batch_size, total)}/{total} 张图片")
                 
             print(f"图片集合成功转换为Markdown：{output_md_path}")
             return True
@@ -326,12 +550,15 @@ class ImageProcessor:
             print(f"图片集合转换为Markdown失败: {e}")
             return False
     
-    def process_markdown_images(self, markdown_content):
+    def process_markdown_images(self, markdown_content, image_store=None):
         """
         处理Markdown内容中的图片，将其转换为向量友好的格式
         
+        图片分析在线程池中并发执行，实际并发数由限流器根据RPM/TPM配额和接口健康状况自适应调整
+        
         Args:
             markdown_content: Markdown内容
+            image_store: 可选的ImageStore，其中已有的图片直接从内存分析，不再读取磁盘
             
         Returns:
             处理后的Markdown内容
@@ -339,26 +566,40 @@ class ImageProcessor:
         # 匹配Markdown中的图片语法
         image_pattern = r'!\[(.*?)\]\((.*?)\)'
         
-        def replace_image(match):
+        def analyze(match):
             alt_text = match.group(1)
             image_path = match.group(2)
             
+            # 优先使用内存中的图片数据
+            stored = image_store.get(image_path) if image_store is not None else None
+            if stored is not None:
+                image_data, image_format = stored
+                return self.analyze_image(image_path, context=alt_text,
+                                          image_data=image_data, image_format=image_format)
+            
             # 检查图片是否存在
             if not os.path.exists(image_path):
-                return match.group(0)  # 如果图片不存在，保持原样
+                return None  # 如果图片不存在，保持原样
             
             # 分析图片
-            analysis = self.analyze_image(image_path, context=alt_text)
-            
-            # 返回原始图片标签和分析结果
-            return f"{match.group(0)}\n{analysis}"
+            return self.analyze_image(image_path, context=alt_text)
+        
+        matches = list(re.finditer(image_pattern, markdown_content))
+        if not matches:
+            return markdown_content
+        
+        # 并发分析所有图片，结果按原顺序拼回
+        with ThreadPoolExecutor(max_workers=self.governor.max_concurrency) as executor:
+            analyses = list(executor.map(analyze, matches))
         
-        # 替换所有图片
-        # 使用re.sub函数替换所有匹配的图片标记
-        # 参数1: image_pattern - 要匹配的正则表达式模式
-        # 参数2: replace_image - 替换函数，处理每个匹配项
-        # 参数3: markdown_content - 要处理的原始文本内容
-        # 返回值: 替换后的新文本内容
-        processed_content = re.sub(image_pattern, replace_image, markdown_content)
+        parts = []
+        last = 0
+        for match, analysis in zip(matches, analyses):
+            parts.append(markdown_content[last:match.end()])
+            if analysis is not None:
+                # 返回原始图片标签和分析结果
+                parts.append(f"\n{analysis}")
+            last = match.end()
+        parts.append(markdown_content[last:])
         
-        return processed_content 
\ No newline at end of file
+        return "".join(parts)
\ No newline at end of file
@@ -0,0 +1,94 @@
+"""
+内存图片存储模块，在PDF转换和图片分析之间传递图片数据，避免反复读写磁盘
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+class ImageStore:
+    """内存图片存储类，按Markdown中的图片路径保存图片字节，可选地在后台写入磁盘"""
+
+    def __init__(self, write_to_disk=True, max_workers=2):
+        """
+        初始化图片存储
+
+        Args:
+            write_to_disk: 是否同时把图片写入磁盘（在后台线程中异步执行）
+            max_workers: 后台写盘线程数
+        """
+        self.write_to_disk = write_to_disk
+        self._images = {}
+        self._lock = threading.Lock()
+        self._pending = []
+        self._executor = ThreadPoolExecutor(max_workers=max_workers) if write_to_disk else None
+
+    def put(self, image_path, image_data, image_format):
+        """
+        保存一张图片
+
+        Args:
+            image_path: 图片在Markdown中引用的路径
+            image_data: 图片字节（bytes或memoryview，不做复制）
+            image_format: 图片格式，如png、jpeg
+        """
+        with self._lock:
+            self._images[image_path] = (image_data, image_format)
+            if self._executor is not None:
+                self._pending.append(self._executor.submit(self._write, image_path, image_data))
+
+    def get(self, image_path):
+        """
+        获取一张图片
+
+        Args:
+            image_path: 图片在Markdown中引用的路径
+
+        Returns:
+            (图片字节, 图片格式)，不存在时返回None
+        """
+        with self._lock:
+            return self._images.get(image_path)
+
+    def items(self):
+        """
+        获取所有图片
+
+        Returns:
+            [(图片路径, (图片字节, 图片格式)), ...]
+        """
+        with self._lock:
+            return list(self._images.items())
+
+    def __contains__(self, image_path):
+        with self._lock:
+            return image_path in self._images
+
+    def __len__(self):
+        with self._lock:
+            return len(self._images)
+
+    def _write(self, image_path, image_data):
+        """在后台线程中把图片写入磁盘"""
+        directory = os.path.dirname(image_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(image_path, "wb") as img_file:
+            img_file.write(image_data)
+
+    def flush(self):
+        """等待所有后台写盘任务完成"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        for future in pending:
+            try:
+                future.result()
+            except Exception as e:
+                print(f"图片写入磁盘失败: {e}")
+
+    def close(self):
+        """等待写盘完成并释放后台线程"""
+        self.flush()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
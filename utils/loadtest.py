@@ -0,0 +1,135 @@
+"""
+图片分析压测工具，在本地桩服务上驱动MarkdownConverter.convert，统计吞吐量、延迟分位数和重试次数
+
+用法：
+    python -m utils.loadtest --images 200 --latency lognormal:-1.5,0.5 --error-rate 0.02 --burst-every 10 --burst-length 1
+    python -m utils.loadtest --images 200 --base-url http://127.0.0.1:8000   # 使用已启动的桩服务
+"""
+
+import os
+import io
+import json
+import time
+import argparse
+import tempfile
+import threading
+from PIL import Image
+from config import MULTIMODAL_CONFIG
+from utils.image_processor import ImageProcessor
+from utils.markdown_converter import MarkdownConverter
+from utils.metrics import latency_summary
+from utils.vision_stub import VisionStubServer
+
+class TimedImageProcessor(ImageProcessor):
+    """记录每张图片分析耗时的ImageProcessor"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.latencies = []
+        self._latency_lock = threading.Lock()
+
+    def analyze_image(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().analyze_image(*args, **kwargs)
+        finally:
+            with self._latency_lock:
+                self.latencies.append(time.perf_counter() - start)
+
+def make_corpus(work_dir, image_count, image_size=(256, 192)):
+    """
+    生成压测用的raw.md及其引用的图片
+
+    Args:
+        work_dir: 工作目录
+        image_count: 图片数量
+        image_size: 图片尺寸
+
+    Returns:
+        raw.md路径
+    """
+    buffer = io.BytesIO()
+    Image.new("RGB", image_size, "white").save(buffer, format="PNG")
+    png = buffer.getvalue()
+    parts = ["# Page 1\n\n"]
+    for idx in range(image_count):
+        image_path = os.path.join(work_dir, f"image_{idx}.png")
+        with open(image_path, "wb") as f:
+            f.write(png)
+        parts.append(f"第{idx + 1}段正文\n\n![Image {idx}]({image_path})\n\n")
+    parts.append("| 列1 | 列2 |\n| --- | --- |\n| a | b |\n\n")
+    raw_path = os.path.join(work_dir, "raw.md")
+    with open(raw_path, "w", encoding="utf-8") as f:
+        f.write("".join(parts))
+    return raw_path
+
+def run_loadtest(base_url, image_count, config_overrides=None):
+    """
+    对指定的接口地址执行一次压测
+
+    Args:
+        base_url: /chat/completions所在的基础地址
+        image_count: 图片数量
+        config_overrides: 覆盖MULTIMODAL_CONFIG的配置项
+
+    Returns:
+        压测报告字典
+    """
+    config = dict(MULTIMODAL_CONFIG, base_url=base_url, api_key=MULTIMODAL_CONFIG.get("api_key") or "stub",
+                  model=MULTIMODAL_CONFIG.get("model") or "stub")
+    config.update(config_overrides or {})
+    processor = TimedImageProcessor(config=config)
+    with tempfile.TemporaryDirectory(prefix="loadtest_") as work_dir:
+        raw_path = make_corpus(work_dir, image_count)
+        emb_path = os.path.join(work_dir, "emb.md")
+        converter = MarkdownConverter(raw_md_path=raw_path, emb_md_path=emb_path, image_processor=processor)
+        start = time.perf_counter()
+        converter.convert()
+        elapsed = time.perf_counter() - start
+        with open(emb_path, encoding="utf-8") as f:
+            analyzed = f.read().count("> IMAGE_BEGIN")
+    return {
+        "images": image_count,
+        "analyzed": analyzed,
+        "elapsed_seconds": elapsed,
+        "images_per_second": image_count / elapsed if elapsed else None,
+        "latency_seconds": latency_summary(processor.latencies),
+        "requests": processor.stats["requests"],
+        "retries": processor.stats["retries"],
+        "failures": processor.stats["failures"],
+        "governor": processor.governor.snapshot(),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='图片分析压测工具')
+    parser.add_argument('--images', type=int, default=100, help='图片数量')
+    parser.add_argument('--base-url', type=str, help='已启动的桩服务地址，不指定时在进程内启动桩服务')
+    parser.add_argument('--latency', type=str, default='lognormal:-1.5,0.5', help='桩服务延迟分布')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='桩服务返回500错误的概率')
+    parser.add_argument('--burst-every', type=float, default=0.0, help='桩服务每隔多少秒出现一次429突发')
+    parser.add_argument('--burst-length', type=float, default=0.0, help='桩服务每次429突发持续的秒数')
+    parser.add_argument('--retry-after', type=float, default=1.0, help='桩服务429响应中Retry-After头的秒数')
+    parser.add_argument('--retry-backoff', type=float, default=0.1, help='客户端重试的初始退避时间（秒）')
+    parser.add_argument('--rpm', type=float, default=0, help='客户端每分钟请求数上限，0表示不限制')
+    parser.add_argument('--tpm', type=float, default=0, help='客户端每分钟token数上限，0表示不限制')
+    parser.add_argument('--max-concurrency', type=int, default=MULTIMODAL_CONFIG["max_concurrency"], help='客户端自适应并发上限')
+    parser.add_argument('--output', type=str, help='压测报告JSON输出路径')
+    args = parser.parse_args()
+
+    overrides = {"retry_backoff": args.retry_backoff, "rpm": args.rpm, "tpm": args.tpm,
+                 "max_concurrency": args.max_concurrency}
+    if args.base_url:
+        report = run_loadtest(args.base_url, args.images, overrides)
+    else:
+        with VisionStubServer(latency=args.latency, error_rate=args.error_rate, burst_every=args.burst_every,
+                              burst_length=args.burst_length, retry_after=args.retry_after) as stub:
+            report = run_loadtest(stub.base_url, args.images, overrides)
+            report["stub"] = dict(stub.stats)
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
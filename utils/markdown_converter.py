@@ -3,24 +3,37 @@ Markdown转换模块，负责将raw.md转换为emb.md
 """
 
 import os
-import re
 from utils.image_processor import ImageProcessor
+from utils.dedup import dedup_markdown
 from config import PATH_CONFIG
 
 class MarkdownConverter:
     """Markdown转换类，负责将raw.md转换为emb.md"""
     
-    def __init__(self, raw_md_path=None, emb_md_path=None):
+    def __init__(self, raw_md_path=None, emb_md_path=None, image_store=None, image_processor=None,
+                 columnar_writer=None, doc_id=None, dedup_index=None, dedup_mode="flag"):
         """
         初始化Markdown转换器
         
         Args:
             raw_md_path: 原始Markdown文件路径
             emb_md_path: 向量友好的Markdown文件路径
+            image_store: 可选的ImageStore，其中的图片直接从内存分析
+            image_processor: 共享的ImageProcessor，为None时新建
+            columnar_writer: 可选的ColumnarWriter，提供时把emb.md按元素追加到列式数据集
+            doc_id: 列式数据和近重复索引中的文档ID，默认为raw.md的文件名（不含扩展名）
+            dedup_index: 可选的DedupIndex，提供时检测与已处理内容近似重复的文档和文本块
+            dedup_mode: 近重复内容的处理方式，"flag"添加DUPLICATE_OF标记，"drop"删除
         """
         self.raw_md_path = raw_md_path or PATH_CONFIG["raw_md"]
         self.emb_md_path = emb_md_path or PATH_CONFIG["emb_md"]
-        self.image_processor = ImageProcessor()
+        self.image_store = image_store
+        self.image_processor = image_processor or ImageProcessor()
+        self.columnar_writer = columnar_writer
+        self.doc_id = doc_id or os.path.splitext(os.path.basename(self.raw_md_path))[0]
+        self.dedup_index = dedup_index
+        self.dedup_mode = dedup_mode
+        self.dedup_report = None
     
     def read_markdown(self, file_path):
         """
@@ -64,75 +77,157 @@ class MarkdownConverter:
         Returns:
             处理后的Markdown内容
         """
-        return self.image_processor.process_markdown_images(content)
+        return self.image_processor.process_markdown_images(content, image_store=self.image_store)
     
-    def process_tables(self, content):
+    @staticmethod
+    def _is_table_row(line):
+        """判断一行是否为表格行：以|开头、以|结尾，且至少包含一个单元格字符"""
+        return len(line) >= 3 and line[0] == '|' and line[-1] == '|'
+    
+    @staticmethod
+    def _is_separator_chars(line):
+        """判断一行是否只由分隔行字符组成（-、:、|和空白），空行也算
+
+        空白与原正则中的\s一致，包含全角空格、不换行空格等Unicode空白
         """
-        处理Markdown内容中的表格
+        return all(c in '-:|' or c.isspace() for c in line)
+    
+    def find_table_blocks(self, content):
+        """
+        单遍扫描Markdown内容，找出所有表格块
+        
+        与原先基于正则表达式的实现匹配结果一致：表头从行中第一个|开始，
+        分隔行可以跨越多行只含分隔字符的行（原正则中的\s包含换行），之后贪婪地吸收所有数据行。
+        每行的属性只计算一次，运行时间与内容长度成线性关系，
+        不会在含大量|的长行或畸形表格上回溯。
         
         Args:
             content: Markdown内容
             
         Returns:
-            处理后的Markdown内容
+            (start, end) 偏移量列表，content[start:end] 为表头、分隔行及所有数据行（均以换行结尾）
         """
-        # 匹配Markdown中的表格语法
-        table_pattern = r'(\|[^\n]+\|\n\|[-:\|\s]+\|\n)(\|[^\n]+\|\n)+'
+        lines = content.split('\n')
+        # 最后一段没有换行结尾，不能作为表格行
+        line_count = len(lines) - 1
+        offsets = []
+        pos = 0
+        for line in lines:
+            offsets.append(pos)
+            pos += len(line) + 1
         
-        def replace_table(match):
-            table = match.group(0)
-            
-            # 提取表格内容
-            table_rows = table.strip().split('\n')
-            if len(table_rows) < 3:
-                return table  # 如果表格行数不足，保持原样
-            
-            # 提取表头（列名）
-            header_row = table_rows[0].strip()
-            # 从表头行中提取列名
-            headers = [h.strip() for h in header_row.split('|')[1:-1]]  # 跳过首尾的|
-            
-            # 构建表格描述
-            row_count = len(table_rows) - 2  # 减去表头和分隔行
-            column_count = len(headers)
-            
-            # 生成表格描述开始部分，注意：这里需要多添加两个空格保证markdown语法中的引用正常换行
-            table_desc = [
-                "> TABLE_BEGIN  ",
-                f"> Rows: {row_count}  ",
-                f"> Columns: {column_count}  ",
-                f"> Header: {header_row}  "
-            ]
+        is_row = [self._is_table_row(lines[k]) for k in range(line_count)] + [False]
+        # sep_end[k]: 从第k行开始的连续分隔字符行中，能作为分隔行结尾（以|结尾且下一行是数据行）的最后一行
+        sep_end = [None] * (line_count + 1)
+        for k in range(line_count - 1, -1, -1):
+            line = lines[k]
+            if not self._is_separator_chars(line):
+                continue
+            if sep_end[k + 1] is not None:
+                sep_end[k] = sep_end[k + 1]
+            elif line.endswith('|') and is_row[k + 1]:
+                sep_end[k] = k
+        
+        blocks = []
+        i = 0
+        # 表格至少需要表头、分隔行和一行数据
+        while i + 2 < line_count:
+            line = lines[i]
+            # 表头可以从行中间的第一个|开始，但必须以|结尾
+            pipe = line.find('|')
+            sep_start = lines[i + 1]
+            m = sep_end[i + 1]
+            if (pipe == -1
+                    or not self._is_table_row(line[pipe:])
+                    or not sep_start.startswith('|')
+                    or m is None
+                    or (m == i + 1 and len(sep_start) < 3)):
+                i += 1
+                continue
+            # 贪婪地吸收后续所有数据行
+            j = m + 1
+            while is_row[j]:
+                j += 1
+            blocks.append((offsets[i] + pipe, offsets[j]))
+            i = j
+        return blocks
+    
+    def describe_table(self, table):
+        """
+        为单个表格生成向量友好的行描述
+        
+        Args:
+            table: 表格原文（表头、分隔行及数据行）
             
-            # 处理每一行的内容
-            for row_idx, row in enumerate(table_rows[2:], 1):  # 跳过表头和分隔行，从第一个数据行开始
-                # 跳过空行
-                if not row.strip():
-                    continue
-                    
-                # 从行中提取单元格内容
-                cells = [cell.strip() for cell in row.split('|')[1:-1]]  # 跳过首尾的|
-                
-                # 添加行描述
-                table_desc.append(f"> 第{row_idx}行:")
+        Returns:
+            表格原文及其TABLE_BEGIN/TABLE_END描述
+        """
+        # 提取表格内容
+        table_rows = table.strip().split('\n')
+        if len(table_rows) < 3:
+            return table  # 如果表格行数不足，保持原样
+        
+        # 提取表头（列名）
+        header_row = table_rows[0].strip()
+        # 从表头行中提取列名
+        headers = [h.strip() for h in header_row.split('|')[1:-1]]  # 跳过首尾的|
+        
+        # 构建表格描述
+        row_count = len(table_rows) - 2  # 减去表头和分隔行
+        column_count = len(headers)
+        
+        # 生成表格描述开始部分，注意：这里需要多添加两个空格保证markdown语法中的引用正常换行
+        table_desc = [
+            "> TABLE_BEGIN  ",
+            f"> Rows: {row_count}  ",
+            f"> Columns: {column_count}  ",
+            f"> Header: {header_row}  "
+        ]
+        
+        # 处理每一行的内容
+        for row_idx, row in enumerate(table_rows[2:], 1):  # 跳过表头和分隔行，从第一个数据行开始
+            # 跳过空行
+            if not row.strip():
+                continue
                 
-                # 遍历每个单元格，添加列描述
-                for col_idx, (header, cell) in enumerate(zip(headers, cells)):
-                    # 确保不会访问越界，且同时限制只输出有标题的列
-                    if cell and header:  # 只有当单元格和标题都有内容时才输出
-                        # 这里需要多添加两个空格保证markdown语法中的引用正常换行
-                        table_desc.append(f">   列\"{header}\"的内容是\"{cell}\"  ")
+            # 从行中提取单元格内容
+            cells = [cell.strip() for cell in row.split('|')[1:-1]]  # 跳过首尾的|
             
-            # 添加表格描述结束标记
-            table_desc.append("> TABLE_END")
+            # 添加行描述
+            table_desc.append(f"> 第{row_idx}行:")
             
-            # 返回原始表格和描述 (使用连接符号而非f-string来避免转义问题)
-            return table + "\n" + "\n".join(table_desc)
+            # 遍历每个单元格，添加列描述
+            for col_idx, (header, cell) in enumerate(zip(headers, cells)):
+                # 确保不会访问越界，且同时限制只输出有标题的列
+                if cell and header:  # 只有当单元格和标题都有内容时才输出
+                    # 这里需要多添加两个空格保证markdown语法中的引用正常换行
+                    table_desc.append(f">   列\"{header}\"的内容是\"{cell}\"  ")
         
-        # 替换所有表格
-        processed_content = re.sub(table_pattern, replace_table, content)
+        # 添加表格描述结束标记
+        table_desc.append("> TABLE_END")
         
-        return processed_content
+        # 返回原始表格和描述 (使用连接符号而非f-string来避免转义问题)
+        return table + "\n" + "\n".join(table_desc)
+    
+    def process_tables(self, content):
+        """
+        处理Markdown内容中的表格
+        
+        Args:
+            content: Markdown内容
+            
+        Returns:
+            处理后的Markdown内容
+        """
+        parts = []
+        last = 0
+        for start, end in self.find_table_blocks(content):
+            parts.append(content[last:start])
+            parts.append(self.describe_table(content[start:end]))
+            last = end
+        parts.append(content[last:])
+        
+        return ''.join(parts)
     
     def convert(self):
         """
@@ -148,7 +243,27 @@ class MarkdownConverter:
         content = self.process_images(content)
         
         # 处理表格
-        # content = self.process_tables(content)
+        content = self.process_tables(content)
+        
+        # 近重复检测
+        if self.dedup_index is not None:
+            content, self.dedup_report = dedup_markdown(content, self.doc_id, self.dedup_index, self.dedup_mode)
+            report = self.dedup_report
+            if report["duplicate_of"]:
+                print(f"文档与{report['duplicate_of']}近似重复（相似度{report['similarity']:.2f}）")
+            if report["duplicate_chunks"]:
+                print(f"{report['duplicate_chunks']}/{report['chunks']}个文本块与已处理内容近似重复")
+            if not content:
+                # 删除之前运行留下的emb.md，以免跳过的重复文档仍被向量化
+                if self.emb_md_path and os.path.exists(self.emb_md_path):
+                    os.remove(self.emb_md_path)
+                print(f"已跳过近似重复的文档: {self.doc_id}")
+                return
         
         # 写入向量友好的Markdown文件
-        self.write_markdown(content, self.emb_md_path) 
\ No newline at end of file
+        self.write_markdown(content, self.emb_md_path)
+        
+        # 追加到列式数据集
+        if self.columnar_writer is not None:
+            rows = self.columnar_writer.write_markdown(self.doc_id, content)
+            print(f"已追加{rows}个元素到列式数据集: {self.doc_id}") 
\ No newline at end of file
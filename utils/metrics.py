@@ -0,0 +1,39 @@
+"""
+指标统计模块，提供延迟分位数等通用统计函数
+"""
+
+import math
+
+def percentile(sorted_values, q):
+    """
+    计算已排序序列的分位数（最近秩法）
+
+    Args:
+        sorted_values: 已排序的数值列表
+        q: 分位数（0-100）
+
+    Returns:
+        分位数值，序列为空时返回None
+    """
+    if not sorted_values:
+        return None
+    rank = math.ceil(q / 100 * len(sorted_values))
+    return sorted_values[min(max(rank, 1), len(sorted_values)) - 1]
+
+def latency_summary(values):
+    """
+    汇总延迟分布
+
+    Args:
+        values: 延迟数值（秒），顺序任意
+
+    Returns:
+        包含p50、p95、p99和max的字典
+    """
+    values = sorted(values)
+    return {
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": values[-1] if values else None,
+    }
@@ -1,9 +1,36 @@
+import os
+import re
+import sys
+import gc
+import time
+import queue
+import shutil
+import tempfile
+import multiprocessing
 from pdfminer.high_level import extract_pages
 from pdfminer.layout import LTTextBoxHorizontal
 import camelot
 import fitz  # PyMuPDF
-from io import StringIO
-from collections import Counter
+from io import BytesIO
+from contextlib import ExitStack
+from collections import Counter, OrderedDict
+import pandas as pd
+from config import PDF_CONFIG
+from utils.image_store import ImageStore
+from utils.render_backend import make_lattice_backend
+from utils.boilerplate import remove_boilerplate
+from utils.watchdog import stage_timeout, StageTimeout, timeouts_available, timeouts_supported
+from utils.source_io import read_source, spill_to_tempfile
+
+# 页面内容流中绘制XObject的操作符，如"/Im0 Do"
+DO_PATTERN = re.compile(rb'/([^\s/\[\]<>(){}%]+)\s*Do\b')
+# 可选的表格引擎
+TABLE_ENGINES = ("camelot-lattice", "camelot-stream", "pymupdf")
+
+try:
+    import resource
+except ImportError:  # Windows没有resource模块
+    resource = None
 
 def clean_text(text):
     """清理文本内容，确保可以正确显示在Markdown中"""
@@ -41,126 +68,729 @@ def clean_text(text):
         print(f"Warning: Text cleaning failed: {e}")
         return ""
 
-def pdf_to_markdown(pdf_path, output_md_path, max_heading_level=4, table_mode="lattice"):
-    markdown_content = StringIO()
+def get_page_count(pdf_path):
+    """获取PDF总页数"""
+    with fitz.open(pdf_path) as doc:
+        return doc.page_count
 
-    # 初始化工具
-    doc = fitz.open(pdf_path)
+def is_scanned_page(page_layout, page_fitz, coverage_threshold):
+    """
+    判断页面是否为扫描页：没有文本层，且图片覆盖了页面的大部分面积
 
-    # 逐页处理
-    for page_num, page_layout in enumerate(extract_pages(pdf_path)):
-        markdown_content.write(f"# Page {page_num + 1}\n\n")
-
-        # 存储页面元素
-        elements = []
-        text_sizes = []
-
-        # 1. 提取表格（Camelot）
-        tables = camelot.read_pdf(pdf_path, pages=str(page_num + 1), flavor=table_mode)
-        # 提取每个表格的边界框坐标
-        # table._bbox包含表格的边界坐标，格式为[x0, y0, x1, y1]
-        # x0, y0: 表格左上角坐标
-        # x1, y1: 表格右下角坐标
-        # 这些坐标将用于后续检测文本是否与表格重叠
-        table_bboxes = [(table._bbox[0], table._bbox[1], table._bbox[2], table._bbox[3]) for table in tables]
-
-        for table_num, table in enumerate(tables):
-            x0, y0, x1, y1 = table._bbox
-            df = table.df
-            if df.empty or all(all(cell == "" for cell in row) for _, row in df.iterrows()):
-                continue
-            # 清理表格内容
-            df = df.applymap(clean_text)
-            table_md = ["#### Table\n"]
-            table_md.append("| " + " | ".join(str(col).replace("\n", " ") for col in df.columns) + " |")
-            table_md.append("| " + " | ".join(["---"] * len(df.columns)) + " |")
-            for _, row in df.iterrows():
-                table_md.append("| " + " | ".join(str(cell).replace("\n", " ") if cell else "" for cell in row) + " |")
-            table_md.append("\n")
-            elements.append(("table", "\n".join(table_md), None, None, x0, y1))
-            print(f"Page {page_num + 1} Table {table_num} at ({x0}, {y0}, {x1}, {y1})")
-
-        # 2. 提取文本框（pdfminer.six）
+    扫描件常把一页切成几十个图片条带或瓦片，逐个提取会产生大量碎片和视觉模型调用
+
+    Args:
+        page_layout: pdfminer的页面布局，为None时（版面分析超时）用PyMuPDF检查文本层
+        page_fitz: PyMuPDF的页面对象
+        coverage_threshold: 图片覆盖率阈值（0-1）
+
+    Returns:
+        是否为扫描页
+    """
+    if page_layout is None:
+        if clean_text(page_fitz.get_text("text").strip()):
+            return False
+    else:
+        for element in page_layout:
+            if isinstance(element, LTTextBoxHorizontal) and clean_text(element.get_text().strip()):
+                return False
+
+    return image_coverage(page_fitz) >= coverage_threshold
+
+def union_area(rects):
+    """
+    计算一组矩形并集的面积，重叠部分只计算一次
+
+    按所有矩形的左右边界把平面切成竖条，每个竖条内合并与之相交的矩形的纵向区间
+
+    Args:
+        rects: (x0, y0, x1, y1)矩形列表
+
+    Returns:
+        并集面积
+    """
+    rects = [r for r in rects if r[2] > r[0] and r[3] > r[1]]
+    xs = sorted({x for r in rects for x in (r[0], r[2])})
+    area = 0.0
+    for left, right in zip(xs, xs[1:]):
+        spans = sorted((r[1], r[3]) for r in rects if r[0] <= left and r[2] >= right)
+        covered, top, bottom = 0.0, None, None
+        for y0, y1 in spans:
+            if bottom is None or y0 > bottom:
+                if bottom is not None:
+                    covered += bottom - top
+                top, bottom = y0, y1
+            else:
+                bottom = max(bottom, y1)
+        if bottom is not None:
+            covered += bottom - top
+        area += covered * (right - left)
+    return area
+
+def image_coverage(page_fitz):
+    """
+    计算页面中图片覆盖的面积比例
+
+    Args:
+        page_fitz: PyMuPDF的页面对象
+
+    Returns:
+        图片（裁剪到页面内）并集面积占页面面积的比例，重叠或平铺的图片不重复计算
+    """
+    page_rect = page_fitz.rect
+    page_area = page_rect.width * page_rect.height
+    if page_area <= 0:
+        return 0.0
+    rects = []
+    for info in page_fitz.get_image_info():
+        bbox = fitz.Rect(info["bbox"]) & page_rect
+        if not bbox.is_empty:
+            rects.append(tuple(bbox))
+    return union_area(rects) / page_area
+
+def page_text_boxes(page_layout, page_fitz):
+    """
+    获取页面的文本框
+
+    Args:
+        page_layout: pdfminer的页面布局；为None时（版面分析超时）退回PyMuPDF的文本块，
+                     精度较低但耗时稳定
+        page_fitz: PyMuPDF的页面对象
+
+    Yields:
+        (text, font_size, is_bold, (x0, y0, x1, y1))，坐标为左下角为原点的PDF坐标，只包含非空文本
+    """
+    if page_layout is not None:
         for element in page_layout:
             if isinstance(element, LTTextBoxHorizontal):
                 text = clean_text(element.get_text().strip())
                 if not text:
                     continue
-                x0, y0, x1, y1 = element.bbox
-                in_table = any(t_x0 - 5 <= x1 and t_x1 + 5 >= x0 and t_y0 - 5 <= y1 and t_y1 + 5 >= y0 
-                              for t_x0, t_y0, t_x1, t_y1 in table_bboxes)
-                if in_table:
-                    continue
                 font_size = max([char.size for char in element if hasattr(char, 'size')], default=0)
-                is_bold = any("bold" in (char.fontname.lower() if hasattr(char, 'fontname') else "") 
-                             for char in element)
-                text_sizes.append(font_size)
-                elements.append(("text", text, font_size, is_bold, x0, y1))
-                print(f"Page {page_num + 1} Text {text} at ({x0}, {y0}, {x1}, {y1})")
-
-        # 3. 动态确定标题级别
-        if text_sizes:
-            size_counts = sorted([(size, count) for size, count in Counter(text_sizes).items()], 
-                                key=lambda x: x[1], reverse=True)
-            body_size = size_counts[0][0]
-            heading_sizes = [size for size, _ in size_counts if size > body_size]
-            heading_map = {size: min(i + 1, max_heading_level) for i, size in enumerate(sorted(heading_sizes, reverse=True))}
-
-        for i, (elem_type, content, font_size, is_bold, x0, y1) in enumerate(elements):
-            if elem_type == "text":
-                if font_size in heading_map and (font_size > body_size or is_bold):
-                    level = heading_map[font_size]
-                    elements[i] = ("heading", f"{'#' * (level + 1)} {content}", None, None, x0, y1)
-                else:
-                    elements[i] = ("text", content, None, None, x0, y1)
-
-        # 4. 提取图片（PyMuPDF）
+                is_bold = any("bold" in (char.fontname.lower() if hasattr(char, 'fontname') else "")
+                              for char in element)
+                yield text, font_size, is_bold, element.bbox
+        return
+
+    page_height = page_fitz.rect.height
+    for block in page_fitz.get_text("dict")["blocks"]:
+        if block["type"] != 0:
+            continue
+        spans = [span for line in block["lines"] for span in line["spans"]]
+        text = clean_text("\n".join("".join(span["text"] for span in line["spans"]) for line in block["lines"]).strip())
+        if not text:
+            continue
+        font_size = max((span["size"] for span in spans), default=0)
+        # span的flags第5位表示粗体
+        is_bold = any(span["flags"] & 16 or "bold" in span["font"].lower() for span in spans)
+        x0, top, x1, bottom = block["bbox"]
+        yield text, font_size, is_bold, (x0, page_height - bottom, x1, page_height - top)
+
+def boilerplate_reference(doc):
+    """
+    用PyMuPDF的文本块快速提取整个文档各页的文本元素，只转换部分页面时在整个文档范围内识别页眉页脚
+
+    Returns:
+        {page_num: (elements, page_height)}，格式同extract_page_elements的结果
+    """
+    reference = {}
+    for page_num in range(doc.page_count):
+        page_fitz = doc[page_num]
+        elements = [("text", text, font_size, is_bold, x0, y1)
+                    for text, font_size, is_bold, (x0, _, _, y1) in page_text_boxes(None, page_fitz)]
+        reference[page_num] = (elements, page_fitz.rect.height)
+    return reference
+
+def iter_page_layouts(pdf_path, page_numbers, layout_timeout=None):
+    """
+    逐页进行pdfminer版面分析，每页受layout_timeout时限约束
+
+    某页超时后，pdfminer的生成器已被中断，从下一页起重新开始分析
+
+    Args:
+        pdf_path: PDF文件路径或二进制文件对象（如BytesIO）
+        page_numbers: 页面索引列表（从0开始，升序）
+        layout_timeout: 单页版面分析的时间上限（秒），0或None表示不限制
+
+    Yields:
+        (page_num, page_layout, timed_out)，超时的页面page_layout为None
+    """
+    remaining = list(page_numbers)
+    # pdfminer把空的page_numbers当作全部页面，这里需要单独处理
+    while remaining:
+        layouts = extract_pages(pdf_path, page_numbers=set(remaining))
+        for position, page_num in enumerate(remaining):
+            try:
+                with stage_timeout("layout", layout_timeout):
+                    page_layout = next(layouts)
+            except StopIteration:
+                return
+            except StageTimeout as e:
+                print(f"Page {page_num + 1} {e}, falling back to PyMuPDF text blocks")
+                yield page_num, None, True
+                remaining = remaining[position + 1:]
+                break
+            yield page_num, page_layout, False
+        else:
+            return
+
+def save_image(image_path, image_bytes, image_ext, image_store=None):
+    """保存提取的图片：有ImageStore时放入内存存储，否则直接写入磁盘"""
+    if image_store is not None:
+        image_store.put(image_path, image_bytes, image_ext)
+    else:
+        with open(image_path, "wb") as img_file:
+            img_file.write(image_bytes)
+
+class ImageExtractCache:
+    """按xref缓存已提取的图片，同一文档中重复出现的图片（如每页的logo）只提取一次"""
+
+    def __init__(self, doc, max_mb=None):
+        """
+        初始化缓存
+
+        Args:
+            doc: 已打开的PyMuPDF文档
+            max_mb: 缓存的图片字节上限（MB），超过时淘汰最久未使用的图片，默认使用PDF_CONFIG["image_cache_mb"]
+        """
+        self.doc = doc
+        self.max_bytes = (max_mb if max_mb is not None else PDF_CONFIG["image_cache_mb"]) * 1024 * 1024
+        self.stats = {"extracted": 0, "cache_hits": 0}
+        self._images = OrderedDict()
+        self._bytes = 0
+
+    def get(self, xref):
+        """
+        获取图片
+
+        Returns:
+            (图片字节, 扩展名)
+        """
+        if xref in self._images:
+            self._images.move_to_end(xref)
+            self.stats["cache_hits"] += 1
+            return self._images[xref]
+        base_image = self.doc.extract_image(xref)
+        image = (base_image["image"], base_image["ext"])
+        self.stats["extracted"] += 1
+        self._images[xref] = image
+        self._bytes += len(image[0])
+        while self._bytes > self.max_bytes and self._images:
+            _, (evicted, _) = self._images.popitem(last=False)
+            self._bytes -= len(evicted)
+        return image
+
+def page_image_placements(page_fitz, images):
+    """
+    一次获取页面上所有图片的放置位置，代替对每张图片调用get_image_bbox（每次都要重新解析页面内容）
+
+    get_image_info按页面内容中的出现顺序返回放置位置，但不包含资源名；同一xref可能以多个资源名出现，
+    这里按内容流中Do操作符的顺序把放置位置对应回资源名，结果与get_image_bbox(img)一致（取第一次放置）。
+    无法对应（如图片位于Form XObject中）时，xref只对应一个资源名的图片按xref取第一次放置，其余图片不返回
+
+    Args:
+        page_fitz: PyMuPDF页面
+        images: page_fitz.get_images(full=True)的结果
+
+    Returns:
+        {资源名: Rect}
+    """
+    name_xref = {img[7]: img[0] for img in images}
+    infos = [info for info in page_fitz.get_image_info(xrefs=True) if info["xref"]]
+    names = [name for name in (m.decode("latin-1") for m in DO_PATTERN.findall(page_fitz.read_contents()))
+             if name in name_xref]
+    placements = {}
+    if len(names) == len(infos) and all(name_xref[n] == info["xref"] for n, info in zip(names, infos)):
+        for name, info in zip(names, infos):
+            placements.setdefault(name, fitz.Rect(info["bbox"]))
+        return placements
+
+    first = {}
+    for info in infos:
+        first.setdefault(info["xref"], fitz.Rect(info["bbox"]))
+    name_count = Counter(name_xref.values())
+    for name, xref in name_xref.items():
+        if name_count[xref] == 1 and xref in first:
+            placements[name] = first[xref]
+    return placements
+
+def extract_tables(pdf_path, doc, page_num, engine="camelot-lattice", lattice_backend=None):
+    """
+    提取单个页面中的表格
+
+    Args:
+        pdf_path: PDF文件路径，只有camelot引擎使用，pymupdf引擎处理内存中的PDF时为None
+        doc: 已打开的PyMuPDF文档
+        page_num: 页面索引（从0开始）
+        engine: 表格引擎，"camelot-lattice"、"camelot-stream"或"pymupdf"
+        lattice_backend: camelot-lattice的页面渲染后端，为make_lattice_backend的返回值；
+                         为None时按PDF_CONFIG创建（不跨页复用渲染缓存）
+
+    Returns:
+        [(bbox, DataFrame), ...]，bbox为左下角为原点的PDF坐标(x0, y0, x1, y1)，
+        DataFrame的列为0..n-1，第一行是表头，与camelot的table.df一致
+    """
+    if engine == "pymupdf":
+        # 直接使用已打开文档的find_tables，不需要Ghostscript和OpenCV
         page_fitz = doc[page_num]
-        images = page_fitz.get_images(full=True)
-        image_list = []
-        # 获取页面高度用于坐标转换
         page_height = page_fitz.rect.height
-        
-        for img_index, img in enumerate(images):
-            xref = img[0]
-            base_image = doc.extract_image(xref)
-            image_bytes = base_image["image"]
-            image_ext = base_image["ext"]
-            image_path = f"image_{page_num}_{img_index}.{image_ext}"
-            with open(image_path, "wb") as img_file:
-                img_file.write(image_bytes)
-            img_rect = page_fitz.get_image_bbox(img)
-            # 修正y坐标：使用页面高度减去原始y坐标
-            x0 = img_rect.x0
-            y0 = page_height - img_rect.y1  # 转换y0
-            y1 = page_height - img_rect.y0  # 转换y1
-            image_list.append((img_index, image_path, x0, y0, y1))
-            print(f"Page {page_num + 1} Image {img_index} ({image_path}) at x0={x0}, y0={y0}, y1={y1}")
-
-        # 直接添加图片到 elements，不进行预排序
-        for img_index, image_path, x0, y0, y1 in image_list:
-            elements.append(("image", f"![Image {img_index}]({image_path})", None, None, x0, y1))
-
-        # 5. 按布局排序：从上到下（y1 从大到小），从左到右（x0）
-        elements.sort(key=lambda x: (-x[5], x[4]))
-        print(f"Page {page_num + 1} Final element order: {[x[1] for x in elements]}")
-
-        # 6. 写入 Markdown
-        for elem_type, content, _, _, x0, y1 in elements:
-            if content:  # 只写入非空内容
-                markdown_content.write(content + "\n\n")
+        tables = []
+        for table in page_fitz.find_tables().tables:
+            rows = [["" if cell is None else cell for cell in row] for row in table.extract()]
+            if not rows:
+                continue
+            left, top, right, bottom = table.bbox
+            # PyMuPDF以左上角为原点，转换为左下角为原点
+            bbox = (left, page_height - bottom, right, page_height - top)
+            tables.append((bbox, pd.DataFrame(rows)))
+        return tables
+
+    if engine not in TABLE_ENGINES:
+        raise ValueError(f"Unknown table engine: {engine}")
+    flavor = engine.split("-", 1)[1]
+    kwargs = {}
+    if flavor == "lattice":
+        kwargs["backend"] = lattice_backend if lattice_backend is not None else make_lattice_backend(doc)
+    tables = camelot.read_pdf(pdf_path, pages=str(page_num + 1), flavor=flavor, **kwargs)
+    # table._bbox包含表格的边界坐标，格式为[x0, y0, x1, y1]
+    return [(tuple(table._bbox), table.df) for table in tables]
+
+def extract_page_elements(pdf_path, doc, page_num, page_layout, max_heading_level=4, table_mode="lattice",
+                          image_store=None, scan_dpi=None, scan_coverage=None, image_dir=None, table_engine=None,
+                          lattice_backend=None, lattice_dpi=None, image_cache=None, table_timeout=None,
+                          timeouts=None):
+    """
+    提取单个页面的元素
+
+    Args:
+        pdf_path: PDF文件路径，传给camelot表格引擎，处理内存中的PDF且使用pymupdf引擎时为None
+        doc: 已打开的PyMuPDF文档
+        page_num: 页面索引（从0开始）
+        page_layout: pdfminer的页面布局，为None时（版面分析超时）使用PyMuPDF的文本块
+        lattice_backend: lattice渲染后端名称，或make_lattice_backend创建的后端对象（跨页复用渲染缓存）
+        image_cache: 文档级的ImageExtractCache，为None时只在本页内复用
+        timeouts: 可选的列表，超时的阶段名称会追加到其中
+        其余参数同pdf_to_markdown
+
+    Returns:
+        (elements, page_height)，elements为按布局排序的(type, content, font_size, is_bold, x0, y1)列表
+    """
+    scan_dpi = scan_dpi or PDF_CONFIG["scanned_page_dpi"]
+    scan_coverage = scan_coverage if scan_coverage is not None else PDF_CONFIG["scanned_page_coverage"]
+    page_fitz = doc[page_num]
+    # 获取页面高度用于坐标转换
+    page_height = page_fitz.rect.height
+
+    # 0. 扫描页快速路径：整页渲染为一张图片，不再逐个提取图片碎片
+    if is_scanned_page(page_layout, page_fitz, scan_coverage):
+        pix = page_fitz.get_pixmap(dpi=scan_dpi)
+        image_path = os.path.join(image_dir or "", f"image_{page_num}_page.png")
+        save_image(image_path, pix.tobytes("png"), "png", image_store)
+        print(f"Page {page_num + 1} is a scanned page, rendered at {scan_dpi} dpi ({image_path})")
+        return [("image", f"![Page {page_num + 1}]({image_path})", None, None, 0, page_height)], page_height
+
+    # 存储页面元素
+    elements = []
+    text_sizes = []
+    heading_map = {}
+    body_size = 0
+
+    # 1. 提取表格（Camelot或PyMuPDF）
+    if lattice_backend is None or isinstance(lattice_backend, str):
+        lattice_backend = make_lattice_backend(doc, lattice_backend, lattice_dpi)
+    table_timeout = table_timeout if table_timeout is not None else PDF_CONFIG["table_timeout"]
+    try:
+        with stage_timeout("table", table_timeout):
+            tables = extract_tables(pdf_path, doc, page_num, table_engine or f"camelot-{table_mode}", lattice_backend)
+    except StageTimeout as e:
+        # 表格阶段超时，本页只输出文本和图片
+        print(f"Page {page_num + 1} {e}, emitting text only")
+        tables = []
+        if timeouts is not None:
+            timeouts.append(e.stage)
+    # 每个表格的边界框坐标，格式为[x0, y0, x1, y1]，与pdfminer一致使用左下角为原点的PDF坐标
+    # 这些坐标将用于后续检测文本是否与表格重叠
+    table_bboxes = [bbox for bbox, _ in tables]
+
+    for table_num, (bbox, df) in enumerate(tables):
+        x0, y0, x1, y1 = bbox
+        if df.empty or all(all(cell == "" for cell in row) for _, row in df.iterrows()):
+            continue
+        # 清理表格内容（pandas 2.1起applymap更名为map）
+        df = df.map(clean_text) if hasattr(df, "map") else df.applymap(clean_text)
+        table_md = ["#### Table\n"]
+        table_md.append("| " + " | ".join(str(col).replace("\n", " ") for col in df.columns) + " |")
+        table_md.append("| " + " | ".join(["---"] * len(df.columns)) + " |")
+        for _, row in df.iterrows():
+            table_md.append("| " + " | ".join(str(cell).replace("\n", " ") if cell else "" for cell in row) + " |")
+        table_md.append("\n")
+        elements.append(("table", "\n".join(table_md), None, None, x0, y1))
+        print(f"Page {page_num + 1} Table {table_num} at ({x0}, {y0}, {x1}, {y1})")
+
+    # 2. 提取文本框（pdfminer.six，版面分析超时时为PyMuPDF的文本块）
+    for text, font_size, is_bold, (x0, y0, x1, y1) in page_text_boxes(page_layout, page_fitz):
+        in_table = any(t_x0 - 5 <= x1 and t_x1 + 5 >= x0 and t_y0 - 5 <= y1 and t_y1 + 5 >= y0 
+                      for t_x0, t_y0, t_x1, t_y1 in table_bboxes)
+        if in_table:
+            continue
+        text_sizes.append(font_size)
+        elements.append(("text", text, font_size, is_bold, x0, y1))
+        print(f"Page {page_num + 1} Text {text} at ({x0}, {y0}, {x1}, {y1})")
+
+    # 3. 动态确定标题级别
+    if text_sizes:
+        size_counts = sorted([(size, count) for size, count in Counter(text_sizes).items()], 
+                            key=lambda x: x[1], reverse=True)
+        body_size = size_counts[0][0]
+        heading_sizes = [size for size, _ in size_counts if size > body_size]
+        heading_map = {size: min(i + 1, max_heading_level) for i, size in enumerate(sorted(heading_sizes, reverse=True))}
+
+    for i, (elem_type, content, font_size, is_bold, x0, y1) in enumerate(elements):
+        if elem_type == "text":
+            if font_size in heading_map and (font_size > body_size or is_bold):
+                level = heading_map[font_size]
+                elements[i] = ("heading", f"{'#' * (level + 1)} {content}", None, None, x0, y1)
+            else:
+                elements[i] = ("text", content, None, None, x0, y1)
+
+    # 4. 提取图片（PyMuPDF）
+    images = page_fitz.get_images(full=True)
+    image_list = []
+    if image_cache is None:
+        image_cache = ImageExtractCache(doc)
+    placements = page_image_placements(page_fitz, images) if images else {}
+    # 其他图片的软蒙版（透明通道）不单独输出
+    masks = {img[1] for img in images if img[1]}
+    min_size = PDF_CONFIG["min_image_size"]
+    
+    # img_index沿用get_images中的序号，跳过的图片不影响其他图片的文件名
+    for img_index, img in enumerate(images):
+        xref, width, height = img[0], img[2], img[3]
+        if xref in masks or width < min_size or height < min_size:
+            continue
+        image_bytes, image_ext = image_cache.get(xref)
+        image_path = os.path.join(image_dir or "", f"image_{page_num}_{img_index}.{image_ext}")
+        save_image(image_path, image_bytes, image_ext, image_store)
+        # 没有批量获取到放置位置时退回逐个查询
+        img_rect = placements.get(img[7]) or page_fitz.get_image_bbox(img)
+        # 修正y坐标：使用页面高度减去原始y坐标
+        x0 = img_rect.x0
+        y0 = page_height - img_rect.y1  # 转换y0
+        y1 = page_height - img_rect.y0  # 转换y1
+        image_list.append((img_index, image_path, x0, y0, y1))
+        print(f"Page {page_num + 1} Image {img_index} ({image_path}) at x0={x0}, y0={y0}, y1={y1}")
+
+    # 直接添加图片到 elements，不进行预排序
+    for img_index, image_path, x0, y0, y1 in image_list:
+        elements.append(("image", f"![Image {img_index}]({image_path})", None, None, x0, y1))
+
+    # 5. 按布局排序：从上到下（y1 从大到小），从左到右（x0）
+    elements.sort(key=lambda x: (-x[5], x[4]))
+    print(f"Page {page_num + 1} Final element order: {[x[1] for x in elements]}")
+    return elements, page_height
+
+def render_page(page_num, elements):
+    """把单个页面的元素渲染为Markdown"""
+    parts = [f"# Page {page_num + 1}\n\n"]
+    for elem_type, content, _, _, x0, y1 in elements:
+        if content:  # 只写入非空内容
+            parts.append(content + "\n\n")
+    return "".join(parts)
+
+def current_rss_mb():
+    """获取当前进程的常驻内存（MB），无法获取时返回0"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError, AttributeError):
+        return 0.0
+
+def peak_rss_mb(who=None):
+    """
+    获取进程的峰值常驻内存（MB）
+
+    Args:
+        who: resource.RUSAGE_SELF或resource.RUSAGE_CHILDREN，默认为当前进程
+    """
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_SELF if who is None else who).ru_maxrss
+    # Linux上ru_maxrss的单位是KB，macOS上是字节
+    return usage / (1024 * 1024) if sys.platform == "darwin" else usage / 1024
+
+def _page_worker(pdf_path, page_numbers, options, result_queue, recycle_pages, rss_budget_mb, layout_timeout=None):
+    """
+    内存受限模式下的页面工作进程：依次处理页面，处理满recycle_pages页或常驻内存超过预算后退出
+
+    提取的图片直接写入磁盘，不经队列传回主进程。每页结束后清理camelot/Ghostscript临时文件并收缩PyMuPDF缓存。
+    结果通过队列发回主进程：("page", page_num, elements, page_height, rss_mb, timeouts)、
+    ("error", page_num, message)以及最后的("exit", processed, peak_rss_mb)
+    """
+    doc = fitz.open(pdf_path)
+    options = dict(options, lattice_backend=make_lattice_backend(doc, options.get("lattice_backend"),
+                                                                 options.get("lattice_dpi")),
+                   image_cache=ImageExtractCache(doc))
+    processed = 0
+    try:
+        for page_num, page_layout, layout_timed_out in iter_page_layouts(pdf_path, page_numbers, layout_timeout):
+            timeouts = ["layout"] if layout_timed_out else []
+            temp_dir = tempfile.mkdtemp(prefix="pdf2md_page_")
+            tempfile.tempdir = temp_dir
+            try:
+                elements, page_height = extract_page_elements(pdf_path, doc, page_num, page_layout,
+                                                              timeouts=timeouts, **options)
+                result_queue.put(("page", page_num, elements, page_height, current_rss_mb(), timeouts))
+            except Exception as e:
+                result_queue.put(("error", page_num, f"{type(e).__name__}: {e}"))
+            finally:
+                tempfile.tempdir = None
+                shutil.rmtree(temp_dir, ignore_errors=True)
+                del page_layout
+                fitz.TOOLS.store_shrink(100)
+                gc.collect()
+            processed += 1
+            if processed >= recycle_pages or current_rss_mb() > rss_budget_mb:
+                break
+    finally:
+        doc.close()
+        result_queue.put(("exit", processed, peak_rss_mb()))
+
+def _extract_pages_bounded(pdf_path, page_numbers, options, recycle_pages, rss_budget_mb, report,
+                           layout_timeout=None, page_deadline=None):
+    """
+    在可回收的独立工作进程中提取页面元素，限制单个进程的内存增长
+
+    report["peak_rss_mb"]记录各工作进程报告的峰值内存。工作进程超过page_deadline秒没有发回结果时
+    （例如卡在不响应SIGALRM的C扩展中）终止该进程，跳过当前页面并在report["timeouts"]中记为"page"阶段
+
+    Returns:
+        {page_num: (elements, page_height)}
+    """
+    context = multiprocessing.get_context("spawn")
+    results = {}
+    remaining = list(page_numbers)
+    while remaining:
+        result_queue = context.Queue()
+        worker = context.Process(target=_page_worker,
+                                 args=(pdf_path, remaining, options, result_queue, recycle_pages, rss_budget_mb,
+                                       layout_timeout))
+        worker.start()
+        report["workers_started"] += 1
+        done = set()
+        exited = False
+        killed = False
+        last_message = time.monotonic()
+
+        def handle(message):
+            if message[0] == "page":
+                _, page_num, elements, page_height, rss_mb, timeouts = message
+                report["timeouts"].extend({"page": page_num + 1, "stage": stage} for stage in timeouts)
+                results[page_num] = (elements, page_height)
+                report["peak_rss_mb"] = max(report["peak_rss_mb"], rss_mb)
+                done.add(page_num)
+            elif message[0] == "error":
+                _, page_num, error = message
+                print(f"Page {page_num + 1} failed in worker: {error}")
+                report["failed_pages"].append(page_num + 1)
+                done.add(page_num)
+            else:
+                report["peak_rss_mb"] = max(report["peak_rss_mb"], message[2])
+                return True
+            return False
+
+        while not exited:
+            try:
+                message = result_queue.get(timeout=1)
+            except queue.Empty:
+                if not worker.is_alive():
+                    break
+                if page_deadline and time.monotonic() - last_message > page_deadline:
+                    worker.terminate()
+                    killed = True
+                    break
+                continue
+            last_message = time.monotonic()
+            exited = handle(message)
+        worker.join()
+        # 工作进程退出前发出的结果可能仍在队列中
+        while not exited:
+            try:
+                exited = handle(result_queue.get_nowait())
+            except queue.Empty:
+                break
+        if not exited:
+            # 工作进程异常退出（例如被OOM杀死），跳过它正在处理的页面以免死循环
+            page_num = next((p for p in remaining if p not in done), None)
+            if page_num is not None:
+                print(f"Page {page_num + 1} worker exited with code {worker.exitcode}, page skipped")
+                report["failed_pages"].append(page_num + 1)
+                if killed:
+                    report["timeouts"].append({"page": page_num + 1, "stage": "page"})
+                done.add(page_num)
+        remaining = [p for p in remaining if p not in done]
+        if remaining:
+            print(f"Recycling page worker after {len(done)} pages, {len(remaining)} pages remaining")
+    return results
+
+def pdf_to_markdown_string(source, report=None, max_heading_level=4, table_mode="lattice", image_store=None,
+                           scan_dpi=None, scan_coverage=None, image_dir=None, pages=None,
+                           memory_bounded=False, recycle_pages=None, rss_budget_mb=None, table_engine=None,
+                           lattice_backend=None, lattice_dpi=None, boilerplate=None, boilerplate_ratio=None,
+                           layout_timeout=None, table_timeout=None):
+    """
+    将PDF转换为Markdown字符串
+
+    Args:
+        source: PDF文件路径，或PDF内容（bytes、memoryview或二进制文件对象，如上传的请求体）。
+                内存中的PDF由PyMuPDF直接打开、pdfminer从BytesIO读取，只有camelot表格引擎和
+                内存受限模式的工作进程必须传入文件路径，此时写入一个整个文档共用的临时文件
+        report: 可选的字典，转换报告写入其中，包含页数、失败页面、峰值内存（MB，内存受限模式下为工作进程的峰值）、
+                页眉页脚去除统计及各页超时的阶段
+        max_heading_level: 最大标题级别
+        table_mode: camelot表格提取模式，"lattice"或"stream"，未指定table_engine时使用
+        image_store: 可选的ImageStore，提供时提取的图片保存在内存中供后续分析直接使用，
+                     是否写入磁盘由ImageStore决定（异步执行）。内存受限模式下图片由工作进程直接写入磁盘，
+                     不放入image_store，以免主进程内存随页数增长
+        scan_dpi: 扫描页整页渲染的分辨率，默认使用PDF_CONFIG["scanned_page_dpi"]
+        scan_coverage: 扫描页判定的图片覆盖率阈值，默认使用PDF_CONFIG["scanned_page_coverage"]
+        image_dir: 图片输出目录，默认为当前目录
+        pages: 要转换的页面索引列表（从0开始），为None时转换全部页面；
+               输出中的页标题和图片文件名仍使用全局页码
+        memory_bounded: 是否在可回收的独立工作进程中处理页面，限制内存增长
+        recycle_pages: 内存受限模式下每个工作进程最多处理的页数，默认使用PDF_CONFIG["worker_recycle_pages"]
+        rss_budget_mb: 内存受限模式下工作进程的常驻内存预算（MB），默认使用PDF_CONFIG["worker_rss_budget_mb"]
+        table_engine: 表格引擎，"camelot-lattice"、"camelot-stream"或"pymupdf"，默认为f"camelot-{table_mode}"
+        lattice_backend: camelot-lattice的页面渲染后端，"pymupdf"（使用已打开的文档在进程内渲染）、
+                         "pdfium"、"ghostscript"或"poppler"，默认使用PDF_CONFIG["lattice_backend"]
+        lattice_dpi: pymupdf渲染后端的分辨率，默认使用PDF_CONFIG["lattice_dpi"]
+        boilerplate: 重复页眉页脚的处理方式，"drop"、"once"或"off"，默认使用PDF_CONFIG["boilerplate_mode"]（off）。
+                     指定pages时在整个文档的文本块上识别重复内容
+        boilerplate_ratio: 视为重复内容的最小页面比例，默认使用PDF_CONFIG["boilerplate_min_ratio"]
+        layout_timeout: 单页pdfminer版面分析的时间上限（秒），超时的页面改用PyMuPDF的文本块，
+                        默认使用PDF_CONFIG["layout_timeout"]，0表示不限制
+        table_timeout: 单页表格提取的时间上限（秒），超时的页面只输出文本和图片，
+                       默认使用PDF_CONFIG["table_timeout"]，0表示不限制。
+                       时限需要主线程的SIGALRM，在其他线程中调用时只有memory_bounded的工作进程中生效；
+                       指定了时限但无法生效时report["timeouts_unsupported"]为True
+
+    Raises:
+        RuntimeError: 要转换的页面全部失败（例如工作进程全部异常退出）
+
+    Returns:
+        Markdown字符串
+    """
+    options = {
+        "max_heading_level": max_heading_level,
+        "table_mode": table_mode,
+        "scan_dpi": scan_dpi,
+        "scan_coverage": scan_coverage,
+        "image_dir": image_dir,
+        "table_engine": table_engine,
+        "lattice_backend": lattice_backend,
+        "lattice_dpi": lattice_dpi,
+        "table_timeout": table_timeout,
+    }
+    layout_timeout = layout_timeout if layout_timeout is not None else PDF_CONFIG["layout_timeout"]
+    table_timeout = table_timeout if table_timeout is not None else PDF_CONFIG["table_timeout"]
+    report = report if report is not None else {}
+    report.update({"pages": 0, "failed_pages": [], "workers_started": 0, "peak_rss_mb": 0.0, "timeouts": [],
+                   "timeouts_unsupported": False})
+    # SIGALRM只能在主线程中使用（如服务模式的工作线程），此时只有内存受限模式的工作进程中时限生效
+    if (layout_timeout or table_timeout) and not timeouts_supported() \
+            and not (memory_bounded and timeouts_available()):
+        print("Warning: stage timeouts need SIGALRM on the main thread (or memory_bounded workers), "
+              "layout/table limits are ignored")
+        report["timeouts_unsupported"] = True
+    if image_dir:
+        os.makedirs(image_dir, exist_ok=True)
+
+    # 初始化工具
+    data = read_source(source)
+    doc = fitz.open(source) if data is None else fitz.open(stream=data, filetype="pdf")
+
+    # 逐页处理
+    if pages is None:
+        page_numbers = list(range(doc.page_count))
+    else:
+        page_numbers = sorted(set(pages))
+
+    # 只转换部分页面（分片）时，在整个文档上识别页眉页脚，使各分片的处理结果与整篇转换一致
+    reference = None
+    if len(page_numbers) < doc.page_count and (boilerplate or PDF_CONFIG["boilerplate_mode"]) != "off":
+        reference = boilerplate_reference(doc)
+
+    with ExitStack() as stack:
+        # 内存中的PDF默认不落盘，pdf_path只供camelot和工作进程使用
+        pdf_path = source if data is None else None
+        if data is not None and (memory_bounded or (table_engine or f"camelot-{table_mode}") != "pymupdf"):
+            pdf_path = stack.enter_context(spill_to_tempfile(data, ".pdf"))
+
+        if memory_bounded:
+            doc.close()
+            # 两个阶段都有时限时，单页的总耗时也有上限
+            page_deadline = None
+            if layout_timeout and table_timeout and timeouts_available():
+                page_deadline = layout_timeout + table_timeout + PDF_CONFIG["worker_page_grace"]
+            results = _extract_pages_bounded(pdf_path, page_numbers, options,
+                                             recycle_pages or PDF_CONFIG["worker_recycle_pages"],
+                                             rss_budget_mb or PDF_CONFIG["worker_rss_budget_mb"], report,
+                                             layout_timeout, page_deadline)
+        else:
+            results = {}
+            options["lattice_backend"] = make_lattice_backend(doc, lattice_backend, lattice_dpi)
+            options["image_cache"] = ImageExtractCache(doc)
+            layout_source = pdf_path if data is None else BytesIO(data)
+            for page_num, page_layout, layout_timed_out in iter_page_layouts(layout_source, page_numbers,
+                                                                             layout_timeout):
+                timeouts = ["layout"] if layout_timed_out else []
+                results[page_num] = extract_page_elements(pdf_path, doc, page_num, page_layout,
+                                                          image_store=image_store, timeouts=timeouts, **options)
+                report["timeouts"].extend({"page": page_num + 1, "stage": stage} for stage in timeouts)
+            doc.close()
+
+    # 文档级别去除各页重复的页眉、页脚、页码等
+    results, report["boilerplate"] = remove_boilerplate(results, mode=boilerplate, min_ratio=boilerplate_ratio,
+                                                        reference=reference)
+    if report["boilerplate"]["elements_removed"]:
+        print(f"Removed {report['boilerplate']['elements_removed']} repeated header/footer elements "
+              f"({report['boilerplate']['chars_removed']} chars)")
+
+    markdown_content = "".join(render_page(page_num, results[page_num][0])
+                               for page_num in page_numbers if page_num in results)
+    report["pages"] = sum(1 for page_num in page_numbers if page_num in results)
+    if page_numbers and not report["pages"]:
+        raise RuntimeError(f"All {len(page_numbers)} pages failed, failed pages: {report['failed_pages']}")
+
+    # ru_maxrss是进程生命周期内的峰值，常驻服务中会包含之前的任务，内存受限模式下只统计当前内存
+    report["peak_rss_mb"] = max(report["peak_rss_mb"], current_rss_mb() if memory_bounded else peak_rss_mb())
+    print(f"Converted {report['pages']} pages, peak memory {report['peak_rss_mb']:.1f} MB")
+    if report["timeouts"]:
+        print(f"Stage timeouts: {report['timeouts']}")
+    return markdown_content
+
+def pdf_to_markdown(pdf_path, output_md_path, **options):
+    """
+    将PDF文件转换为Markdown格式
+
+    Args:
+        pdf_path: PDF文件路径，也可以是内存中的PDF内容，见pdf_to_markdown_string
+        output_md_path: 输出的Markdown文件路径
+        **options: 其余参数同pdf_to_markdown_string
+
+    Returns:
+        转换报告字典，包含页数、失败页面、峰值内存（MB）、页眉页脚去除统计及各页超时的阶段
+    """
+    report = {}
+    markdown_content = pdf_to_markdown_string(pdf_path, report, **options)
 
     # 保存文件
     try:
         with open(output_md_path, "w", encoding="utf-8") as md_file:
-            md_file.write(markdown_content.getvalue())
+            md_file.write(markdown_content)
         print(f"Successfully saved markdown file to {output_md_path}")
     except Exception as e:
         print(f"Error saving markdown file: {e}")
-
-    # 清理资源
-    doc.close()
-    markdown_content.close()
+    return report
 
 # 使用示例
 # pdf_path = "/Users/zhongjiafeng/Desktop/SalesMiniProgram250319.pdf"
@@ -0,0 +1,104 @@
+"""
+转换流水线模块，把单个文档从输入文件转换为raw.md和emb.md，供服务模式等长驻进程复用
+"""
+
+import os
+import time
+from utils.pdf2md import pdf_to_markdown
+from utils.docx2md import docx_to_markdown
+from utils.markdown_converter import MarkdownConverter
+from utils.image_processor import ImageProcessor
+from utils.image_store import ImageStore
+from utils.source_io import read_source
+from config import IMAGE_CONFIG
+
+def detect_kind(path):
+    """
+    根据扩展名判断文档类型
+
+    Args:
+        path: 文件路径
+
+    Returns:
+        "pdf"、"docx"、"image"之一，不支持的类型返回None
+    """
+    ext = os.path.splitext(path)[1].lower().lstrip('.')
+    if ext == "pdf":
+        return "pdf"
+    if ext == "docx":
+        return "docx"
+    if ext in IMAGE_CONFIG["supported_formats"]:
+        return "image"
+    return None
+
+def convert_document(input_path, raw_path, emb_path=None, kind=None, image_processor=None,
+                     image_dir=None, pdf_options=None, columnar_writer=None, doc_id=None,
+                     dedup_index=None, dedup_mode="flag", data=None):
+    """
+    转换单个文档
+
+    Args:
+        input_path: 输入文件路径
+        raw_path: 原始Markdown输出路径
+        emb_path: 向量友好的Markdown输出路径，为None时跳过向量友好转换
+        kind: 文档类型，为None时根据扩展名判断
+        image_processor: 共享的ImageProcessor，为None时按需新建
+        image_dir: 提取图片的保存目录
+        pdf_options: 传给pdf_to_markdown的其他参数
+        columnar_writer: 可选的共享ColumnarWriter，把emb.md按元素追加到列式数据集
+        doc_id: 列式数据和近重复索引中的文档ID，默认为输入文件名
+        dedup_index: 可选的共享DedupIndex，检测与已处理内容近似重复的文档和文本块
+        dedup_mode: 近重复内容的处理方式，"flag"或"drop"
+        data: 可选的输入内容（bytes或二进制文件对象），提供时直接从内存转换，不读取input_path，
+              input_path只用于判断类型、作为文档ID和图片在Markdown中的引用路径
+
+    Returns:
+        包含各阶段耗时的报告字典
+    """
+    kind = kind or detect_kind(input_path)
+    if kind is None:
+        raise ValueError(f"不支持的文件类型: {input_path}")
+    if data is None and not os.path.exists(input_path):
+        raise FileNotFoundError(f"文件不存在: {input_path}")
+    if data is not None:
+        data = read_source(data)
+    source = input_path if data is None else data
+
+    report = {"kind": kind, "raw": raw_path, "emb": emb_path}
+    image_store = None
+    start = time.perf_counter()
+    try:
+        if kind == "pdf":
+            # 只生成raw.md时图片必须落盘
+            image_store = ImageStore(write_to_disk=emb_path is None)
+            report["pdf"] = pdf_to_markdown(source, raw_path, image_store=image_store, image_dir=image_dir,
+                                            **(pdf_options or {}))
+        elif kind == "docx":
+            if not docx_to_markdown(source, raw_path, img_dir=image_dir):
+                raise RuntimeError(f"Word文档转换失败: {input_path}")
+        elif data is not None:
+            # 内存中的图片以input_path为键放入ImageStore，只生成raw.md时才写入磁盘
+            image_processor = image_processor or ImageProcessor()
+            image_store = ImageStore(write_to_disk=emb_path is None)
+            with open(raw_path, 'w', encoding='utf-8') as f:
+                f.write(image_processor.image_markdown(input_path, source=data, image_store=image_store))
+        else:
+            image_processor = image_processor or ImageProcessor()
+            if not image_processor.image_to_markdown(input_path, raw_path):
+                raise RuntimeError(f"图片转换失败: {input_path}")
+        report["convert_seconds"] = time.perf_counter() - start
+
+        if emb_path:
+            start = time.perf_counter()
+            converter = MarkdownConverter(raw_md_path=raw_path, emb_md_path=emb_path,
+                                          image_store=image_store, image_processor=image_processor,
+                                          columnar_writer=columnar_writer,
+                                          doc_id=doc_id or os.path.basename(input_path),
+                                          dedup_index=dedup_index, dedup_mode=dedup_mode)
+            converter.convert()
+            report["dedup"] = converter.dedup_report
+            report["emb_seconds"] = time.perf_counter() - start
+    finally:
+        if image_store is not None:
+            image_store.close()
+    return report
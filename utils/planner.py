@@ -0,0 +1,297 @@
+"""
+预检估算模块，在正式转换前快速扫描输入文档，估算转换规模、多模态模型调用次数和耗时
+
+只使用PyMuPDF读取页面内容流和图片字典、读取Word文档的zip目录，不做版面分析，也不调用任何API，
+单个文档通常只需几毫秒
+
+用法：
+    python main.py --plan corpus_dir/ other.pdf --plan-output plan.json
+    python -m utils.planner corpus_dir/ --workers 8
+"""
+
+import os
+import re
+import json
+import time
+import zipfile
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import fitz  # PyMuPDF
+from config import PDF_CONFIG, PLAN_CONFIG, MULTIMODAL_CONFIG
+from utils.pdf2md import image_coverage
+from utils.pipeline import detect_kind
+
+# 页面内容流中显示文本的操作符
+TEXT_OP_PATTERN = re.compile(rb'(?<![^\s\])>])T[jJ](?![^\s\[(</])')
+# 页面内容流中绘制矩形和直线的操作符，带边框的表格由大量矩形或直线组成
+RULE_OP_PATTERN = re.compile(rb'(?<![^\s])(?:re|l)(?![^\s])')
+# Word文档docProps/app.xml中的页数
+DOCX_PAGES_PATTERN = re.compile(rb'<Pages>(\d+)</Pages>')
+# 汇总时累加的数量字段
+COUNT_FIELDS = ("pages", "text_pages", "scanned_pages", "empty_pages", "table_pages", "images", "image_bytes",
+                "vision_calls")
+
+def _new_plan(path, kind):
+    plan = {"path": path, "kind": kind}
+    plan.update((field, 0) for field in COUNT_FIELDS)
+    return plan
+
+def page_has_text(page_fitz, contents):
+    """
+    判断页面是否有文本层
+
+    Args:
+        page_fitz: PyMuPDF的页面对象
+        contents: 解压后的页面内容流
+
+    Returns:
+        是否有文本层
+    """
+    if TEXT_OP_PATTERN.search(contents):
+        return True
+    # 文本也可能画在表单XObject中，这时才做文本提取
+    if any(xobject[2] == 0 for xobject in page_fitz.get_xobjects()):
+        return bool(page_fitz.get_text("text").strip())
+    return False
+
+def _image_bytes(doc, xref):
+    """读取图片流的压缩后长度，不解码图片"""
+    kind, value = doc.xref_get_key(xref, "Length")
+    if kind == "int":
+        return int(value)
+    return len(doc.xref_stream_raw(xref) or b"")
+
+def plan_pdf(pdf_path, scan_coverage=None, min_image_size=None, table_min_rules=None):
+    """
+    扫描PDF，统计页面类型和图片
+
+    判定规则与pdf_to_markdown一致：无文本层且图片覆盖率达到scan_coverage的页面按扫描页整页渲染，
+    蒙版和宽或高小于min_image_size的图片不提取，每个提取的图片和扫描页各需要一次多模态模型调用
+
+    Args:
+        pdf_path: PDF文件路径
+        scan_coverage: 扫描页判定的图片覆盖率阈值，默认使用PDF_CONFIG["scanned_page_coverage"]
+        min_image_size: 提取图片的最小宽高（像素），默认使用PDF_CONFIG["min_image_size"]
+        table_min_rules: 视为可能含表格的最少矩形和直线数，默认使用PLAN_CONFIG["table_min_rules"]
+
+    Returns:
+        包含pages、text_pages、scanned_pages、empty_pages、table_pages、images、image_bytes、vision_calls的字典
+    """
+    scan_coverage = scan_coverage if scan_coverage is not None else PDF_CONFIG["scanned_page_coverage"]
+    min_image_size = min_image_size or PDF_CONFIG["min_image_size"]
+    table_min_rules = table_min_rules or PLAN_CONFIG["table_min_rules"]
+    plan = _new_plan(pdf_path, "pdf")
+    image_sizes = {}
+    with fitz.open(pdf_path) as doc:
+        plan["pages"] = doc.page_count
+        for page_fitz in doc:
+            contents = page_fitz.read_contents()
+            images = page_fitz.get_images(full=True)
+            if page_has_text(page_fitz, contents):
+                plan["text_pages"] += 1
+                if len(RULE_OP_PATTERN.findall(contents)) >= table_min_rules:
+                    plan["table_pages"] += 1
+            elif images and image_coverage(page_fitz) >= scan_coverage:
+                plan["scanned_pages"] += 1
+                continue
+            elif not images:
+                plan["empty_pages"] += 1
+                continue
+            masks = {img[1] for img in images if img[1]}
+            for img in images:
+                xref, width, height = img[0], img[2], img[3]
+                if xref in masks or width < min_image_size or height < min_image_size:
+                    continue
+                plan["images"] += 1
+                if xref not in image_sizes:
+                    image_sizes[xref] = _image_bytes(doc, xref)
+    # 重复出现的图片只提取一次，但每次出现都会单独分析
+    plan["image_bytes"] = sum(image_sizes.values())
+    plan["vision_calls"] = plan["images"] + plan["scanned_pages"]
+    return plan
+
+def plan_docx(docx_path):
+    """
+    通过zip目录扫描Word文档，不解析文档正文
+
+    Args:
+        docx_path: Word文档路径
+
+    Returns:
+        同plan_pdf，pages取自docProps/app.xml（由Word保存时写入，可能缺失），页面类型字段为0
+    """
+    plan = _new_plan(docx_path, "docx")
+    with zipfile.ZipFile(docx_path) as archive:
+        for info in archive.infolist():
+            if info.filename.startswith("word/media/") and not info.is_dir():
+                plan["images"] += 1
+                plan["image_bytes"] += info.file_size
+        try:
+            match = DOCX_PAGES_PATTERN.search(archive.read("docProps/app.xml"))
+        except KeyError:
+            match = None
+    plan["pages"] = int(match.group(1)) if match else 0
+    plan["vision_calls"] = plan["images"]
+    return plan
+
+def plan_image(image_path):
+    """单张图片只需要一次多模态模型调用"""
+    plan = _new_plan(image_path, "image")
+    plan["images"] = plan["vision_calls"] = 1
+    plan["image_bytes"] = os.path.getsize(image_path)
+    return plan
+
+def plan_file(path):
+    """
+    扫描单个文件，无法打开的文件记录错误而不中断整批估算
+
+    Returns:
+        plan_pdf、plan_docx或plan_image的结果，出错时包含error字段
+    """
+    kind = detect_kind(path)
+    try:
+        if kind == "pdf":
+            return plan_pdf(path)
+        if kind == "docx":
+            return plan_docx(path)
+        return plan_image(path)
+    except Exception as e:
+        plan = _new_plan(path, kind)
+        plan["error"] = str(e)
+        return plan
+
+def iter_input_files(paths):
+    """
+    展开输入路径，目录递归查找所有支持的文档和图片
+
+    Args:
+        paths: 文件或目录路径列表
+
+    Yields:
+        支持的文件路径
+    """
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if detect_kind(name):
+                        yield os.path.join(root, name)
+        elif detect_kind(path):
+            yield path
+        else:
+            print(f"跳过不支持的文件: {path}")
+
+def estimate_cost(totals, rates=None):
+    """
+    根据各阶段的单位耗时估算转换耗时和多模态模型调用
+
+    Args:
+        totals: 汇总后的统计字典，字段同plan_pdf，另含docx_files
+        rates: 覆盖PLAN_CONFIG中单位耗时的字典
+
+    Returns:
+        包含vision_calls、convert_seconds、vision_seconds、wall_seconds的字典，
+        wall_seconds为单进程转换加图片分析的串行耗时
+    """
+    rates = {**PLAN_CONFIG, **(rates or {})}
+    table_pages = totals["table_pages"]
+    convert_seconds = ((totals["text_pages"] - table_pages) * rates["text_page_seconds"]
+                       + table_pages * rates["table_page_seconds"]
+                       + totals["scanned_pages"] * rates["scanned_page_seconds"]
+                       + totals["docx_files"] * rates["docx_seconds"])
+    vision_calls = totals["vision_calls"]
+    vision_seconds = vision_calls * rates["vision_call_seconds"] / max(rates["vision_concurrency"], 1)
+    # 配置了每分钟请求数上限时，图片分析不会快于配额允许的速度
+    rpm = MULTIMODAL_CONFIG["rpm"]
+    if rpm:
+        vision_seconds = max(vision_seconds, vision_calls / rpm * 60)
+    return {
+        "vision_calls": vision_calls,
+        "convert_seconds": round(convert_seconds, 1),
+        "vision_seconds": round(vision_seconds, 1),
+        "wall_seconds": round(convert_seconds + vision_seconds, 1),
+    }
+
+def plan_corpus(paths, workers=1, rates=None):
+    """
+    扫描一批输入，汇总统计并估算成本
+
+    Args:
+        paths: 文件或目录路径列表
+        workers: 扫描进程数，默认在当前进程中扫描。单进程每分钟可扫描上万个普通文档，
+                 新进程导入依赖需要数秒，只有文档数以万计时才值得使用多进程
+        rates: 覆盖PLAN_CONFIG中单位耗时的字典
+
+    Returns:
+        {"files": [...], "totals": {...}, "estimate": {...}, "scan_seconds": 秒}
+    """
+    start = time.perf_counter()
+    files = list(iter_input_files(paths))
+    if workers > 1 and len(files) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(files)),
+                                 mp_context=multiprocessing.get_context("spawn")) as executor:
+            plans = list(executor.map(plan_file, files, chunksize=16))
+    else:
+        plans = [plan_file(path) for path in files]
+
+    totals = {field: sum(plan[field] for plan in plans) for field in COUNT_FIELDS}
+    for kind in ("pdf", "docx", "image"):
+        totals[f"{kind}_files"] = sum(1 for plan in plans if plan["kind"] == kind and "error" not in plan)
+    totals["errors"] = sum(1 for plan in plans if "error" in plan)
+    return {
+        "files": plans,
+        "totals": totals,
+        "estimate": estimate_cost(totals, rates),
+        "scan_seconds": round(time.perf_counter() - start, 2),
+    }
+
+def format_plan(plan):
+    """把plan_corpus的结果格式化为可读的摘要"""
+    totals, estimate = plan["totals"], plan["estimate"]
+    lines = [
+        f"文件: PDF {totals['pdf_files']}，Word {totals['docx_files']}，图片 {totals['image_files']}，"
+        f"无法读取 {totals['errors']}（扫描耗时 {plan['scan_seconds']} 秒）",
+        f"页数: {totals['pages']}（文本页 {totals['text_pages']}，扫描页 {totals['scanned_pages']}，"
+        f"空白页 {totals['empty_pages']}，可能含表格 {totals['table_pages']}）",
+        f"图片: {totals['images']} 个，{totals['image_bytes'] / 1024 / 1024:.1f} MB",
+        f"多模态模型调用: {estimate['vision_calls']} 次",
+        f"预计耗时: 转换 {estimate['convert_seconds']} 秒 + 图片分析 {estimate['vision_seconds']} 秒"
+        f" = {estimate['wall_seconds']} 秒",
+    ]
+    for file_plan in plan["files"]:
+        if "error" in file_plan:
+            lines.append(f"无法读取 {file_plan['path']}: {file_plan['error']}")
+    return "\n".join(lines)
+
+def load_rates(path):
+    """读取JSON格式的单位耗时，键同PLAN_CONFIG"""
+    with open(path, 'r', encoding='utf-8') as f:
+        rates = json.load(f)
+    unknown = set(rates) - set(PLAN_CONFIG)
+    if unknown:
+        raise ValueError(f"未知的耗时参数: {', '.join(sorted(unknown))}")
+    return rates
+
+def run_plan(paths, workers=1, rates_path=None, output_path=None):
+    """扫描输入并打印摘要，可选地把完整结果写入JSON文件"""
+    plan = plan_corpus(paths, workers=workers, rates=load_rates(rates_path) if rates_path else None)
+    print(format_plan(plan))
+    if output_path:
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(plan, f, ensure_ascii=False, indent=2)
+        print(f"预检结果已保存到: {output_path}")
+    return plan
+
+def main():
+    parser = argparse.ArgumentParser(description='转换前的预检估算')
+    parser.add_argument('paths', nargs='+', help='输入文件或目录')
+    parser.add_argument('--workers', type=int, default=1, help='扫描进程数，文档数以万计时使用')
+    parser.add_argument('--rates', type=str, help='JSON格式的单位耗时，覆盖PLAN_CONFIG中的默认值')
+    parser.add_argument('--output', type=str, help='完整结果（含每个文件）的JSON输出路径')
+    args = parser.parse_args()
+    run_plan(args.paths, workers=args.workers, rates_path=args.rates, output_path=args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""
+限流模块，为多模态API提供按分钟请求数（RPM）/token数（TPM）的令牌桶限流，
+以及按AIMD（加性增、乘性减）自适应调整的并发控制
+"""
+
+import math
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+# 统计实际吞吐量的时间窗口（秒）
+THROUGHPUT_WINDOW = 60.0
+
+def estimate_request_tokens(width, height, max_tokens, prompt_chars=0):
+    """
+    估算一次图片分析请求消耗的token数
+
+    图片部分按OpenAI高精度模式的计算方式：先缩放到2048x2048以内，再把短边缩放到768，
+    每个512x512的瓦片计170个token，另加85个基础token；文本部分按每个字符一个token粗略估计
+
+    Args:
+        width: 图片宽度，未知时为0
+        height: 图片高度，未知时为0
+        max_tokens: 请求的最大生成token数
+        prompt_chars: 提示词字符数
+
+    Returns:
+        估算的token数
+    """
+    if width > 0 and height > 0:
+        scale = min(1.0, 2048 / max(width, height))
+        width, height = width * scale, height * scale
+        scale = min(1.0, 768 / min(width, height))
+        width, height = width * scale, height * scale
+        tiles = math.ceil(width / 512) * math.ceil(height / 512)
+    else:
+        tiles = 4
+    return 85 + 170 * tiles + int(prompt_chars) + int(max_tokens or 0)
+
+class TokenBucket:
+    """令牌桶，按每分钟配额匀速补充，容量为10秒的配额"""
+
+    def __init__(self, per_minute):
+        """
+        初始化令牌桶
+
+        Args:
+            per_minute: 每分钟配额，0或None表示不限制
+        """
+        self.per_minute = float(per_minute or 0)
+        self.rate = self.per_minute / 60.0
+        self.capacity = max(1.0, self.per_minute / 6.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def unlimited(self):
+        return self.per_minute <= 0
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, amount=1.0):
+        """
+        取出amount个令牌，不足时阻塞等待
+
+        单次需求超过桶容量时，只要桶满即可取出并记为欠账，避免永远等不到
+
+        Args:
+            amount: 需要的令牌数
+
+        Returns:
+            等待的秒数
+        """
+        if self.unlimited:
+            return 0.0
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                needed = min(amount, self.capacity)
+                if self._tokens >= needed:
+                    self._tokens -= amount
+                    return waited
+                wait = (needed - self._tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+class AdaptiveConcurrency:
+    """AIMD自适应并发控制：请求健康时缓慢加并发，遇到429或延迟突增时并发减半"""
+
+    def __init__(self, initial=2, minimum=1, maximum=8, latency_target=None, decrease_factor=0.5, cooldown=1.0):
+        """
+        初始化并发控制
+
+        Args:
+            initial: 初始并发数
+            minimum: 最小并发数
+            maximum: 最大并发数
+            latency_target: 延迟阈值（秒），超过时视为过载；为None时只根据429调整
+            decrease_factor: 过载时并发数的乘数
+            cooldown: 两次减小并发之间的最短间隔（秒），避免一波429把并发一路降到底
+        """
+        self.minimum = max(1, int(minimum))
+        self.maximum = max(self.minimum, int(maximum))
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.latency_target = latency_target
+        self.decrease_factor = decrease_factor
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        """等待直到在途请求数低于当前并发上限"""
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self, overloaded=False):
+        """
+        释放一个并发名额并根据结果调整上限
+
+        Args:
+            overloaded: 本次请求是否遇到429或延迟超过阈值
+        """
+        with self._cond:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if overloaded:
+                if now - self._last_decrease >= self.cooldown:
+                    self.limit = max(self.minimum, self.limit * self.decrease_factor)
+                    self._last_decrease = now
+            else:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+
+class RequestSlot:
+    """一次受限流控制的请求，调用方在请求结束后设置status"""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.status = None
+        self.waited = 0.0
+
+class RateGovernor:
+    """多模态API的限流器，组合RPM/TPM令牌桶和自适应并发，并统计实际吞吐量"""
+
+    def __init__(self, rpm=0, tpm=0, initial_concurrency=2, min_concurrency=1, max_concurrency=8,
+                 latency_target=None):
+        """
+        初始化限流器
+
+        Args:
+            rpm: 每分钟请求数上限，0表示不限制
+            tpm: 每分钟token数上限，0表示不限制
+            initial_concurrency: 初始并发数
+            min_concurrency: 最小并发数
+            max_concurrency: 最大并发数
+            latency_target: 延迟阈值（秒），超过时减小并发
+        """
+        self.request_bucket = TokenBucket(rpm)
+        self.token_bucket = TokenBucket(tpm)
+        self.concurrency = AdaptiveConcurrency(initial_concurrency, min_concurrency, max_concurrency,
+                                               latency_target)
+        self.latency_target = latency_target
+        self._lock = threading.Lock()
+        self._completed = deque()
+        self._throttled = 0
+        self._wait_seconds = 0.0
+
+    @classmethod
+    def from_config(cls, config):
+        """根据MULTIMODAL_CONFIG创建限流器"""
+        latency_target = config.get("latency_target")
+        return cls(
+            rpm=float(config.get("rpm") or 0),
+            tpm=float(config.get("tpm") or 0),
+            initial_concurrency=int(config.get("initial_concurrency") or 2),
+            min_concurrency=int(config.get("min_concurrency") or 1),
+            max_concurrency=int(config.get("max_concurrency") or 8),
+            latency_target=float(latency_target) if latency_target else None,
+        )
+
+    @property
+    def max_concurrency(self):
+        return self.concurrency.maximum
+
+    @contextmanager
+    def slot(self, tokens):
+        """
+        获取一次请求的名额：依次等待并发名额、RPM令牌和TPM令牌
+
+        Args:
+            tokens: 本次请求估算的token数
+
+        Yields:
+            RequestSlot，调用方应把HTTP状态码写入status，网络错误时保持None
+        """
+        slot = RequestSlot(tokens)
+        self.concurrency.acquire()
+        start = None
+        try:
+            slot.waited = self.request_bucket.acquire(1) + self.token_bucket.acquire(tokens)
+            start = time.monotonic()
+            yield slot
+        finally:
+            now = time.monotonic()
+            latency = now - start if start is not None else 0.0
+            throttled = slot.status == 429
+            slow = self.latency_target is not None and latency > self.latency_target
+            self.concurrency.release(overloaded=throttled or slow)
+            with self._lock:
+                self._wait_seconds += slot.waited
+                if throttled:
+                    self._throttled += 1
+                elif slot.status is not None and slot.status < 400:
+                    self._completed.append((now, tokens))
+                self._trim(now)
+
+    def _trim(self, now):
+        while self._completed and now - self._completed[0][0] > THROUGHPUT_WINDOW:
+            self._completed.popleft()
+
+    def snapshot(self):
+        """
+        获取限流器的实时统计
+
+        Returns:
+            包含最近一分钟实际RPM/TPM、当前并发上限、在途请求数、429次数及累计等待时间的字典
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._trim(now)
+            requests = len(self._completed)
+            tokens = sum(t for _, t in self._completed)
+            window = min(THROUGHPUT_WINDOW, now - self._completed[0][0]) if requests else 0.0
+            throttled = self._throttled
+            wait_seconds = self._wait_seconds
+        # 窗口不足一分钟时按实际时长折算
+        scale = 60.0 / max(window, 1.0) if requests else 0.0
+        return {
+            "achieved_rpm": requests * scale,
+            "achieved_tpm": tokens * scale,
+            "rpm_limit": self.request_bucket.per_minute or None,
+            "tpm_limit": self.token_bucket.per_minute or None,
+            "concurrency_limit": int(self.concurrency.limit),
+            "in_flight": self.concurrency.in_flight,
+            "throttled": throttled,
+            "wait_seconds": wait_seconds,
+        }
@@ -0,0 +1,118 @@
+"""
+camelot lattice模式的页面渲染后端，使用已打开的PyMuPDF文档在进程内渲染页面，
+不再为每一页启动Ghostscript子进程
+"""
+
+import threading
+from collections import OrderedDict
+import numpy as np
+import fitz  # PyMuPDF
+from config import PDF_CONFIG
+
+# camelot自带的渲染后端
+CAMELOT_BACKENDS = ("pdfium", "ghostscript", "poppler")
+# 可选的lattice渲染后端
+LATTICE_BACKENDS = ("pymupdf",) + CAMELOT_BACKENDS
+
+class PyMuPDFBackend:
+    """
+    camelot的图片转换后端，实现camelot要求的convert接口以及跳过PNG编解码的to_array接口
+
+    渲染结果按(页码, 分辨率)缓存，缓存满时淘汰最久未使用的页面
+    """
+
+    def __init__(self, doc=None, resolution=300, cache_size=2):
+        """
+        初始化渲染后端
+
+        Args:
+            doc: 已打开的PyMuPDF文档，为None或与camelot传入的路径不一致时按路径打开
+            resolution: 渲染分辨率（dpi），与camelot的resolution参数含义一致
+            cache_size: 缓存的渲染页数，0表示不缓存
+        """
+        self.doc = doc
+        self.resolution = int(resolution)
+        self.cache_size = cache_size
+        self.stats = {"renders": 0, "cache_hits": 0}
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def installed(self):
+        return True
+
+    def _render(self, pdf_path, page):
+        """渲染页面（page从1开始），返回BGR顺序的uint8数组"""
+        key = (pdf_path, page, self.resolution)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.stats["cache_hits"] += 1
+                return self._cache[key]
+
+        if self.doc is not None and self.doc.name == pdf_path:
+            pix = self.doc[page - 1].get_pixmap(dpi=self.resolution, alpha=False)
+        else:
+            with fitz.open(pdf_path) as doc:
+                pix = doc[page - 1].get_pixmap(dpi=self.resolution, alpha=False)
+        rgb = np.frombuffer(pix.samples_mv, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+        # camelot使用OpenCV的BGR通道顺序
+        array = np.ascontiguousarray(rgb[:, :, ::-1])
+
+        with self._lock:
+            self.stats["renders"] += 1
+            if self.cache_size > 0:
+                self._cache[key] = array
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return array
+
+    def to_array(self, pdf_path, page=1):
+        """
+        渲染页面为内存中的BGR数组，供camelot直接做线条检测
+
+        Args:
+            pdf_path: PDF文件路径
+            page: 页码（从1开始）
+
+        Returns:
+            numpy.ndarray，返回副本，调用方修改不会影响缓存
+        """
+        return self._render(pdf_path, page).copy()
+
+    def convert(self, pdf_path, png_path, page=1):
+        """
+        渲染页面并保存为PNG，camelot的plot等需要图片文件时使用
+
+        Args:
+            pdf_path: PDF文件路径
+            png_path: PNG输出路径
+            page: 页码（从1开始）
+        """
+        array = self._render(pdf_path, page)
+        height, width = array.shape[:2]
+        pix = fitz.Pixmap(fitz.csRGB, width, height, np.ascontiguousarray(array[:, :, ::-1]).tobytes(), False)
+        pix.save(png_path)
+
+    def clear(self):
+        """清空渲染缓存"""
+        with self._lock:
+            self._cache.clear()
+
+def make_lattice_backend(doc, backend=None, resolution=None):
+    """
+    根据名称创建lattice模式的渲染后端
+
+    Args:
+        doc: 已打开的PyMuPDF文档
+        backend: 后端名称，见LATTICE_BACKENDS；默认使用PDF_CONFIG["lattice_backend"]
+        resolution: pymupdf后端的渲染分辨率（dpi），默认使用PDF_CONFIG["lattice_dpi"]
+
+    Returns:
+        可直接传给camelot.read_pdf(backend=...)的后端对象或名称
+    """
+    backend = backend or PDF_CONFIG["lattice_backend"]
+    if backend not in LATTICE_BACKENDS:
+        raise ValueError(f"Unknown lattice backend: {backend}")
+    if backend == "pymupdf":
+        return PyMuPDFBackend(doc, resolution or PDF_CONFIG["lattice_dpi"])
+    return backend
@@ -0,0 +1,436 @@
+"""
+转换服务模块，提供本地HTTP服务，在常驻的工作线程池中排队执行文档转换
+
+接口：
+    POST /jobs                       JSON {"path": "...", "kind": "pdf"} 转换本地文件，
+                                     或直接上传文件内容（?filename=xxx.pdf&kind=pdf）
+    GET  /jobs/<id>[?wait=秒]        查询任务状态
+    GET  /jobs/<id>/raw[?wait=秒]    流式返回raw.md
+    GET  /jobs/<id>/emb[?wait=秒]    流式返回emb.md
+    GET  /metrics                    队列深度、执行中任务数及延迟统计
+    GET  /health                     健康检查
+"""
+
+import os
+import json
+import math
+import time
+import shutil
+import uuid
+import queue
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from utils.image_processor import ImageProcessor
+from utils.pipeline import convert_document, detect_kind
+from utils.metrics import latency_summary
+
+# 统计延迟时保留的最近任务数
+LATENCY_WINDOW = 1000
+# 流式返回文件时的块大小
+STREAM_CHUNK_SIZE = 64 * 1024
+# 不超过该大小的上传内容保存在内存中直接转换，更大的文件写入任务目录
+UPLOAD_MEMORY_LIMIT = 64 * 1024 * 1024
+# 排队和执行中的任务在内存中保存的上传内容总量上限，超出后新的上传写入任务目录
+UPLOAD_MEMORY_TOTAL = 256 * 1024 * 1024
+# GET请求的wait参数上限（秒）
+MAX_WAIT_SECONDS = 300
+# 已结束任务的保留时间（秒）及最多保留数量，超出后连同任务目录一起删除
+FINISHED_JOB_TTL = 3600
+MAX_FINISHED_JOBS = 1000
+
+class ConversionJob:
+    """转换任务"""
+
+    def __init__(self, input_path, kind, work_dir):
+        self.id = uuid.uuid4().hex[:12]
+        self.input_path = input_path
+        self.data = None
+        self.kind = kind
+        self.job_dir = os.path.join(work_dir, self.id)
+        self.raw_path = os.path.join(self.job_dir, "raw.md")
+        self.emb_path = os.path.join(self.job_dir, "emb.md")
+        self.status = "queued"
+        self.error = None
+        self.report = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.done = threading.Event()
+
+    def to_dict(self):
+        """任务状态的JSON表示"""
+        return {
+            "id": self.id,
+            "input": self.input_path,
+            "kind": self.kind,
+            "status": self.status,
+            "error": self.error,
+            "report": self.report,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+class ConversionService:
+    """转换服务类，维护任务队列和常驻工作线程，所有任务共享同一个多模态API客户端"""
+
+    def __init__(self, work_dir, workers=2, image_processor=None, skip_emb=False, pdf_options=None,
+                 job_ttl=FINISHED_JOB_TTL, max_finished_jobs=MAX_FINISHED_JOBS):
+        """
+        初始化转换服务
+
+        Args:
+            work_dir: 任务工作目录，每个任务在其中有独立的子目录
+            workers: 工作线程数
+            image_processor: 共享的ImageProcessor，为None时新建
+            skip_emb: 是否只生成raw.md
+            pdf_options: 传给pdf_to_markdown的其他参数
+            job_ttl: 已结束任务的保留时间（秒），过期后删除任务及其目录
+            max_finished_jobs: 最多保留的已结束任务数，超出时先删除最早结束的任务
+        """
+        self.work_dir = work_dir
+        self.workers = workers
+        self.skip_emb = skip_emb
+        self.pdf_options = pdf_options or {}
+        self.image_processor = image_processor or ImageProcessor()
+        self.job_ttl = job_ttl
+        self.max_finished_jobs = max_finished_jobs
+        self.jobs = {}
+        self._finished = deque()
+        self._submitted = 0
+        self._upload_memory = 0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._in_flight = 0
+        self._completed = 0
+        self._failed = 0
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._run_times = deque(maxlen=LATENCY_WINDOW)
+        os.makedirs(work_dir, exist_ok=True)
+
+    def start(self):
+        """启动工作线程"""
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker_loop, name=f"convert-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """处理完已排队的任务后停止工作线程"""
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def _new_job(self, input_path, kind):
+        kind = kind or detect_kind(input_path)
+        if kind is None:
+            raise ValueError(f"不支持的文件类型: {input_path}")
+        job = ConversionJob(input_path, kind, self.work_dir)
+        os.makedirs(job.job_dir, exist_ok=True)
+        return job
+
+    def _enqueue(self, job):
+        with self._lock:
+            self.jobs[job.id] = job
+            self._submitted += 1
+        self._evict_finished()
+        self._queue.put(job)
+        return job
+
+    def _evict_finished(self, now=None):
+        """删除超过保留时间或超出保留数量的已结束任务及其任务目录"""
+        now = time.time() if now is None else now
+        evicted = []
+        with self._lock:
+            while self._finished and (len(self._finished) > self.max_finished_jobs
+                                      or self._finished[0].finished_at < now - self.job_ttl):
+                job = self._finished.popleft()
+                self.jobs.pop(job.id, None)
+                evicted.append(job)
+        for job in evicted:
+            shutil.rmtree(job.job_dir, ignore_errors=True)
+        return len(evicted)
+
+    def submit(self, input_path, kind=None):
+        """
+        提交本地文件的转换任务
+
+        Args:
+            input_path: 输入文件路径
+            kind: 文档类型，为None时根据扩展名判断
+
+        Returns:
+            ConversionJob
+        """
+        if not os.path.exists(input_path):
+            raise FileNotFoundError(f"文件不存在: {input_path}")
+        return self._enqueue(self._new_job(input_path, kind))
+
+    def submit_upload(self, stream, length, filename, kind=None):
+        """
+        提交上传文件的转换任务
+
+        不超过UPLOAD_MEMORY_LIMIT的内容保存在内存中，转换时直接从内存读取；更大的文件，
+        或所有任务在内存中的上传内容将超过UPLOAD_MEMORY_TOTAL时，分块写入任务目录
+
+        Args:
+            stream: 可读的文件对象
+            length: 内容长度
+            filename: 文件名，用于判断类型
+            kind: 文档类型，为None时根据扩展名判断
+
+        Returns:
+            ConversionJob
+
+        Raises:
+            ValueError: 文件类型不支持，或读到的内容短于length（客户端中途断开）
+        """
+        filename = os.path.basename(filename)
+        job = self._new_job(filename, kind)
+        job.input_path = os.path.join(job.job_dir, filename)
+        with self._lock:
+            in_memory = length <= UPLOAD_MEMORY_LIMIT and self._upload_memory + length <= UPLOAD_MEMORY_TOTAL
+            if in_memory:
+                self._upload_memory += length
+        if in_memory:
+            job.data = stream.read(length)
+            received = len(job.data)
+        else:
+            received = 0
+            with open(job.input_path, "wb") as f:
+                while received < length:
+                    chunk = stream.read(min(STREAM_CHUNK_SIZE, length - received))
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    received += len(chunk)
+        if received != length:
+            if in_memory:
+                with self._lock:
+                    self._upload_memory -= length
+                job.data = None
+            shutil.rmtree(job.job_dir, ignore_errors=True)
+            raise ValueError(f"上传内容不完整: 收到{received}字节，Content-Length为{length}")
+        return self._enqueue(job)
+
+    def _release_upload(self, job):
+        """释放任务在内存中保存的上传内容"""
+        if job.data is None:
+            return
+        with self._lock:
+            self._upload_memory -= len(job.data)
+        job.data = None
+
+    def get(self, job_id):
+        """按ID获取任务，不存在时返回None"""
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def _worker_loop(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+            with self._lock:
+                self._in_flight += 1
+            job.status = "running"
+            job.started_at = time.time()
+            try:
+                job.report = convert_document(
+                    job.input_path, job.raw_path,
+                    emb_path=None if self.skip_emb else job.emb_path,
+                    kind=job.kind,
+                    image_processor=self.image_processor,
+                    image_dir=os.path.join(job.job_dir, "images"),
+                    pdf_options=self.pdf_options,
+                    data=job.data,
+                )
+                job.status = "done"
+            except Exception as e:
+                print(f"任务 {job.id} 转换失败: {e}")
+                job.status = "failed"
+                job.error = str(e)
+            self._release_upload(job)
+            job.finished_at = time.time()
+            with self._lock:
+                self._in_flight -= 1
+                if job.status == "done":
+                    self._completed += 1
+                else:
+                    self._failed += 1
+                self._latencies.append(job.finished_at - job.created_at)
+                self._run_times.append(job.finished_at - job.started_at)
+                self._finished.append(job)
+            self._evict_finished()
+            job.done.set()
+
+    def metrics(self):
+        """
+        获取服务指标
+
+        Returns:
+            包含队列深度、执行中任务数、完成/失败数及延迟分位数的字典
+        """
+        with self._lock:
+            latencies = list(self._latencies)
+            run_times = list(self._run_times)
+            in_flight = self._in_flight
+            completed = self._completed
+            failed = self._failed
+            submitted = self._submitted
+            upload_memory = self._upload_memory
+
+        return {
+            "queue_depth": self._queue.qsize(),
+            "in_flight": in_flight,
+            "workers": self.workers,
+            "submitted": submitted,
+            "completed": completed,
+            "failed": failed,
+            "upload_memory_bytes": upload_memory,
+            "latency_seconds": latency_summary(latencies),
+            "run_seconds": latency_summary(run_times),
+            "vision": dict(self.image_processor.stats, **self.image_processor.governor.snapshot()),
+        }
+
+def parse_wait(value):
+    """
+    解析GET请求的wait参数
+
+    Args:
+        value: 参数字符串
+
+    Returns:
+        等待秒数，负数按0处理，超过MAX_WAIT_SECONDS时取上限
+
+    Raises:
+        ValueError: 参数不是数字
+    """
+    seconds = float(value)
+    if math.isnan(seconds):
+        raise ValueError(f"无效的wait参数: {value}")
+    return min(max(seconds, 0.0), MAX_WAIT_SECONDS)
+
+class ServiceRequestHandler(BaseHTTPRequestHandler):
+    """转换服务的HTTP请求处理类"""
+
+    service = None
+
+    def log_message(self, format, *args):
+        print(f"[service] {self.address_string()} {format % args}")
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_file(self, path):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/markdown; charset=utf-8")
+        self.send_header("Content-Length", str(os.path.getsize(path)))
+        self.end_headers()
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(STREAM_CHUNK_SIZE)
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        parts = [p for p in url.path.split("/") if p]
+
+        if parts == ["health"]:
+            return self._send_json(200, {"status": "ok"})
+        if parts == ["metrics"]:
+            return self._send_json(200, self.service.metrics())
+        if len(parts) in (2, 3) and parts[0] == "jobs":
+            job = self.service.get(parts[1])
+            if job is None:
+                return self._send_json(404, {"error": f"任务不存在: {parts[1]}"})
+            if "wait" in params:
+                try:
+                    wait = parse_wait(params["wait"][0])
+                except ValueError:
+                    return self._send_json(400, {"error": f"无效的wait参数: {params['wait'][0]}"})
+                job.done.wait(wait)
+            if len(parts) == 2:
+                return self._send_json(200, job.to_dict())
+            if parts[2] not in ("raw", "emb"):
+                return self._send_json(404, {"error": f"未知的输出类型: {parts[2]}"})
+            if job.status != "done":
+                return self._send_json(409, job.to_dict())
+            path = job.raw_path if parts[2] == "raw" else job.emb_path
+            if not os.path.exists(path):
+                return self._send_json(404, {"error": f"输出文件不存在: {parts[2]}"})
+            return self._send_file(path)
+        return self._send_json(404, {"error": f"未知的路径: {url.path}"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        if url.path.rstrip("/") != "/jobs":
+            return self._send_json(404, {"error": f"未知的路径: {url.path}"})
+
+        length = int(self.headers.get("Content-Length") or 0)
+        kind = params.get("kind", [None])[0]
+        try:
+            if self.headers.get("Content-Type", "").startswith("application/json"):
+                body = json.loads(self.rfile.read(length) or b"{}")
+                job = self.service.submit(body["path"], kind=body.get("kind") or kind)
+            else:
+                filename = params.get("filename", [None])[0] or self.headers.get("X-Filename")
+                if not filename:
+                    return self._send_json(400, {"error": "上传文件时需要通过filename参数或X-Filename头指定文件名"})
+                job = self.service.submit_upload(self.rfile, length, filename, kind=kind)
+        except (KeyError, ValueError, FileNotFoundError) as e:
+            return self._send_json(400, {"error": str(e)})
+        return self._send_json(202, job.to_dict())
+
+def create_server(service, host="127.0.0.1", port=8765):
+    """
+    创建绑定到服务实例的HTTP服务器
+
+    Args:
+        service: ConversionService实例
+        host: 监听地址
+        port: 监听端口，0表示自动分配
+
+    Returns:
+        ThreadingHTTPServer实例
+    """
+    handler = type("BoundServiceRequestHandler", (ServiceRequestHandler,), {"service": service})
+    return ThreadingHTTPServer((host, port), handler)
+
+def serve(host="127.0.0.1", port=8765, work_dir="service_jobs", workers=2, skip_emb=False, pdf_options=None):
+    """
+    启动转换服务并一直运行，直到收到中断信号
+
+    Args:
+        host: 监听地址
+        port: 监听端口
+        work_dir: 任务工作目录
+        workers: 工作线程数
+        skip_emb: 是否只生成raw.md
+        pdf_options: 传给pdf_to_markdown的其他参数
+    """
+    service = ConversionService(work_dir, workers=workers, skip_emb=skip_emb, pdf_options=pdf_options)
+    service.start()
+    server = create_server(service, host, port)
+    print(f"转换服务已启动: http://{host}:{server.server_address[1]} (工作线程: {workers})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("正在停止转换服务...")
+    finally:
+        server.server_close()
+        service.stop()
@@ -0,0 +1,131 @@
+"""
+分片模块，负责解析页码范围、把PDF页面划分到多台机器，以及按页码顺序合并各分片的输出
+"""
+
+import re
+import shutil
+
+# 匹配pdf_to_markdown输出中的页标题
+PAGE_HEADING_PATTERN = re.compile(r'^# Page (\d+)$', re.MULTILINE)
+
+def parse_page_range(spec, page_count):
+    """
+    解析页码范围
+
+    Args:
+        spec: 页码范围字符串，页码从1开始且包含两端，如"100-199"、"5"、"1-3,7,10-"
+        page_count: PDF总页数
+
+    Returns:
+        按升序排列的页面索引列表（从0开始）
+    """
+    pages = set()
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            start, end = part.split('-', 1)
+            start = int(start) if start.strip() else 1
+            end = int(end) if end.strip() else page_count
+        else:
+            start = end = int(part)
+        if start < 1 or end < start:
+            raise ValueError(f"无效的页码范围: {part}")
+        pages.update(range(start - 1, min(end, page_count)))
+    return sorted(pages)
+
+def parse_shard(spec):
+    """
+    解析分片参数
+
+    Args:
+        spec: 分片字符串"i/n"，i从1开始
+
+    Returns:
+        (i, n)
+    """
+    try:
+        index, count = (int(x) for x in spec.split('/'))
+    except ValueError:
+        raise ValueError(f"无效的分片参数: {spec}，格式应为i/n")
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError(f"无效的分片参数: {spec}，应满足1 <= i <= n")
+    return index, count
+
+def shard_pages(pages, shard_spec):
+    """
+    取出第i个分片负责的页面，每个分片是一段连续的页面，各分片页数最多相差1
+
+    Args:
+        pages: 按升序排列的页面索引列表
+        shard_spec: 分片字符串"i/n"
+
+    Returns:
+        该分片负责的页面索引列表
+    """
+    index, count = parse_shard(shard_spec)
+    base, extra = divmod(len(pages), count)
+    start = (index - 1) * base + min(index - 1, extra)
+    end = start + base + (1 if index <= extra else 0)
+    return pages[start:end]
+
+def select_pages(page_count, pages_spec=None, shard_spec=None):
+    """
+    根据页码范围和分片参数选出要转换的页面
+
+    Args:
+        page_count: PDF总页数
+        pages_spec: 页码范围字符串，为None时选择全部页面
+        shard_spec: 分片字符串"i/n"，在页码范围的基础上再分片
+
+    Returns:
+        按升序排列的页面索引列表（从0开始）
+    """
+    pages = parse_page_range(pages_spec, page_count) if pages_spec else list(range(page_count))
+    if shard_spec:
+        pages = shard_pages(pages, shard_spec)
+    return pages
+
+def first_page_number(md_path):
+    """
+    读取分片输出中的第一个页标题
+
+    Args:
+        md_path: Markdown文件路径
+
+    Returns:
+        第一个页码，没有页标题时返回None
+    """
+    with open(md_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            match = PAGE_HEADING_PATTERN.match(line.rstrip('\n'))
+            if match:
+                return int(match.group(1))
+    return None
+
+def merge_markdown(input_paths, output_path):
+    """
+    按页码顺序合并各分片的Markdown输出（raw.md或emb.md）
+
+    Args:
+        input_paths: 分片输出文件路径列表，顺序任意
+        output_path: 合并后的输出文件路径
+
+    Returns:
+        按合并顺序排列的分片路径列表
+    """
+    keyed = []
+    for path in input_paths:
+        page = first_page_number(path)
+        if page is None:
+            print(f"警告: 分片中没有页标题，将排在最后: {path}")
+        keyed.append((page is None, page or 0, path))
+    ordered = [path for _, _, path in sorted(keyed)]
+
+    with open(output_path, 'w', encoding='utf-8') as out:
+        for path in ordered:
+            with open(path, 'r', encoding='utf-8') as f:
+                shutil.copyfileobj(f, out)
+    print(f"已合并 {len(ordered)} 个分片: {output_path}")
+    return ordered
@@ -0,0 +1,52 @@
+"""
+输入源模块，让转换器直接处理内存中的文档内容（上传的请求体、对象存储的流），不必先写入临时文件再反复读取
+"""
+
+import os
+import tempfile
+from contextlib import contextmanager
+
+def is_path(source):
+    """输入源是否为文件路径"""
+    return isinstance(source, (str, os.PathLike))
+
+def read_source(source):
+    """
+    读取内存中的文档内容
+
+    Args:
+        source: 文件路径、bytes、bytearray、memoryview或二进制文件对象
+
+    Returns:
+        文档字节；source为文件路径时返回None，由调用方按路径打开
+    """
+    if is_path(source):
+        return None
+    if isinstance(source, bytes):
+        return source
+    if isinstance(source, (bytearray, memoryview)):
+        return bytes(source)
+    return source.read()
+
+@contextmanager
+def spill_to_tempfile(data, suffix=""):
+    """
+    把文档内容写入临时文件，只用于必须传入文件路径的后端，退出时删除
+
+    Args:
+        data: 文档字节
+        suffix: 临时文件扩展名，如".pdf"
+
+    Yields:
+        临时文件路径
+    """
+    fd, path = tempfile.mkstemp(prefix="source_", suffix=suffix)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        yield path
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,216 @@
+"""
+表格引擎对比工具，在合成的PDF语料上比较各表格引擎的速度和单元格一致率
+
+合成语料的每一页包含一段正文和一个带边框的表格，单元格内容已知，可作为标准答案
+
+同时可以比较camelot lattice模式的各页面渲染后端，检查表格位置和单元格是否一致
+
+用法：
+    python -m utils.table_benchmark --pages 20 --engines camelot-lattice pymupdf
+    python -m utils.table_benchmark --pages 20 --lattice-backends pymupdf pdfium ghostscript
+"""
+
+import os
+import json
+import time
+import random
+import argparse
+import tempfile
+import fitz  # PyMuPDF
+from camelot.backends.image_conversion import BACKENDS
+from utils.pdf2md import extract_tables, clean_text, TABLE_ENGINES
+from utils.render_backend import make_lattice_backend, LATTICE_BACKENDS
+
+def make_table_corpus(pdf_path, page_count, seed=0):
+    """
+    生成带边框表格的合成PDF
+
+    Args:
+        pdf_path: 输出PDF路径
+        page_count: 页数
+        seed: 随机数种子
+
+    Returns:
+        每页表格的标准答案，[[[cell, ...], ...], ...]（含表头行）
+    """
+    rng = random.Random(seed)
+    words = ["alpha", "beta", "gamma", "delta", "sales", "price", "total", "north", "south", "2024", "Q1", "Q2"]
+    truth = []
+    doc = fitz.open()
+    for page_num in range(page_count):
+        page = doc.new_page()
+        page.insert_text((72, 60), f"Synthetic report page {page_num + 1}", fontsize=14)
+        rows, cols = rng.randint(3, 8), rng.randint(2, 5)
+        cell_w, cell_h = min(90, 450 / cols), 22
+        x0, y0 = 72, 100
+        cells = []
+        for r in range(rows):
+            row = []
+            for c in range(cols):
+                text = f"H{c + 1}" if r == 0 else f"{rng.choice(words)}{r}{c}"
+                rect = fitz.Rect(x0 + c * cell_w, y0 + r * cell_h, x0 + (c + 1) * cell_w, y0 + (r + 1) * cell_h)
+                page.draw_rect(rect, color=(0, 0, 0), width=0.8)
+                page.insert_text((rect.x0 + 4, rect.y1 - 7), text, fontsize=9)
+                row.append(text)
+            cells.append(row)
+        page.insert_text((72, y0 + rows * cell_h + 40), "End of table.", fontsize=11)
+        truth.append(cells)
+    doc.save(pdf_path)
+    doc.close()
+    return truth
+
+def cell_agreement(expected, df):
+    """
+    计算单元格一致率
+
+    Args:
+        expected: 标准答案的二维列表
+        df: 引擎提取的DataFrame，为None表示未检测到表格
+
+    Returns:
+        位置和内容都一致的单元格占标准答案单元格的比例
+    """
+    total = sum(len(row) for row in expected)
+    if df is None or not total:
+        return 0.0
+    matched = 0
+    for r, row in enumerate(expected):
+        for c, text in enumerate(row):
+            if r < df.shape[0] and c < df.shape[1] and clean_text(str(df.iat[r, c])) == text:
+                matched += 1
+    return matched / total
+
+def run_benchmark(page_count, engines, seed=0):
+    """
+    在合成语料上运行各表格引擎
+
+    Args:
+        page_count: 合成语料页数
+        engines: 要比较的引擎列表
+        seed: 随机数种子
+
+    Returns:
+        每个引擎的耗时、检测到的表格数及单元格一致率，另含各引擎之间的两两一致率
+    """
+    report = {"pages": page_count, "engines": {}, "pairwise_agreement": {}}
+    extracted = {}
+    with tempfile.TemporaryDirectory(prefix="table_bench_") as work_dir:
+        pdf_path = os.path.join(work_dir, "tables.pdf")
+        truth = make_table_corpus(pdf_path, page_count, seed)
+        doc = fitz.open(pdf_path)
+        for engine in engines:
+            frames = []
+            start = time.perf_counter()
+            for page_num in range(page_count):
+                tables = extract_tables(pdf_path, doc, page_num, engine)
+                # 每页只有一个表格，取面积最大的检测结果
+                tables.sort(key=lambda t: (t[0][2] - t[0][0]) * (t[0][3] - t[0][1]), reverse=True)
+                frames.append(tables[0][1] if tables else None)
+            elapsed = time.perf_counter() - start
+            scores = [cell_agreement(expected, df) for expected, df in zip(truth, frames)]
+            report["engines"][engine] = {
+                "seconds": elapsed,
+                "seconds_per_page": elapsed / page_count,
+                "pages_with_table": sum(df is not None for df in frames),
+                "cell_agreement": sum(scores) / page_count,
+            }
+            extracted[engine] = frames
+        doc.close()
+
+    for i, first in enumerate(engines):
+        for second in engines[i + 1:]:
+            scores = []
+            for a, b in zip(extracted[first], extracted[second]):
+                if a is None or b is None:
+                    scores.append(float(a is None and b is None))
+                else:
+                    expected = [[clean_text(str(cell)) for cell in row] for row in a.values.tolist()]
+                    scores.append(cell_agreement(expected, b))
+            report["pairwise_agreement"][f"{first} vs {second}"] = sum(scores) / page_count
+    return report
+
+def run_backend_benchmark(page_count, backends, seed=0, resolution=None):
+    """
+    在合成语料上比较camelot lattice模式的各页面渲染后端
+
+    Args:
+        page_count: 合成语料页数
+        backends: 要比较的渲染后端列表，第一个作为基准
+        seed: 随机数种子
+        resolution: pymupdf后端的渲染分辨率
+
+    Returns:
+        每个后端的耗时、单元格一致率，以及与基准后端相比的表格数、bbox最大偏差和单元格一致率；
+        后端不可用（如未安装Ghostscript）时记录错误信息
+    """
+    report = {"pages": page_count, "backends": {}}
+    reference = None
+    with tempfile.TemporaryDirectory(prefix="backend_bench_") as work_dir:
+        pdf_path = os.path.join(work_dir, "tables.pdf")
+        truth = make_table_corpus(pdf_path, page_count, seed)
+        doc = fitz.open(pdf_path)
+        for name in backends:
+            backend = make_lattice_backend(doc, name, resolution)
+            # camelot在后端不可用时会静默回退到其他后端，这里先试渲染一页，不可用时直接报告
+            if isinstance(backend, str):
+                try:
+                    BACKENDS[backend]().convert(pdf_path, os.path.join(work_dir, f"probe_{name}.png"), page=1)
+                except Exception as e:
+                    report["backends"][name] = {"error": f"{type(e).__name__}: {e}"}
+                    continue
+            results = []
+            start = time.perf_counter()
+            try:
+                for page_num in range(page_count):
+                    results.append(extract_tables(pdf_path, doc, page_num, "camelot-lattice", backend))
+            except Exception as e:
+                report["backends"][name] = {"error": f"{type(e).__name__}: {e}"}
+                continue
+            elapsed = time.perf_counter() - start
+            frames = [tables[0][1] if tables else None for tables in results]
+            entry = {
+                "seconds": elapsed,
+                "seconds_per_page": elapsed / page_count,
+                "cell_agreement": sum(cell_agreement(e, df) for e, df in zip(truth, frames)) / page_count,
+            }
+            if reference is None:
+                reference = results
+            else:
+                same_count = all(len(a) == len(b) for a, b in zip(reference, results))
+                deviations = [abs(p - q) for a, b in zip(reference, results) for (ba, _), (bb, _) in zip(a, b)
+                              for p, q in zip(ba, bb)]
+                scores = []
+                for a, b in zip(reference, results):
+                    for (_, df_a), (_, df_b) in zip(a, b):
+                        expected = [[clean_text(str(cell)) for cell in row] for row in df_a.values.tolist()]
+                        scores.append(cell_agreement(expected, df_b))
+                entry["same_table_count"] = same_count
+                entry["max_bbox_deviation"] = max(deviations, default=0.0)
+                entry["reference_cell_agreement"] = sum(scores) / len(scores) if scores else 1.0
+            if hasattr(backend, "stats"):
+                entry["render_stats"] = dict(backend.stats)
+            report["backends"][name] = entry
+        doc.close()
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description='表格引擎对比工具')
+    parser.add_argument('--pages', type=int, default=20, help='合成语料页数')
+    parser.add_argument('--engines', type=str, nargs='+', default=list(TABLE_ENGINES), choices=TABLE_ENGINES, help='要比较的表格引擎')
+    parser.add_argument('--lattice-backends', type=str, nargs='+', choices=LATTICE_BACKENDS, help='改为比较camelot lattice模式的页面渲染后端，第一个作为基准')
+    parser.add_argument('--lattice-dpi', type=int, help='pymupdf渲染后端的分辨率')
+    parser.add_argument('--seed', type=int, default=0, help='随机数种子')
+    parser.add_argument('--output', type=str, help='对比报告JSON输出路径')
+    args = parser.parse_args()
+
+    if args.lattice_backends:
+        report = run_backend_benchmark(args.pages, args.lattice_backends, args.seed, args.lattice_dpi)
+    else:
+        report = run_benchmark(args.pages, args.engines, args.seed)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+本地多模态接口桩服务，模拟OpenAI兼容的/chat/completions接口，用于压测和无网络环境下的测试
+
+返回格式良好的<OCR></OCR><DESC></DESC><CONTEXT></CONTEXT>结果，可配置延迟分布、错误率和周期性的429突发
+
+用法：
+    python -m utils.vision_stub --port 8000 --latency lognormal:-1.5,0.5 --error-rate 0.02 --burst-every 30 --burst-length 2
+"""
+
+import json
+import math
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+def parse_latency(spec, rng=random):
+    """
+    解析延迟分布
+
+    Args:
+        spec: 延迟分布字符串，单位为秒：
+              "fixed:0.2"、"uniform:0.1,0.5"、"exp:0.3"（均值）、"lognormal:mu,sigma"
+        rng: 采样使用的随机数生成器，默认为random模块的全局生成器
+
+    Returns:
+        无参数的采样函数，返回延迟秒数
+    """
+    kind, _, params = spec.partition(':')
+    values = [float(v) for v in params.split(',') if v.strip()]
+    if kind == "fixed":
+        return lambda: values[0]
+    if kind == "uniform":
+        return lambda: rng.uniform(values[0], values[1])
+    if kind == "exp":
+        return lambda: rng.expovariate(1 / values[0])
+    if kind == "lognormal":
+        return lambda: rng.lognormvariate(values[0], values[1])
+    raise ValueError(f"未知的延迟分布: {spec}")
+
+class VisionStubServer:
+    """多模态接口桩服务类，在后台线程中运行"""
+
+    def __init__(self, host="127.0.0.1", port=0, latency="fixed:0", error_rate=0.0,
+                 burst_every=0.0, burst_length=0.0, retry_after=1.0, seed=None):
+        """
+        初始化桩服务
+
+        Args:
+            host: 监听地址
+            port: 监听端口，0表示自动分配
+            latency: 延迟分布字符串，见parse_latency
+            error_rate: 返回500错误的概率
+            burst_every: 每隔多少秒出现一次429突发，0表示关闭
+            burst_length: 每次429突发持续的秒数
+            retry_after: 429响应中Retry-After头的秒数
+            seed: 随机数种子，只作用于本实例的随机数生成器
+        """
+        self._rng = random.Random(seed)
+        self.sample_latency = parse_latency(latency, self._rng)
+        self.error_rate = error_rate
+        self.burst_every = burst_every
+        self.burst_length = burst_length
+        self.retry_after = retry_after
+        self.stats = {"requests": 0, "ok": 0, "errors": 0, "throttled": 0}
+        self._lock = threading.Lock()
+        self._started_at = time.monotonic()
+        handler = type("BoundVisionStubHandler", (VisionStubHandler,), {"stub": self})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self._thread = None
+
+    @property
+    def base_url(self):
+        """供MULTIMODAL_CONFIG["base_url"]使用的地址"""
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def in_burst(self):
+        """当前是否处于429突发期"""
+        if self.burst_every <= 0 or self.burst_length <= 0:
+            return False
+        return math.fmod(time.monotonic() - self._started_at, self.burst_every) >= self.burst_every - self.burst_length
+
+    def count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def start(self):
+        """在后台线程中启动服务"""
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """停止服务"""
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+class VisionStubHandler(BaseHTTPRequestHandler):
+    """桩服务的请求处理类"""
+
+    stub = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        stub = self.stub
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        stub.count("requests")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            return self._send_json(404, {"error": {"message": f"未知的路径: {self.path}"}})
+
+        if stub.in_burst():
+            stub.count("throttled")
+            return self._send_json(429, {"error": {"message": "Rate limit exceeded"}},
+                                   headers={"Retry-After": str(stub.retry_after)})
+
+        time.sleep(max(0.0, stub.sample_latency()))
+        if stub._rng.random() < stub.error_rate:
+            stub.count("errors")
+            return self._send_json(500, {"error": {"message": "Internal server error"}})
+
+        payload = {}
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError:
+            pass
+        if not isinstance(payload, dict):
+            payload = {}
+        try:
+            max_tokens = int(payload.get("max_tokens") or 1024)
+        except (ValueError, TypeError):
+            max_tokens = 1024
+        content = ("<OCR>示例文字 sample text</OCR>"
+                   "<DESC>这是一张由本地桩服务分析的图片</DESC>"
+                   "<CONTEXT>压测上下文</CONTEXT>")
+        stub.count("ok")
+        self._send_json(200, {
+            "id": f"stub-{stub.stats['requests']}",
+            "object": "chat.completion",
+            "model": payload.get("model", "stub"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": len(body) // 4, "completion_tokens": min(max_tokens, 64),
+                      "total_tokens": len(body) // 4 + min(max_tokens, 64)},
+        })
+
+def main():
+    parser = argparse.ArgumentParser(description='本地多模态接口桩服务')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='监听地址')
+    parser.add_argument('--port', type=int, default=8000, help='监听端口')
+    parser.add_argument('--latency', type=str, default='fixed:0.2', help='延迟分布，如fixed:0.2、uniform:0.1,0.5、exp:0.3、lognormal:-1.5,0.5')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='返回500错误的概率')
+    parser.add_argument('--burst-every', type=float, default=0.0, help='每隔多少秒出现一次429突发，0表示关闭')
+    parser.add_argument('--burst-length', type=float, default=0.0, help='每次429突发持续的秒数')
+    parser.add_argument('--retry-after', type=float, default=1.0, help='429响应中Retry-After头的秒数')
+    args = parser.parse_args()
+
+    stub = VisionStubServer(args.host, args.port, latency=args.latency, error_rate=args.error_rate,
+                            burst_every=args.burst_every, burst_length=args.burst_length,
+                            retry_after=args.retry_after)
+    print(f"桩服务已启动: {stub.base_url}/chat/completions")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stub.server.server_close()
+        print(f"请求统计: {stub.stats}")
+
+if __name__ == "__main__":
+    main()
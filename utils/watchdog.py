@@ -0,0 +1,54 @@
+"""
+页面处理看门狗模块，为单页的版面分析、表格提取等阶段设置时间上限，避免个别畸形页面拖住整批转换
+
+使用SIGALRM定时器在超时时向主线程抛出StageTimeout，可以打断pdfminer、camelot等纯Python代码；
+长时间停留在C扩展内部时要等其返回后才会抛出。SIGALRM只能在Unix的主线程中使用，
+在其他线程中（如服务模式和监视模式的工作线程）需要时限时，使用内存受限模式在独立的工作进程中处理页面
+"""
+
+import signal
+import threading
+from contextlib import contextmanager
+
+class StageTimeout(Exception):
+    """页面处理阶段超时"""
+
+    def __init__(self, stage, seconds):
+        super().__init__(f"{stage} stage timed out after {seconds}s")
+        self.stage = stage
+        self.seconds = seconds
+
+def timeouts_available():
+    """当前平台是否支持阶段时限（需要SIGALRM定时器）"""
+    return hasattr(signal, "setitimer")
+
+def timeouts_supported():
+    """当前线程是否可以使用阶段时限"""
+    return timeouts_available() and threading.current_thread() is threading.main_thread()
+
+@contextmanager
+def stage_timeout(stage, seconds):
+    """
+    为一个处理阶段设置时间上限
+
+    Args:
+        stage: 阶段名称，如"layout"、"table"
+        seconds: 时间上限（秒），0或None表示不限制
+
+    Raises:
+        StageTimeout: 阶段运行超过时间上限
+    """
+    if not seconds or not timeouts_supported():
+        yield
+        return
+
+    def on_timeout(signum, frame):
+        raise StageTimeout(stage, seconds)
+
+    previous = signal.signal(signal.SIGALRM, on_timeout)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
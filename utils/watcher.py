@@ -0,0 +1,423 @@
+"""
+目录监视模块，常驻进程持续监视一个目录，自动转换新增或修改的PDF、Word文档和图片
+
+Linux上通过ctypes调用inotify接收文件事件；其他平台，或网络共享目录（远端写入不会产生inotify事件）使用轮询扫描。
+文件的大小和修改时间保持不变debounce_seconds秒后才开始转换，避免处理仍在写入的文件。
+转换在有界的线程池中执行，结果写入输出目录；输出目录中的状态文件记录每个输入文件转换时的大小和修改时间，
+重启后跳过未变化的文件，只补上离线期间新增或修改的文件
+
+用法：
+    python main.py --watch inbox/ --workers 4
+    python main.py --watch /mnt/share/inbox --watch-poll 5   # 网络共享目录使用轮询
+"""
+
+import os
+import json
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from config import WATCH_CONFIG
+from utils.image_processor import ImageProcessor
+from utils.pipeline import convert_document, detect_kind
+
+# inotify事件掩码，见<sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+# inotify_event结构体的固定部分：wd、mask、cookie、len，之后是len字节的文件名
+EVENT_HEADER = struct.Struct("iIII")
+# 每次从inotify描述符读取的字节数
+EVENT_BUFFER_SIZE = 64 * 1024
+
+def iter_files(root, skip_dir=None):
+    """
+    递归列出目录下的文件，跳过以"."开头的目录和skip_dir
+
+    Args:
+        root: 目录路径
+        skip_dir: 不进入的目录（如位于监视目录下的输出目录）
+
+    Yields:
+        文件路径
+    """
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(name for name in dirnames
+                             if not name.startswith(".") and os.path.join(dirpath, name) != skip_dir)
+        for name in sorted(filenames):
+            yield os.path.join(dirpath, name)
+
+def file_signature(path):
+    """文件的(修改时间ns, 大小)，文件不存在时返回None"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+class InotifyWatcher:
+    """基于inotify的目录监视器（仅Linux），递归监视所有子目录"""
+
+    def __init__(self, root, skip_dir=None):
+        """
+        Args:
+            root: 监视的目录
+            skip_dir: 不监视的子目录
+
+        Raises:
+            OSError: 当前系统不支持inotify，或监视数超过系统上限
+        """
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError(errno.ENOSYS, "inotify is not available")
+        self._libc = libc
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.root = root
+        self.skip_dir = skip_dir
+        self._dirs = {}
+        try:
+            self._add_tree(root)
+        except OSError:
+            self.close()
+            raise
+
+    def _add_dir(self, path):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            code = ctypes.get_errno()
+            raise OSError(code, f"inotify_add_watch failed: {os.strerror(code)}", path)
+        self._dirs[wd] = path
+
+    def _add_tree(self, path):
+        """监视path及其所有子目录，返回其中已有的文件（目录可能在建立监视前已写入文件）"""
+        files = []
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames[:] = [name for name in dirnames
+                           if not name.startswith(".") and os.path.join(dirpath, name) != self.skip_dir]
+            self._add_dir(dirpath)
+            files.extend(os.path.join(dirpath, name) for name in filenames)
+        return files
+
+    def poll(self, timeout):
+        """
+        等待文件事件
+
+        Args:
+            timeout: 最长等待秒数
+
+        Returns:
+            发生变化的文件路径集合
+        """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+        changed = set()
+        while True:
+            try:
+                data = os.read(self.fd, EVENT_BUFFER_SIZE)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                name = data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b"\0")
+                offset += EVENT_HEADER.size + length
+                if mask & IN_Q_OVERFLOW:
+                    # 事件队列溢出，丢失的事件只能通过重新扫描补上
+                    print("inotify事件队列溢出，重新扫描目录")
+                    changed.update(iter_files(self.root, self.skip_dir))
+                    continue
+                if mask & IN_IGNORED:
+                    self._dirs.pop(wd, None)
+                    continue
+                directory = self._dirs.get(wd)
+                if directory is None or not name:
+                    continue
+                path = os.path.join(directory, os.fsdecode(name))
+                if mask & IN_ISDIR:
+                    if not name.startswith(b".") and path != self.skip_dir and os.path.isdir(path):
+                        changed.update(self._add_tree(path))
+                    continue
+                changed.add(path)
+        return changed
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+class PollingWatcher:
+    """轮询扫描的目录监视器，比较每个文件的大小和修改时间"""
+
+    def __init__(self, root, skip_dir=None, interval=None):
+        """
+        Args:
+            root: 监视的目录
+            skip_dir: 不监视的子目录
+            interval: 扫描间隔（秒），默认使用WATCH_CONFIG["poll_interval"]
+        """
+        self.root = root
+        self.skip_dir = skip_dir
+        self.interval = interval or WATCH_CONFIG["poll_interval"]
+        self._snapshot = self._scan()
+        self._next_scan = time.monotonic() + self.interval
+
+    def _scan(self):
+        snapshot = {}
+        for path in iter_files(self.root, self.skip_dir):
+            signature = file_signature(path)
+            if signature is not None:
+                snapshot[path] = signature
+        return snapshot
+
+    def poll(self, timeout):
+        """同InotifyWatcher.poll，未到扫描时间时只等待"""
+        wait = self._next_scan - time.monotonic()
+        if wait > timeout:
+            time.sleep(timeout)
+            return set()
+        time.sleep(max(wait, 0))
+        snapshot = self._scan()
+        self._next_scan = time.monotonic() + self.interval
+        changed = {path for path, signature in snapshot.items() if self._snapshot.get(path) != signature}
+        self._snapshot = snapshot
+        return changed
+
+    def close(self):
+        pass
+
+def make_watcher(root, skip_dir=None, poll_interval=None):
+    """
+    创建目录监视器，优先使用inotify
+
+    Args:
+        root: 监视的目录
+        skip_dir: 不监视的子目录
+        poll_interval: 指定时强制使用该间隔的轮询（用于网络共享目录）
+
+    Returns:
+        InotifyWatcher或PollingWatcher
+    """
+    if not poll_interval:
+        try:
+            return InotifyWatcher(root, skip_dir)
+        except (OSError, AttributeError, TypeError) as e:
+            print(f"无法使用inotify（{e}），改为轮询扫描")
+    return PollingWatcher(root, skip_dir, poll_interval)
+
+class FolderWatcher:
+    """监视目录并自动转换新增或修改的文档，转换结果和状态文件保存在输出目录中"""
+
+    def __init__(self, watch_dir, output_dir=None, workers=2, debounce=None, poll_interval=None,
+                 skip_emb=False, pdf_options=None, image_processor=None):
+        """
+        初始化目录监视
+
+        Args:
+            watch_dir: 监视的目录，递归包含子目录
+            output_dir: 输出目录，默认为监视目录下的WATCH_CONFIG["output_dir"]；
+                        a/b.pdf的结果为<output_dir>/a/b.pdf.raw.md、b.pdf.emb.md和b.pdf_images/
+            workers: 转换线程数
+            debounce: 文件保持不变多少秒后开始转换，默认使用WATCH_CONFIG["debounce_seconds"]
+            poll_interval: 指定时强制使用该间隔的轮询，不使用inotify
+            skip_emb: 是否只生成raw.md
+            pdf_options: 传给pdf_to_markdown的其他参数
+            image_processor: 共享的ImageProcessor，为None时新建
+        """
+        self.watch_dir = os.path.abspath(watch_dir)
+        self.output_dir = os.path.abspath(output_dir or os.path.join(watch_dir, WATCH_CONFIG["output_dir"]))
+        self.state_path = os.path.join(self.output_dir, WATCH_CONFIG["state_file"])
+        self.debounce = debounce if debounce is not None else WATCH_CONFIG["debounce_seconds"]
+        self.poll_interval = poll_interval
+        self.skip_emb = skip_emb
+        self.pdf_options = pdf_options or {}
+        self.image_processor = image_processor or ImageProcessor()
+        self.stats = {"converted": 0, "failed": 0, "skipped": 0}
+        self._pending = {}
+        self._in_flight = set()
+        # 本次运行中转换失败的文件版本，运行期间不再重试，重启后重新转换
+        self._failed = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="watch-worker")
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.state = self._load_state()
+
+    def _load_state(self):
+        """读取状态文件（每行一条JSON记录，同一文件以最后一条为准），并压缩为每个文件一行"""
+        state = {}
+        if os.path.exists(self.state_path):
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # 上次退出时写了一半的行
+                    state[entry["path"]] = entry
+        temp_path = self.state_path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            for entry in state.values():
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        os.replace(temp_path, self.state_path)
+        return state
+
+    def _record(self, entry):
+        """追加一条状态记录，不重写整个状态文件"""
+        with self._lock:
+            self.state[entry["path"]] = entry
+            with open(self.state_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def is_watched(self, path):
+        """是否为需要转换的文件：支持的类型，不在隐藏目录或输出目录中，也不是Office的临时文件"""
+        rel = os.path.relpath(path, self.watch_dir)
+        parts = rel.split(os.sep)
+        if parts[0] == os.pardir or any(part.startswith(".") for part in parts) or parts[-1].startswith("~$"):
+            return False
+        if os.path.commonpath([path, self.output_dir]) == self.output_dir:
+            return False
+        return detect_kind(path) is not None
+
+    def is_current(self, path, signature):
+        """
+        文件是否不需要再转换：上次成功转换后未变化，或本次运行中同一版本已转换失败
+
+        失败的记录不会使文件在重启后被跳过，重启时重新转换（例如pandoc缺失、多模态接口故障等临时错误）
+        """
+        if self._failed.get(path) == tuple(signature):
+            return True
+        entry = self.state.get(os.path.relpath(path, self.watch_dir))
+        return (entry is not None and entry.get("status") == "done"
+                and (entry["mtime_ns"], entry["size"]) == tuple(signature))
+
+    def notify(self, paths, now=None):
+        """
+        登记发生变化的文件，每次变化都重新开始计算静止时间
+
+        Args:
+            paths: 文件路径
+            now: 当前的time.monotonic()
+        """
+        now = time.monotonic() if now is None else now
+        for path in paths:
+            path = os.path.abspath(path)
+            if not self.is_watched(path):
+                continue
+            signature = file_signature(path)
+            with self._lock:
+                if signature is None:
+                    self._pending.pop(path, None)
+                elif self.is_current(path, signature):
+                    self.stats["skipped"] += 1
+                else:
+                    self._pending[path] = (signature, now)
+
+    def dispatch_ready(self, now=None):
+        """
+        提交已静止debounce秒的文件，大小或修改时间仍在变化的文件重新计时
+
+        Returns:
+            本次提交的文件数
+        """
+        now = time.monotonic() if now is None else now
+        ready = []
+        with self._lock:
+            for path, (signature, since) in list(self._pending.items()):
+                current = file_signature(path)
+                if current is None or self.is_current(path, current):
+                    # 文件已删除，或同一版本的事件在转换完成前重复到达
+                    del self._pending[path]
+                elif current != signature:
+                    self._pending[path] = (current, now)
+                elif now - since >= self.debounce and path not in self._in_flight:
+                    # 正在转换的文件等本次转换结束后再处理
+                    del self._pending[path]
+                    self._in_flight.add(path)
+                    ready.append((path, signature))
+        for path, signature in ready:
+            self._executor.submit(self._convert, path, signature)
+        return len(ready)
+
+    def output_paths(self, path):
+        """输入文件对应的(raw.md路径, emb.md路径, 图片目录)"""
+        base = os.path.join(self.output_dir, os.path.relpath(path, self.watch_dir))
+        return f"{base}.raw.md", f"{base}.emb.md", f"{base}_images"
+
+    def _convert(self, path, signature):
+        raw_path, emb_path, image_dir = self.output_paths(path)
+        os.makedirs(os.path.dirname(raw_path), exist_ok=True)
+        entry = {"path": os.path.relpath(path, self.watch_dir), "mtime_ns": signature[0], "size": signature[1],
+                 "raw": raw_path, "emb": None if self.skip_emb else emb_path}
+        start = time.perf_counter()
+        try:
+            print(f"正在转换: {path}")
+            convert_document(path, raw_path, emb_path=None if self.skip_emb else emb_path,
+                             image_processor=self.image_processor, image_dir=image_dir,
+                             pdf_options=self.pdf_options)
+            entry["status"] = "done"
+        except Exception as e:
+            print(f"转换失败 {path}: {e}")
+            entry["status"] = "failed"
+            entry["error"] = str(e)
+        entry["seconds"] = round(time.perf_counter() - start, 3)
+        self._record(entry)
+        with self._lock:
+            self.stats["converted" if entry["status"] == "done" else "failed"] += 1
+            if entry["status"] == "done":
+                self._failed.pop(path, None)
+            else:
+                self._failed[path] = tuple(signature)
+            self._in_flight.discard(path)
+            # 转换期间文件又被修改，重新排队
+            current = file_signature(path)
+            if current is not None and current != tuple(signature):
+                self._pending.setdefault(path, (current, time.monotonic()))
+
+    def idle(self):
+        """没有等待或正在转换的文件"""
+        with self._lock:
+            return not self._pending and not self._in_flight
+
+    def run(self, stop_event=None):
+        """
+        开始监视，直到stop_event被设置或收到中断信号；启动时先补上离线期间新增或修改的文件
+
+        Args:
+            stop_event: 可选的threading.Event，用于从其他线程停止监视
+        """
+        stop_event = stop_event or threading.Event()
+        watcher = make_watcher(self.watch_dir, self.output_dir, self.poll_interval)
+        print(f"正在监视目录: {self.watch_dir} -> {self.output_dir}（{type(watcher).__name__}）")
+        self.notify(iter_files(self.watch_dir, self.output_dir))
+        timeout = min(max(self.debounce / 2, 0.05), 0.5)
+        try:
+            while not stop_event.is_set():
+                self.notify(watcher.poll(timeout))
+                self.dispatch_ready()
+        except KeyboardInterrupt:
+            print("正在停止目录监视...")
+        finally:
+            watcher.close()
+            self._executor.shutdown(wait=True)
+        print(f"目录监视已停止: 转换 {self.stats['converted']} 个，失败 {self.stats['failed']} 个，"
+              f"未变化跳过 {self.stats['skipped']} 个")
+
+def watch(watch_dir, output_dir=None, workers=2, debounce=None, poll_interval=None, skip_emb=False,
+          pdf_options=None):
+    """
+    监视目录并持续转换，直到收到中断信号
+
+    参数同FolderWatcher
+    """
+    FolderWatcher(watch_dir, output_dir=output_dir, workers=workers, debounce=debounce,
+                  poll_interval=poll_interval, skip_emb=skip_emb, pdf_options=pdf_options).run()